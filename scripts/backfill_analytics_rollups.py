@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Backfill the product_analytics_daily rollups from raw ProductAnalytics events.
+
+Usage (from the repository root):
+    python scripts/backfill_analytics_rollups.py                      # all history
+    python scripts/backfill_analytics_rollups.py --start 2025-01-01 --end 2025-06-30
+
+Each day is recomputed from scratch and committed on its own, so the script is
+safe to re-run and to interrupt. Days that have not closed yet are skipped; the
+background rollup worker picks them up once they do.
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from models import db, ProductAnalytics
+from analytics_rollup import backfill_rollups, get_rolled_through, last_closed_day
+from sqlalchemy import func
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', type=date.fromisoformat, help='first day (YYYY-MM-DD), default: first event')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day (YYYY-MM-DD), default: yesterday')
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = args.start
+        if start is None:
+            first_event = db.session.query(func.min(ProductAnalytics.timestamp)).scalar()
+            if first_event is None:
+                print('No analytics events found. Nothing to backfill.')
+                return
+            start = first_event.date()
+        end = args.end or last_closed_day()
+
+        print(f'Rolling up {start} .. {end}')
+        days = backfill_rollups(start, end)
+        print(f'Rolled up {days} day(s). Rollups now cover through {get_rolled_through()}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Record commission ledger rows for delivered orders.
+
+Usage (from the repository root):
+    python scripts/backfill_commission_ledger.py            # only orders missing from the ledger
+    python scripts/backfill_commission_ledger.py --rebuild  # clear and recompute the whole ledger
+
+The default mode only adds orders that have no ledger rows yet, so it is safe
+to re-run at any time. --rebuild recomputes every delivered order against the
+CURRENT tiers and overrides, replacing the rates frozen at delivery time. Use
+it only to repair the ledger.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from commission_ledger import backfill_ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rebuild', action='store_true', help='clear the ledger and recompute it from scratch')
+    parser.add_argument('--batch-size', type=int, default=500, help='orders per transaction (default: 500)')
+    args = parser.parse_args()
+
+    with app.app_context():
+        rows = backfill_ledger(rebuild=args.rebuild, batch_size=args.batch_size)
+        print(f'Done. Recorded {rows} ledger row(s).')
+
+
+if __name__ == '__main__':
+    main()
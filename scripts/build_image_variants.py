@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Build resized WebP/AVIF variants for every image already in uploads/.
+
+Usage (from the repository root):
+    python scripts/build_image_variants.py
+    python scripts/build_image_variants.py --workers 8 --force
+
+Walks uploads/ and server/uploads/ (see UPLOAD_DIRS in
+server/image_variants.py) and builds the thumb, card and detail variants of
+each image on a pool of --workers processes. Images whose variants all exist
+are skipped unless --force is given. Afterwards the variant URLs are stored
+on every product, store and user whose image is one of the built uploads
+and has no variants recorded yet (all of them with --force). New uploads
+get their variants from the app itself; this is for files uploaded before
+the pipeline existed. Safe to run multiple times.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from models import db
+from image_variants import TARGETS, UPLOAD_DIRS, build_variants, is_variant_source, record_variants, upload_path, variant_urls
+
+COMMIT_EVERY = 500
+
+
+def upload_files():
+    """Every original image under the upload directories."""
+    for directory in UPLOAD_DIRS:
+        for dirpath, _dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if is_variant_source(path):
+                    yield path
+
+
+def build(task):
+    path, force = task
+    try:
+        build_variants(path, force=force)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def record_all(built, force):
+    """Store variant URLs on the rows whose image was built. Returns rows updated per kind."""
+    updated = {}
+    for kind, (model, url_column, variants_column) in TARGETS.items():
+        url_attr = getattr(model, url_column)
+        query = db.session.query(model.id, url_attr).filter(url_attr.like('/uploads/%'))
+        if not force:
+            query = query.filter(getattr(model, variants_column).is_(None))
+        count = 0
+        for row_id, url in query.all():
+            if upload_path(url) in built and record_variants(kind, row_id, url, variant_urls(url)):
+                count += 1
+                if count % COMMIT_EVERY == 0:
+                    db.session.commit()
+        db.session.commit()
+        updated[kind] = count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='image encoding processes')
+    parser.add_argument('--force', action='store_true', help='rebuild and re-record existing variants')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    paths = list(upload_files())
+    built = set()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, error in pool.map(build, [(path, args.force) for path in paths], chunksize=4):
+            if error:
+                failed += 1
+                print(f'  {path}: {error}', file=sys.stderr)
+            else:
+                built.add(path)
+    print(f'Built variants for {len(built)} of {len(paths)} image(s) in {time.monotonic() - started:.1f}s '
+          f'({failed} failed).')
+
+    with app.app_context():
+        updated = record_all(built, args.force)
+    print('Recorded variants on ' + ', '.join(f'{count} {kind}(s)' for kind, count in updated.items()) + '.')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
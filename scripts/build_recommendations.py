@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Rebuild the precomputed product recommendations and customer feeds.
+
+Usage (from the repository root):
+    python scripts/build_recommendations.py
+    python scripts/build_recommendations.py --top-n 30 --view-days 60
+
+Scores every pair of products by how many of the same shoppers bought,
+wishlisted or viewed both (cosine similarity, see
+server/recommendation_builder.py) and replaces product_recommendations with
+the best neighbours of each product. Then every customer's dashboard feed in
+user_recommendations is rebuilt from those neighbours. Run it periodically,
+e.g. nightly from cron. Until a product has neighbours, its recommendations
+come from the same-category heuristic.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from recommendation_builder import TOP_N, VIEW_WINDOW_DAYS, build_recommendations
+from recommendations import build_user_feeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top-n', type=int, default=TOP_N, help='neighbours kept per product')
+    parser.add_argument('--view-days', type=int, default=VIEW_WINDOW_DAYS,
+                        help='only count product views from the last N days')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.monotonic()
+        written = build_recommendations(top_n=args.top_n, view_days=args.view_days)
+        feed_rows = build_user_feeds()
+        print(f'Wrote {written} recommendation(s) and {feed_rows} feed row(s) '
+              f'in {time.monotonic() - started:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Load-test concurrent checkouts against the stock reservation in create_order.
+
+Usage (from the repository root, against a development or staging database):
+    python scripts/checkout_load_test.py
+    python scripts/checkout_load_test.py --buyers 1,2,4,8,16,32 --stock 200 --orders-per-buyer 20
+
+For each buyer count, the script creates a throwaway store, one product with
+--stock units and that many buyers. Every buyer then places
+--orders-per-buyer single-unit orders for the product through
+POST /api/orders, all at once on separate threads. Each run reports accepted
+and rejected checkouts, throughput, and oversells: units sold beyond the
+starting stock, which must be 0. The fixtures are deleted afterwards unless
+--keep is given.
+
+Use PostgreSQL to measure throughput. SQLite serializes all writers, so it
+only checks correctness.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from flask_jwt_extended import create_access_token
+from app import app
+from authz import token_claims
+from loadtest_fixtures import create_store, delete_store, loadtest_user, new_tag
+from models import db, Address, Order, OrderItem, Payment, PaymentMethod, Product, UserRecommendation
+
+
+def create_fixtures(tag, buyers, stock):
+    store = create_store(tag, 'Load test')
+    product = Product(name=f'{tag} product', price=100.0, stock_quantity=stock, store_id=store.id)
+    db.session.add(product)
+
+    customers = []
+    for n in range(buyers):
+        user = loadtest_user(f'{tag}-buyer{n}', 'Load test')
+        db.session.add(user)
+        customers.append(user)
+    db.session.flush()
+
+    checkouts = []
+    for user in customers:
+        address = Address(user_id=user.id, name='Load test', street_address='1 Test St', city='Test',
+                          state='Test', postal_code='00000', country='Test')
+        card = PaymentMethod(user_id=user.id, cardholder_name='Load test', card_number_last_four='0000',
+                             card_type='Visa', expiry_month=1, expiry_year=2099)
+        db.session.add_all([address, card])
+        db.session.flush()
+        token = create_access_token(identity=str(user.id), additional_claims=token_claims(user))
+        checkouts.append((token, address.id, card.id))
+    db.session.commit()
+    return store.id, product.id, [u.id for u in customers], checkouts
+
+
+def delete_fixtures(store_id, customer_ids):
+    order_ids = db.session.query(Order.id).filter(Order.store_id == store_id)
+    Payment.query.filter(Payment.order_id.in_(order_ids)).delete(synchronize_session=False)
+    OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.store_id == store_id).delete(synchronize_session=False)
+    UserRecommendation.query.filter(UserRecommendation.user_id.in_(customer_ids)).delete(synchronize_session=False)
+    Address.query.filter(Address.user_id.in_(customer_ids)).delete(synchronize_session=False)
+    PaymentMethod.query.filter(PaymentMethod.user_id.in_(customer_ids)).delete(synchronize_session=False)
+    delete_store(store_id, customer_ids)
+    db.session.commit()
+
+
+def buyer(client, checkout, product_id, orders, results, lock):
+    token, address_id, card_id = checkout
+    counts = {'accepted': 0, 'rejected': 0, 'failed': 0}
+    for _ in range(orders):
+        response = client.post('/api/orders', headers={'Authorization': f'Bearer {token}'}, json={
+            'items': [{'id': product_id, 'quantity': 1, 'price': 100.0}],
+            'shipping_address_id': address_id,
+            'payment_method_id': card_id,
+            'subtotal': 100.0,
+        })
+        if response.status_code == 201:
+            counts['accepted'] += 1
+        elif response.status_code == 400 and 'Insufficient stock' in response.get_json().get('message', ''):
+            counts['rejected'] += 1
+        else:
+            counts['failed'] += 1
+    with lock:
+        for key, value in counts.items():
+            results[key] += value
+
+
+def run(buyers, stock, orders_per_buyer, keep):
+    tag = new_tag('loadtest')
+    with app.app_context():
+        store_id, product_id, customer_ids, checkouts = create_fixtures(tag, buyers, stock)
+
+    results = {'accepted': 0, 'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=buyer, args=(app.test_client(), checkout, product_id, orders_per_buyer, results, lock))
+        for checkout in checkouts
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    with app.app_context():
+        remaining = db.session.get(Product, product_id).stock_quantity
+        sold = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(Order.store_id == store_id).scalar()
+        if not keep:
+            delete_fixtures(store_id, customer_ids)
+
+    oversold = max(0, sold - stock)
+    print(f'{buyers:>4} buyer(s): {results["accepted"]:>5} accepted, {results["rejected"]:>5} out of stock, '
+          f'{results["failed"]:>3} failed, {elapsed:6.2f}s, {results["accepted"] / elapsed:8.1f} orders/s, '
+          f'stock left {remaining}, oversold {oversold}')
+    return oversold == 0 and remaining == stock - sold and results['failed'] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', default='1,2,4,8,16',
+                        help='comma-separated concurrent buyer counts, one run each')
+    parser.add_argument('--stock', type=int, default=100, help='starting stock of the product')
+    parser.add_argument('--orders-per-buyer', type=int, default=10, help='checkouts each buyer attempts')
+    parser.add_argument('--keep', action='store_true', help='keep the fixtures and orders')
+    args = parser.parse_args()
+
+    ok = True
+    for buyers in [int(n) for n in args.buyers.split(',')]:
+        ok = run(buyers, args.stock, args.orders_per_buyer, args.keep) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Benchmark stock admission for a single hot product in flash-sale mode.
+
+Usage (from the repository root, against a development or staging database):
+    python scripts/flash_sale_benchmark.py
+    python scripts/flash_sale_benchmark.py --threads 32 --units 5000 --attempts 20000
+
+Creates a throwaway store, product and flash sale holding --units units.
+--threads threads then make --attempts admission attempts in total, one unit
+each, through the in-process stock pool that create_order uses (see
+server/flash_sale.py). For comparison, the same load is run against the
+per-checkout conditional UPDATE of the product row, each attempt in its own
+transaction. Both runs report attempts per second and units admitted, which
+must equal --units when there are more attempts than units. The fixtures
+are deleted afterwards.
+
+Only stock admission is measured, not the rest of checkout (order inserts,
+payment, recommendations). That is the part every buyer of a hot product
+contends on.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from flash_sale import flash_stock
+from loadtest_fixtures import create_store, delete_store, new_tag
+from models import db, FlashSale, Product
+
+
+def create_fixtures(units):
+    tag = new_tag('flashbench')
+    store = create_store(tag, 'Flash benchmark')
+    product = Product(name=f'{tag} product', price=100.0, stock_quantity=units, store_id=store.id)
+    db.session.add(product)
+    db.session.flush()
+    now = datetime.utcnow()
+    sale = FlashSale(product_id=product.id, starts_at=now, ends_at=now + timedelta(hours=1), units=units)
+    db.session.add(sale)
+    db.session.commit()
+    return store.id, product.id, sale.id
+
+
+def delete_fixtures(store_id, _product_id, sale_id):
+    flash_stock.forget(sale_id)
+    FlashSale.query.filter(FlashSale.id == sale_id).delete(synchronize_session=False)
+    delete_store(store_id)
+    db.session.commit()
+
+
+def take_from_pool(sale_id, _product_id):
+    return flash_stock.take(sale_id, 1)
+
+
+def take_from_row(_sale_id, product_id):
+    taken = db.session.query(Product).filter(
+        Product.id == product_id, Product.stock_quantity >= 1
+    ).update({Product.stock_quantity: Product.stock_quantity - 1}, synchronize_session=False)
+    db.session.commit()
+    return bool(taken)
+
+
+def run(label, take, fixtures, threads, attempts):
+    _store_id, product_id, sale_id = fixtures
+    admitted = [0] * threads
+    per_thread = attempts // threads
+
+    def worker(index):
+        with app.app_context():
+            for _ in range(per_thread):
+                if take(sale_id, product_id):
+                    admitted[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+    made = per_thread * threads
+    print(f'{label:<16} {made:>7} attempts on {threads} thread(s) in {elapsed:6.2f}s: '
+          f'{made / elapsed:>10.0f} attempts/s, {sum(admitted)} admitted')
+    return made, sum(admitted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='concurrent buyers')
+    parser.add_argument('--units', type=int, default=2000, help='units in the flash sale')
+    parser.add_argument('--attempts', type=int, default=10000, help='admission attempts in total')
+    args = parser.parse_args()
+
+    ok = True
+    for label, take in (('flash-sale pool', take_from_pool), ('row UPDATE', take_from_row)):
+        with app.app_context():
+            fixtures = create_fixtures(args.units)
+        try:
+            made, admitted = run(label, take, fixtures, args.threads, args.attempts)
+            with app.app_context():
+                allocated = db.session.get(FlashSale, fixtures[2]).allocated
+            if take is take_from_pool and allocated != admitted:
+                print(f'  allocated {allocated} units but admitted {admitted}')
+                ok = False
+            if admitted != min(made, args.units):
+                print(f'  expected {min(made, args.units)} admitted')
+                ok = False
+        finally:
+            with app.app_context():
+                delete_fixtures(*fixtures)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
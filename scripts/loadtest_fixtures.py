@@ -0,0 +1,68 @@
+"""Throwaway fixtures shared by the benchmark and load-test scripts.
+
+Each run seeds a manager with a ``@loadtest.invalid`` address, their store and
+its products under a random tag, so runs never collide with real data or with
+each other, and deletes them again afterwards. These helpers flush but leave
+the commit to the caller, so a script can bump cache versions
+(``invalidate_catalog``) in the same transaction.
+
+Import after putting ``server/`` on ``sys.path``.
+"""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert
+from models import db, Product, Store, User
+
+INSERT_CHUNK = 5000
+
+
+def new_tag(prefix):
+    """A unique tag for one run's names and email addresses."""
+    return f'{prefix}-{uuid.uuid4().hex[:8]}'
+
+
+def loadtest_user(tag, name, role='customer'):
+    """An unsaved user with an undeliverable ``<tag>@loadtest.invalid`` address."""
+    return User(email=f'{tag}@loadtest.invalid', password_hash='!', name=name, role=role)
+
+
+def create_store(tag, name):
+    """A manager and their store, flushed so both have ids."""
+    manager = loadtest_user(tag, name, role='manager')
+    db.session.add(manager)
+    db.session.flush()
+    store = Store(name=f'{tag} store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    return store
+
+
+def insert_products(store, count, columns):
+    """Bulk insert ``count`` products into ``store``; ``columns(i)`` returns the i-th product's values.
+
+    Priced at 100.0 with 10 in stock unless ``columns`` says otherwise.
+    """
+    now = datetime.utcnow()
+    for start in range(0, count, INSERT_CHUNK):
+        db.session.execute(insert(Product), [{
+            'price': 100.0,
+            'effective_price': 100.0,
+            'stock_quantity': 10,
+            'created_at': now,
+            'updated_at': now,
+            **columns(i),
+            'store_id': store.id,
+        } for i in range(start, min(start + INSERT_CHUNK, count))])
+
+
+def delete_store(store_id, user_ids=()):
+    """Delete a store made by ``create_store``, its products and manager, and ``user_ids``.
+
+    Rows that reference them (orders, flash sales, ...) must be deleted first.
+    """
+    manager_id = db.session.query(Store.manager_id).filter(Store.id == store_id).scalar()
+    Product.query.filter(Product.store_id == store_id).delete(synchronize_session=False)
+    Store.query.filter(Store.id == store_id).delete(synchronize_session=False)
+    User.query.filter(User.id.in_([manager_id, *user_ids])).delete(synchronize_session=False)
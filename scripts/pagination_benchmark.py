@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Benchmark deep pages of GET /api/products in offset mode and cursor mode.
+
+Usage (from the repository root, against a development or staging database):
+    python scripts/pagination_benchmark.py
+    python scripts/pagination_benchmark.py --rows 500000 --per-page 50 --repeat 5
+
+Creates a throwaway store with --rows products, so the catalog has at least
+--rows / --per-page pages (10,000 with the defaults). Offset mode
+(?page=N) is timed at pages 1, 10, 100, 1,000 and 10,000, each --repeat
+times. Cursor mode (?cursor=) can only be reached by walking from the first
+page, so the script follows next_cursor through every page and reports the
+time of the request that served each of those page numbers, plus the whole
+walk. Requests go through the Flask test client with the response cache
+disabled, so every request reaches the database. The fixtures are deleted
+afterwards unless --keep is given.
+
+Offset pages get slower with depth because the database reads and discards
+every earlier row; cursor pages should not.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from loadtest_fixtures import create_store, delete_store, insert_products, new_tag
+from models import db, Product
+from response_cache import invalidate_catalog
+from search import reset_search_index
+
+CHECKPOINTS = (1, 10, 100, 1000, 10000)
+
+
+def create_fixtures(rows):
+    tag = new_tag('pagebench')
+    store = create_store(tag, 'Pagination benchmark')
+    now = datetime.utcnow()
+    insert_products(store, rows, lambda i: {
+        'name': f'{tag} product {i}',
+        'price': 100.0 + i % 1000,
+        'effective_price': 100.0 + i % 1000,
+        'created_at': now - timedelta(seconds=i),
+    })
+    invalidate_catalog()
+    db.session.commit()
+    reset_search_index()
+    return store.id
+
+
+def delete_fixtures(store_id):
+    delete_store(store_id)
+    invalidate_catalog()
+    db.session.commit()
+    reset_search_index()
+
+
+def timed_get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        sys.exit(f'GET {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return elapsed, response.get_json()
+
+
+def offset_mode(client, pages, per_page, repeat):
+    """{page: median seconds} for ?page=N."""
+    return {
+        page: statistics.median(
+            timed_get(client, f'/api/products?page={page}&per_page={per_page}')[0] for _ in range(repeat)
+        )
+        for page in pages
+    }
+
+
+def cursor_mode(client, pages, per_page):
+    """({page: seconds}, seconds for the whole walk) following next_cursor from the first page."""
+    timings = {}
+    cursor = ''
+    page = 0
+    started = time.perf_counter()
+    while page < max(pages):
+        page += 1
+        elapsed, body = timed_get(client, f'/api/products?cursor={cursor}&per_page={per_page}')
+        if page in pages:
+            timings[page] = elapsed
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    return timings, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help='products to create')
+    parser.add_argument('--per-page', type=int, default=20, help='page size (at most 100 in cursor mode)')
+    parser.add_argument('--repeat', type=int, default=3, help='requests per offset page; the median is reported')
+    parser.add_argument('--keep', action='store_true', help='keep the fixtures for another run')
+    args = parser.parse_args()
+
+    app.config['CATALOG_CACHE_TTL'] = 0
+    client = app.test_client()
+    with app.app_context():
+        started = time.monotonic()
+        store_id = create_fixtures(args.rows)
+        total = Product.query.count()
+        print(f'Seeded {args.rows} products in {time.monotonic() - started:.1f}s ({total} in the catalog).')
+    try:
+        last_page = -(-total // args.per_page)
+        pages = [page for page in CHECKPOINTS if page <= last_page]
+        offset = offset_mode(client, pages, args.per_page, args.repeat)
+        cursor, walk = cursor_mode(client, pages, args.per_page)
+    finally:
+        if not args.keep:
+            with app.app_context():
+                delete_fixtures(store_id)
+
+    print(f'{"page":>8} {"offset ms":>10} {"cursor ms":>10}')
+    for page in pages:
+        print(f'{page:>8} {offset[page] * 1000:>10.1f} {cursor[page] * 1000:>10.1f}')
+    print(f'Walked {max(cursor)} cursor pages in {walk:.1f}s '
+          f'({walk / max(cursor) * 1000:.1f} ms per page).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Bulk import or export products for a store.
+
+Usage (from the repository root):
+    python scripts/products_bulk.py import products.csv --store-id 3
+    python scripts/products_bulk.py import products.jsonl --store-id 3 --chunk-size 5000
+    python scripts/products_bulk.py export --store-id 3 --format jsonl -o products.jsonl
+    python scripts/products_bulk.py export > all_products.csv
+
+The format is taken from the file extension (.csv, .jsonl or .ndjson) unless
+--format is given. Imports validate and insert rows in chunks; rows that fail
+validation are printed with their row number and skipped. The columns are
+described in server/product_bulk.py. Use "-" for stdin.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from models import db, Store
+from product_bulk import CHUNK_SIZE, FORMATS, detect_format, export_products, import_products
+
+
+def run_import(args):
+    fmt = args.format or detect_format(args.file)
+    if fmt is None:
+        sys.exit('Cannot tell the format from the file name; pass --format.')
+    if db.session.get(Store, args.store_id) is None:
+        sys.exit(f'Store {args.store_id} does not exist.')
+    if args.file == '-':
+        stream = sys.stdin
+    else:
+        stream = open(args.file, encoding='utf-8-sig', newline='')
+    with stream:
+        result = import_products(stream, fmt, args.store_id, args.chunk_size)
+    for error in result['errors']:
+        print(f"row {error['row']}: {error['message']}", file=sys.stderr)
+    print(f"Imported {result['imported']} product(s); {result['failed']} row(s) failed.")
+
+
+def run_export(args):
+    fmt = args.format or detect_format(args.output) or 'csv'
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    with out:
+        for chunk in export_products(fmt, args.store_id, args.chunk_size):
+            out.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='create products from a CSV or JSONL file')
+    import_parser.add_argument('file', help='file to import, or - for stdin')
+    import_parser.add_argument('--store-id', type=int, required=True, help='store that owns the products')
+    import_parser.set_defaults(run=run_import)
+
+    export_parser = commands.add_parser('export', help='write products as CSV or JSONL')
+    export_parser.add_argument('-o', '--output', default='-', help='output file, or - for stdout')
+    export_parser.add_argument('--store-id', type=int, help='only this store (default: every store)')
+    export_parser.set_defaults(run=run_export)
+
+    for command in (import_parser, export_parser):
+        command.add_argument('--format', choices=FORMATS, help='csv or jsonl')
+        command.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per batch')
+
+    args = parser.parse_args()
+    with app.app_context():
+        args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Recompute the denormalized review stats on products and stores.
+
+Usage (from the repository root):
+    python scripts/reconcile_review_stats.py            # report and repair drift
+    python scripts/reconcile_review_stats.py --dry-run  # report only
+
+rating_sum, rating_count and avg_rating are recomputed from the review table
+and compared with the stored values. Every row that drifted is printed. The
+script is safe to run at any time, and a clean run reports zero drift.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from review_stats import reconcile_review_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report drift without fixing it')
+    args = parser.parse_args()
+
+    with app.app_context():
+        drift = reconcile_review_stats(fix=not args.dry_run)
+        action = 'Found' if args.dry_run else 'Repaired'
+        print(f"{action} drift on {drift['product']} product(s) and {drift['store']} store(s).")
+
+
+if __name__ == '__main__':
+    main()
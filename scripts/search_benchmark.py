@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Benchmark product search against the ILIKE scan it replaced.
+
+Usage (from the repository root, against a development or staging database):
+    python scripts/search_benchmark.py
+    python scripts/search_benchmark.py --rows 500000 --repeat 10 --query "red cot" --query shirt
+
+Creates a throwaway store with --rows products whose names and descriptions
+are drawn from a small vocabulary, then times each --query (a built-in mix
+of common, rare, prefix and multi-word searches by default) two ways:
+
+* search: GET /api/products?search=, i.e. the GIN-indexed tsvector match on
+  PostgreSQL or the in-process index elsewhere (see server/search.py)
+* ilike: the same listing filtered with ``name ILIKE '%q%' OR description
+  ILIKE '%q%'``, as the endpoint did before
+
+Both report the median of --repeat runs and the number of matches. The
+counts differ for multi-word queries, since search matches every word
+anywhere while ILIKE needs the whole string. On databases other than
+PostgreSQL the first search builds the in-process index; that time is
+reported separately, and matches are capped at FALLBACK_MAX_MATCHES (a
+capped count is shown with a trailing +). Requests go through the Flask
+test client with the response cache disabled. The fixtures are deleted
+afterwards unless --keep is given.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from app import app
+from loadtest_fixtures import create_store, delete_store, insert_products, new_tag
+from models import db, Product
+from response_cache import invalidate_catalog
+from search import reset_search_index
+
+WORDS = ('red blue green black white cotton linen wool silk leather shirt dress scarf hat jacket '
+         'shoe bag belt watch ring handmade vintage classic summer winter embroidered printed').split()
+DEFAULT_QUERIES = ('shirt', 'embroidered', 'sh', 'red cotton', 'vintage leather bag', 'zzz')
+
+
+def create_fixtures(rows, seed):
+    rng = random.Random(seed)
+    store = create_store(new_tag('searchbench'), 'Search benchmark')
+    insert_products(store, rows, lambda _i: {
+        'name': ' '.join(rng.sample(WORDS, 3)),
+        'description': ' '.join(rng.choices(WORDS, k=12)),
+    })
+    invalidate_catalog()
+    db.session.commit()
+    reset_search_index()
+    return store.id
+
+
+def delete_fixtures(store_id):
+    delete_store(store_id)
+    invalidate_catalog()
+    db.session.commit()
+    reset_search_index()
+
+
+def time_search(client, query, per_page):
+    started = time.perf_counter()
+    response = client.get('/api/products', query_string={'search': query, 'per_page': per_page})
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        sys.exit(f'search for {query!r} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    body = response.get_json()
+    return elapsed, f"{body['total']}+" if body['total_is_capped'] else body['total']
+
+
+def time_ilike(query, per_page):
+    started = time.perf_counter()
+    with app.app_context():
+        listing = Product.query.filter(
+            (Product.name.ilike(f'%{query}%')) | (Product.description.ilike(f'%{query}%'))
+        )
+        total = listing.count()
+        listing.limit(per_page).all()
+    return time.perf_counter() - started, total
+
+
+def median_run(run, repeat):
+    runs = [run() for _ in range(repeat)]
+    return statistics.median(elapsed for elapsed, _ in runs), runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='products to create')
+    parser.add_argument('--query', action='append', help='search to time (repeatable; default: a built-in mix)')
+    parser.add_argument('--per-page', type=int, default=20, help='page size')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per query; the median is reported')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the generated products')
+    parser.add_argument('--keep', action='store_true', help='keep the fixtures for another run')
+    args = parser.parse_args()
+
+    app.config['CATALOG_CACHE_TTL'] = 0
+    client = app.test_client()
+    with app.app_context():
+        started = time.monotonic()
+        store_id = create_fixtures(args.rows, args.seed)
+        print(f'Seeded {args.rows} products in {time.monotonic() - started:.1f}s '
+              f'on {db.engine.dialect.name}.')
+    try:
+        first, _ = time_search(client, WORDS[0], args.per_page)
+        print(f'First search (builds the in-process index outside PostgreSQL): {first * 1000:.1f} ms')
+        print(f'{"query":<24} {"search ms":>10} {"matches":>8} {"ilike ms":>10} {"matches":>8}')
+        for query in args.query or DEFAULT_QUERIES:
+            search_ms, search_total = median_run(lambda: time_search(client, query, args.per_page), args.repeat)
+            ilike_ms, ilike_total = median_run(lambda: time_ilike(query, args.per_page), args.repeat)
+            print(f'{query:<24} {search_ms * 1000:>10.1f} {search_total:>8} {ilike_ms * 1000:>10.1f} {ilike_total:>8}')
+    finally:
+        if not args.keep:
+            with app.app_context():
+                delete_fixtures(store_id)
+
+
+if __name__ == '__main__':
+    main()
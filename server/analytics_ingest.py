@@ -0,0 +1,403 @@
+"""Buffered ingestion for storefront analytics events.
+
+Every product view, click and add-to-cart used to cost a product lookup plus
+an INSERT and COMMIT on the request path. Events now take this path instead:
+
+1. ``validate_event`` checks the event against a cached set of product ids,
+   so accepting an event does not touch the database.
+2. ``AnalyticsIngestor.enqueue`` appends accepted events to a local spool
+   file (one JSON object per line) and returns. Because the spool is written
+   before the request is acknowledged, events survive a process restart.
+3. A background worker rotates the spool into a segment every
+   ``ANALYTICS_FLUSH_EVENTS`` events or ``ANALYTICS_FLUSH_INTERVAL_MS``
+   milliseconds, whichever comes first. It writes each segment with one
+   multi-row INSERT and deletes it once committed.
+
+Spool files are named per process, so several workers can share one spool
+directory. Each process ingests only its own segments, so the events it
+counts as pending are exactly the ones it writes. Files left behind by a dead
+process are adopted (renamed into the adopter's ready queue, which is atomic,
+so only one process gets them) when a worker starts and on every flush.
+
+When more than ``ANALYTICS_MAX_PENDING`` of a process's events are waiting to
+be written, ``enqueue`` raises ``IngestBackpressure`` so callers can shed
+load (HTTP 503) instead of letting the spool grow without bound.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from models import db, Product, ProductAnalytics
+from analytics_rollup import refresh_days
+from sqlalchemy.exc import IntegrityError
+from logger import setup_logger
+
+logger = setup_logger()
+
+VALID_ACTIONS = ['view', 'click', 'add_to_cart', 'add_to_wishlist']
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(__file__), 'instance', 'analytics_spool')
+
+# Seconds a cached product-id set stays fresh, and the minimum gap between
+# refreshes triggered by an unknown id (so bogus ids cannot hammer the DB)
+PRODUCT_IDS_TTL = 300
+PRODUCT_IDS_MIN_REFRESH = 5
+
+
+class IngestBackpressure(Exception):
+    """Raised when too many events are waiting to be written."""
+
+
+class ProductIdCache:
+    """Process-wide set of existing product ids, refreshed on a TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = frozenset()
+        self._loaded_at = 0.0
+
+    def _refresh(self):
+        self._ids = frozenset(pid for (pid,) in db.session.query(Product.id).all())
+        self._loaded_at = time.monotonic()
+
+    def contains(self, product_id):
+        with self._lock:
+            age = time.monotonic() - self._loaded_at
+            if age > PRODUCT_IDS_TTL:
+                self._refresh()
+            elif product_id not in self._ids and age > PRODUCT_IDS_MIN_REFRESH:
+                # Possibly a product created since the last refresh
+                self._refresh()
+            return product_id in self._ids
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+product_ids = ProductIdCache()
+
+
+def validate_event(data, user_id=None, user_agent=None):
+    """Validate one raw event and return ``(record, error, status)``.
+
+    ``record`` is the dict to spool, or None with an error message and the
+    HTTP status the single-event endpoint should return.
+    """
+    if not isinstance(data, dict):
+        return None, 'Event must be an object', 400
+
+    product_id = data.get('product_id')
+    action = data.get('action')
+    if not product_id or not action:
+        return None, 'product_id and action are required', 400
+
+    if action not in VALID_ACTIONS:
+        return None, f'Invalid action. Must be one of: {", ".join(VALID_ACTIONS)}', 400
+
+    try:
+        product_id = int(product_id)
+    except (TypeError, ValueError):
+        return None, 'Product not found', 404
+    if not product_ids.contains(product_id):
+        return None, 'Product not found', 404
+
+    time_spent = data.get('time_spent')
+    try:
+        time_spent = float(time_spent) if time_spent is not None else None
+    except (TypeError, ValueError):
+        time_spent = None
+
+    referrer = data.get('referrer')
+    record = {
+        'product_id': product_id,
+        'user_id': user_id,
+        'action': action,
+        'time_spent': time_spent,
+        'referrer': referrer[:500] if isinstance(referrer, str) else None,
+        'user_agent': user_agent,
+        # Stamp on arrival so a delayed flush does not shift the event's time
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    return record, None, 201
+
+
+class AnalyticsIngestor:
+    """Spool-backed event buffer with a background flush worker."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._pid = None
+        self._active_path = None
+        self._active_file = None
+        self._active_count = 0
+        self._active_opened_at = None
+        self._pending = 0
+        # Days whose rollup refresh failed, retried on the next flush
+        self._unrefreshed_days = set()
+        self.stats = {
+            'accepted': 0,
+            'rejected_backpressure': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'flush_failures': 0,
+            'last_flush_at': None,
+            'last_flush_ms': None,
+            'last_batch_size': 0
+        }
+
+    def init_app(self, app):
+        self.app = app
+        self.spool_dir = app.config.get('ANALYTICS_SPOOL_DIR') or DEFAULT_SPOOL_DIR
+        self.flush_events = app.config.get('ANALYTICS_FLUSH_EVENTS', 500)
+        self.flush_interval = app.config.get('ANALYTICS_FLUSH_INTERVAL_MS', 1000) / 1000.0
+        self.max_pending = app.config.get('ANALYTICS_MAX_PENDING', 50000)
+
+    # Spool files ---------------------------------------------------------
+
+    def _spool_path(self, kind, pid, suffix=''):
+        return os.path.join(self.spool_dir, f'{kind}-{pid}{suffix}.jsonl')
+
+    def _ensure_started(self):
+        """Open this process's spool and start the worker (once per process)."""
+        pid = os.getpid()
+        if self._pid == pid and self._worker is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._worker is not None:
+                return
+            # After a fork the parent's file handle and thread are not ours
+            self._pid = pid
+            self._active_file = None
+            self._active_count = 0
+            self._pending = 0
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._pending += self._recover_orphans(starting=True)
+            self._active_path = self._spool_path('events', pid)
+            self._worker = threading.Thread(
+                target=self._run, name='analytics-ingest', daemon=True
+            )
+            self._worker.start()
+
+    def _recover_orphans(self, starting=False):
+        """Move spool files of dead processes into this process's ready queue.
+
+        Returns the number of events adopted, which become this process's
+        pending events. When ``starting``, files already named after this pid
+        belong to an earlier process that had the same pid and are adopted too.
+        """
+        recovered = 0
+        for kind in ('events', 'claimed', 'ready'):
+            for path in glob.glob(os.path.join(self.spool_dir, f'{kind}-*.jsonl')):
+                owner = os.path.basename(path)[len(kind) + 1:].split('.')[0].split('-')[0]
+                if owner.isdigit() and int(owner) == self._pid:
+                    if starting and kind == 'ready':
+                        recovered += _count_lines(path)
+                    if not starting or kind == 'ready':
+                        continue
+                elif owner.isdigit() and _pid_alive(int(owner)):
+                    continue
+                ready = os.path.join(
+                    self.spool_dir,
+                    f'ready-{self._pid}-{time.time_ns()}.jsonl'
+                )
+                try:
+                    os.rename(path, ready)
+                except OSError:
+                    continue  # another process recovered it first
+                recovered += _count_lines(ready)
+        if recovered:
+            logger.info(f"Recovered {recovered} spooled analytics events")
+        return recovered
+
+    def enqueue(self, records):
+        """Durably append validated records to the spool.
+
+        Raises IngestBackpressure when the writer has fallen too far behind.
+        """
+        if not records:
+            return
+        self._ensure_started()
+        lines = ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records)
+        with self._lock:
+            if self._pending + len(records) > self.max_pending:
+                self.stats['rejected_backpressure'] += len(records)
+                raise IngestBackpressure()
+            if self._active_file is None:
+                self._active_file = open(self._active_path, 'a', encoding='utf-8')
+                self._active_opened_at = time.monotonic()
+            self._active_file.write(lines)
+            self._active_file.flush()
+            self._active_count += len(records)
+            self._pending += len(records)
+            self.stats['accepted'] += len(records)
+            should_flush = self._active_count >= self.flush_events
+        if should_flush:
+            self._wakeup.set()
+
+    def _rotate(self):
+        """Turn the active spool file into a ready segment."""
+        with self._lock:
+            if self._active_file is None:
+                return
+            self._active_file.close()
+            self._active_file = None
+            self._active_count = 0
+            os.rename(
+                self._active_path,
+                os.path.join(self.spool_dir, f'ready-{self._pid}-{time.time_ns()}.jsonl')
+            )
+
+    # Worker --------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                with self._lock:
+                    self.stats['flush_failures'] += 1
+                logger.error(f"Analytics flush failed: {str(e)}")
+
+    def flush(self):
+        """Write every spooled event to the database. Requires an app context."""
+        self._ensure_started()
+        self._rotate()
+        recovered = self._recover_orphans()
+        if recovered:
+            with self._lock:
+                self._pending += recovered
+        # Segments a failed flush left claimed by this process go first
+        for path in sorted(glob.glob(self._spool_path('claimed', self._pid, '-*'))):
+            self._ingest_segment(path)
+        # Only this process's segments: their events are in this process's _pending
+        for path in sorted(glob.glob(self._spool_path('ready', self._pid, '-*'))):
+            claimed = os.path.join(
+                self.spool_dir,
+                f'claimed-{self._pid}-{os.path.basename(path)[len("ready-"):]}'
+            )
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # adopted by another process after we were presumed dead
+            self._ingest_segment(claimed)
+
+    def _ingest_segment(self, path):
+        started = time.monotonic()
+        rows = []
+        lines = 0
+        torn = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                    rows.append(row)
+                except (ValueError, KeyError):
+                    # A torn final line from a crash mid-write; nothing to recover
+                    torn += 1
+
+        written = self._insert_rows(rows)
+        os.remove(path)
+        # The segment is gone, so its events are no longer pending whatever happens next
+        with self._lock:
+            self._pending = max(self._pending - lines, 0)
+            self.stats['flushed'] += written
+            self.stats['dropped'] += torn + len(rows) - written
+            self.stats['last_flush_at'] = datetime.utcnow().isoformat()
+            self.stats['last_flush_ms'] = round((time.monotonic() - started) * 1000, 1)
+            self.stats['last_batch_size'] = len(rows)
+            # Events recovered after a restart may land in days already rolled up
+            days = self._unrefreshed_days | {row['timestamp'].date() for row in rows}
+            self._unrefreshed_days = set()
+        if not days:
+            return
+        try:
+            refresh_days(days)
+        except Exception as e:
+            db.session.rollback()
+            with self._lock:
+                self._unrefreshed_days |= days
+            logger.error(f"Refreshing analytics rollups for {len(days)} day(s) failed: {str(e)}")
+
+    def _insert_rows(self, rows):
+        """Multi-row INSERT of a segment. Returns how many rows were written."""
+        if not rows:
+            return 0
+        table = ProductAnalytics.__table__
+        try:
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+            return len(rows)
+        except IntegrityError:
+            # A product was deleted between validation and flush; drop its
+            # events and write the rest
+            db.session.rollback()
+            product_ids.invalidate()
+            existing = {pid for (pid,) in db.session.query(Product.id).filter(
+                Product.id.in_({r['product_id'] for r in rows})
+            ).all()}
+            rows = [r for r in rows if r['product_id'] in existing]
+            if rows:
+                db.session.execute(table.insert(), rows)
+                db.session.commit()
+            return len(rows)
+
+    def metrics(self):
+        """Backpressure and throughput counters for monitoring."""
+        with self._lock:
+            pending = self._pending
+            oldest_age = (
+                round(time.monotonic() - self._active_opened_at, 3)
+                if self._active_file is not None else None
+            )
+        spool_bytes = 0
+        if self._pid is not None:
+            for path in glob.glob(os.path.join(self.spool_dir, '*.jsonl')):
+                try:
+                    spool_bytes += os.path.getsize(path)
+                except OSError:
+                    pass
+        return dict(
+            self.stats,
+            pending=pending,
+            max_pending=self.max_pending,
+            utilization=round(pending / self.max_pending, 4) if self.max_pending else None,
+            active_spool_age_seconds=oldest_age,
+            spool_bytes=spool_bytes,
+            flush_events=self.flush_events,
+            flush_interval_ms=int(self.flush_interval * 1000),
+            worker_alive=bool(self._worker and self._worker.is_alive())
+        )
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+ingestor = AnalyticsIngestor()
@@ -0,0 +1,274 @@
+"""Daily rollups of ProductAnalytics.
+
+The dashboards used to aggregate the raw event table on every request, so
+their cost grew with the table's lifetime. ``product_analytics_daily`` keeps
+one row per (product, day, action) with the event count and time-spent totals.
+Readers combine the rollups for closed days with the raw events newer than the
+rollup watermark, so a request touches at most about a day of raw events
+however long the history is.
+
+The watermark (``analytics_rollup_state.rolled_through``) is the last day
+whose rollups are complete. A background worker advances it once a day has
+closed (plus a grace period for events still in the ingest spool). The worker
+rolls up at most ``MAX_DAYS_PER_RUN`` days per run, so a fresh deployment
+catches up gradually. ``scripts/backfill_analytics_rollups.py`` does the same
+in bulk for history.
+
+Use ``analytics_events_subquery`` to read. It returns rows shaped like the
+rollup table, covering rollups up to the watermark plus raw events after it.
+Aggregate it with ``func.sum``, never ``func.count``.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, ProductAnalytics, ProductAnalyticsDaily, AnalyticsRollupState
+from sqlalchemy import func, literal
+from sqlalchemy.exc import IntegrityError
+from logger import setup_logger
+
+logger = setup_logger()
+
+STATE_NAME = 'product_analytics_daily'
+
+# How long after midnight (UTC) a day is still considered open to late events
+ROLLUP_GRACE = timedelta(minutes=15)
+
+# Seconds between background rollup runs, and the most days one run aggregates
+ROLLUP_INTERVAL = 300
+MAX_DAYS_PER_RUN = 31
+
+
+def get_rolled_through():
+    """Last day covered by the rollups, or None if nothing is rolled up yet."""
+    return db.session.query(AnalyticsRollupState.rolled_through).filter_by(
+        name=STATE_NAME
+    ).scalar()
+
+
+def _set_rolled_through(day):
+    state = AnalyticsRollupState.query.get(STATE_NAME)
+    if state is None:
+        state = AnalyticsRollupState(name=STATE_NAME)
+        db.session.add(state)
+    state.rolled_through = day
+
+
+def rollup_day(day):
+    """Recompute the rollup rows for one day from raw events. Does not commit."""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+
+    ProductAnalyticsDaily.query.filter(ProductAnalyticsDaily.date == day).delete(
+        synchronize_session=False
+    )
+
+    select = db.session.query(
+        ProductAnalytics.product_id,
+        literal(day, ProductAnalyticsDaily.date.type),
+        ProductAnalytics.action,
+        func.count(ProductAnalytics.id),
+        func.coalesce(func.sum(ProductAnalytics.time_spent), 0.0),
+        func.count(ProductAnalytics.time_spent)
+    ).filter(
+        ProductAnalytics.timestamp >= start,
+        ProductAnalytics.timestamp < end
+    ).group_by(ProductAnalytics.product_id, ProductAnalytics.action)
+
+    db.session.execute(
+        ProductAnalyticsDaily.__table__.insert().from_select(
+            ['product_id', 'date', 'action', 'event_count', 'time_spent_sum', 'time_spent_count'],
+            select.statement
+        )
+    )
+
+
+def last_closed_day(now=None):
+    now = now or datetime.utcnow()
+    return (now - ROLLUP_GRACE).date() - timedelta(days=1)
+
+
+def advance_rollups(now=None, max_days=MAX_DAYS_PER_RUN):
+    """Roll up closed days past the watermark, one commit per day.
+
+    Returns the number of days rolled up.
+    """
+    target = last_closed_day(now)
+    rolled_through = get_rolled_through()
+
+    if rolled_through is None:
+        first_event = db.session.query(func.min(ProductAnalytics.timestamp)).scalar()
+        if first_event is None:
+            _set_rolled_through(target)
+            db.session.commit()
+            return 0
+        day = first_event.date()
+    else:
+        day = rolled_through + timedelta(days=1)
+
+    done = 0
+    while day <= target and done < max_days:
+        try:
+            rollup_day(day)
+            _set_rolled_through(day)
+            db.session.commit()
+        except IntegrityError:
+            # Another process rolled this day up concurrently
+            db.session.rollback()
+        day += timedelta(days=1)
+        done += 1
+    return done
+
+
+def backfill_rollups(first_day, last_day):
+    """Recompute every day in [first_day, last_day] and extend the watermark.
+
+    The watermark only moves forward when the range joins onto the days
+    already covered, so a backfill never leaves a gap behind it.
+    """
+    last_day = min(last_day, last_closed_day())
+    day = first_day
+    done = 0
+    while day <= last_day:
+        rollup_day(day)
+        rolled_through = get_rolled_through()
+        if rolled_through is None or rolled_through >= day - timedelta(days=1):
+            if rolled_through is None or day > rolled_through:
+                _set_rolled_through(day)
+        db.session.commit()
+        day += timedelta(days=1)
+        done += 1
+    return done
+
+
+def refresh_days(days):
+    """Recompute already rolled-up days that received late events."""
+    rolled_through = get_rolled_through()
+    if rolled_through is None:
+        return
+    stale = sorted(d for d in set(days) if d <= rolled_through)
+    for day in stale:
+        rollup_day(day)
+    if stale:
+        db.session.commit()
+        logger.info(f"Refreshed analytics rollups for {len(stale)} day(s) with late events")
+
+
+def analytics_events_subquery(start_date=None, actions=None):
+    """Events since ``start_date`` as rollup-shaped rows.
+
+    Columns: product_id, day, action, event_count, time_spent_sum,
+    time_spent_count. Rollups serve whole days up to the watermark. Raw events
+    fill in the rest: a partial first day, and everything after the watermark.
+    """
+    ensure_rollup_worker()
+    rolled_through = get_rolled_through()
+
+    selects = []
+
+    # Rollups cover whole days, so a start part-way through a day reads that day raw
+    first_full_day = None
+    if start_date is not None:
+        first_full_day = start_date.date()
+        if start_date != datetime.combine(first_full_day, datetime.min.time()):
+            first_full_day += timedelta(days=1)
+            partial_end = datetime.combine(first_full_day, datetime.min.time())
+            if rolled_through is not None and first_full_day <= rolled_through + timedelta(days=1):
+                selects.append(_raw_select(start_date, partial_end, actions))
+
+    if rolled_through is not None and (first_full_day is None or first_full_day <= rolled_through):
+        selects.append(_rollup_select(first_full_day, rolled_through, actions))
+
+    tail_start = (
+        datetime.combine(rolled_through + timedelta(days=1), datetime.min.time())
+        if rolled_through is not None else None
+    )
+    if start_date is not None and (tail_start is None or start_date > tail_start):
+        tail_start = start_date
+    selects.append(_raw_select(tail_start, None, actions))
+
+    query = selects[0]
+    if len(selects) > 1:
+        query = query.union_all(*selects[1:])
+    return query.subquery()
+
+
+def _rollup_select(first_day, last_day, actions):
+    query = db.session.query(
+        ProductAnalyticsDaily.product_id.label('product_id'),
+        ProductAnalyticsDaily.date.label('day'),
+        ProductAnalyticsDaily.action.label('action'),
+        ProductAnalyticsDaily.event_count.label('event_count'),
+        ProductAnalyticsDaily.time_spent_sum.label('time_spent_sum'),
+        ProductAnalyticsDaily.time_spent_count.label('time_spent_count')
+    ).filter(ProductAnalyticsDaily.date <= last_day)
+    if first_day is not None:
+        query = query.filter(ProductAnalyticsDaily.date >= first_day)
+    if actions:
+        query = query.filter(ProductAnalyticsDaily.action.in_(actions))
+    return query
+
+
+def _raw_select(start, end, actions):
+    day = func.date(ProductAnalytics.timestamp)
+    query = db.session.query(
+        ProductAnalytics.product_id.label('product_id'),
+        day.label('day'),
+        ProductAnalytics.action.label('action'),
+        func.count(ProductAnalytics.id).label('event_count'),
+        func.coalesce(func.sum(ProductAnalytics.time_spent), 0.0).label('time_spent_sum'),
+        func.count(ProductAnalytics.time_spent).label('time_spent_count')
+    )
+    if start is not None:
+        query = query.filter(ProductAnalytics.timestamp >= start)
+    if end is not None:
+        query = query.filter(ProductAnalytics.timestamp < end)
+    if actions:
+        query = query.filter(ProductAnalytics.action.in_(actions))
+    return query.group_by(ProductAnalytics.product_id, day, ProductAnalytics.action)
+
+
+class RollupWorker:
+    """Background thread that keeps the rollups current (one per process)."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def ensure_started(self):
+        if self.app is None or self.app.config.get('TESTING'):
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='analytics-rollup', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    days = advance_rollups()
+                    if days:
+                        logger.info(f"Rolled up {days} day(s) of product analytics")
+            except Exception as e:
+                logger.error(f"Analytics rollup failed: {str(e)}")
+            time.sleep(ROLLUP_INTERVAL)
+
+
+rollup_worker = RollupWorker()
+
+
+def ensure_rollup_worker():
+    rollup_worker.ensure_started()
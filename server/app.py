@@ -11,6 +11,15 @@ import os
 
 from config import Config
 from models import db, CommissionRate
+from commission_engine import invalidate_commission_tiers
+from analytics_ingest import ingestor as analytics_ingestor
+from analytics_rollup import rollup_worker as analytics_rollup_worker
+from home_snapshot import home_snapshot
+from flash_sale import flash_sale_worker
+from pricing import pricing_worker
+from image_variants import image_pipeline
+from user_cache import load_current_user
+from authz import token_is_revoked
 from sqlalchemy.exc import ProgrammingError
 from routes.auth import auth_bp
 from routes.products import products_bp
@@ -24,6 +33,7 @@ from routes.wishlist import wishlist_bp
 from routes.commission_rates import commission_rates_bp
 from routes.notifications import notifications_bp
 from routes.commissions import commissions_bp
+from routes.flash_sales import flash_sales_bp
 from logger import setup_logger
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -35,6 +45,14 @@ app.config.from_object(Config)
 db.init_app(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
+jwt.user_lookup_loader(load_current_user)
+jwt.token_in_blocklist_loader(token_is_revoked)
+analytics_ingestor.init_app(app)
+analytics_rollup_worker.init_app(app)
+home_snapshot.init_app(app)
+flash_sale_worker.init_app(app)
+pricing_worker.init_app(app)
+image_pipeline.init_app(app)
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}, r"/uploads/*": {"origins": "http://localhost:5173"}}, supports_credentials=True)
 
 # Set up logger
@@ -77,6 +95,7 @@ def ensure_default_commission_rates():
 			created = True
 
 	if created:
+		invalidate_commission_tiers()
 		db.session.commit()
 		logger.info('Default commission rates initialized.')
 
@@ -106,6 +125,12 @@ def custom_revoked_token(jwt_header, jwt_payload):
 	app.logger.warning("JWT revoked token for identity: %s", jwt_payload.get("sub"))
 	return jsonify({"msg": "Token has been revoked"}), 401
 
+
+@jwt.user_lookup_error_loader
+def custom_user_lookup_error(jwt_header, jwt_payload):
+	app.logger.warning("JWT user not found for identity: %s", jwt_payload.get("sub"))
+	return jsonify({"msg": "User not found"}), 401
+
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(products_bp, url_prefix='/api')
@@ -119,6 +144,7 @@ app.register_blueprint(wishlist_bp, url_prefix='/api/wishlist')
 app.register_blueprint(commission_rates_bp)
 app.register_blueprint(notifications_bp)
 app.register_blueprint(commissions_bp)
+app.register_blueprint(flash_sales_bp)
 
 with app.app_context():
 	try:
@@ -0,0 +1,81 @@
+"""Authorization from JWT claims.
+
+Access tokens carry the user's ``role``, ``store_id`` and permissions version
+(``pv``) alongside the identity, so ``require_role`` can authorize a request
+without loading the user.
+
+Claims are only as fresh as the token. ``users.perms_version`` is bumped
+whenever a user's role or credentials change (``revoke_user_tokens``), and
+``token_is_revoked``, registered as the token_in_blocklist_loader, rejects any
+token whose ``pv`` no longer matches. The check reads ``perms_version`` with a
+primary-key query on every request rather than through user_cache: cached
+users are only invalidated in the worker that made the change, so other
+workers would keep accepting revoked tokens until the entry expired. A revoked
+user has to log in again and gets a token with their current claims.
+"""
+
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import current_user, get_jwt, jwt_required
+from models import db, User
+
+
+def token_claims(user):
+    """Additional claims for tokens issued to ``user``."""
+    return {
+        'role': user.role,
+        'store_id': user.store.id if user.store else None,
+        'pv': user.perms_version or 0,
+    }
+
+
+def token_is_revoked(_jwt_header, jwt_payload):
+    """token_in_blocklist_loader: reject tokens for deleted users or stale permissions."""
+    try:
+        user_id = int(jwt_payload[current_app.config['JWT_IDENTITY_CLAIM']])
+    except (KeyError, TypeError, ValueError):
+        return True
+    row = db.session.query(User.perms_version).filter_by(id=user_id).first()
+    if row is None:
+        return True
+    return jwt_payload.get('pv', 0) != (row.perms_version or 0)
+
+
+def revoke_user_tokens(user):
+    """Invalidate every token issued to ``user`` so far. Caller commits, then calls invalidate_user."""
+    user.perms_version = (user.perms_version or 0) + 1
+
+
+def claimed_role():
+    """The role in the current token, falling back to the user for tokens issued without claims."""
+    role = get_jwt().get('role')
+    if role is None and current_user is not None:
+        role = current_user.role
+    return role
+
+
+def claimed_store_id():
+    """The store id in the current token.
+
+    A manager who created their store after logging in has no store_id claim
+    yet; the store is then read from the (cached) user instead.
+    """
+    store_id = get_jwt().get('store_id')
+    if store_id is None and current_user is not None and current_user.store:
+        store_id = current_user.store.id
+    return store_id
+
+
+def require_role(*roles):
+    """Like ``jwt_required()``, and respond 403 unless the token's role is one of ``roles``."""
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if claimed_role() not in roles:
+                return jsonify({'message': 'Unauthorized'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
@@ -0,0 +1,79 @@
+"""Version counters for process-local caches shared across workers.
+
+Each gunicorn worker keeps its own in-memory caches, so a write handled by
+one worker cannot clear the others' copies directly. Instead, every cached
+dataset has a row in ``cache_version``. Writers bump the counter in the same
+transaction as their change. Readers compare the counter with the version
+their copy was built from and reload on mismatch.
+
+The counter is read at most once per request (memoised on ``flask.g``), so a
+cached lookup costs one primary-key read per request instead of reloading the
+dataset. Every worker sees a change from its next request onwards.
+"""
+
+import threading
+
+from flask import g, has_request_context
+from models import db, CacheVersion
+from sqlalchemy.exc import IntegrityError
+
+
+def bump_version(name):
+    """Increment the version of ``name`` in the current transaction. Caller commits."""
+    updated = db.session.query(CacheVersion).filter_by(name=name).update(
+        {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(CacheVersion(name=name, version=1))
+        except IntegrityError:
+            # Created concurrently; increment the row that now exists
+            db.session.query(CacheVersion).filter_by(name=name).update(
+                {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+            )
+    if has_request_context():
+        # Later reads in this request should see the new version
+        g.pop('_cache_versions', None)
+
+
+def current_version(name):
+    """The committed version of ``name``, read once per request."""
+    memo = None
+    if has_request_context():
+        memo = g.setdefault('_cache_versions', {})
+        if name in memo:
+            return memo[name]
+    version = db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+    if memo is not None:
+        memo[name] = version
+    return version
+
+
+class VersionedCache:
+    """A process-wide value rebuilt whenever its version counter changes.
+
+    ``loader`` must return plain data, not ORM instances, since the value
+    outlives the session it was loaded in.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+
+    def get(self):
+        version = current_version(self.name)
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._value = self.loader()
+                    self._version = version
+        return self._value
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+            self._version = None
@@ -0,0 +1,236 @@
+"""Stock reservation and order writes for ``create_order``.
+
+Checkout used to load each cart product with its own query, compare stock in
+Python and write ``product.stock_quantity -= quantity`` through the ORM. Two
+concurrent checkouts could both pass the check and both decrement, which
+oversold the last units.
+
+Now all cart products are loaded with one IN query. Stock is taken with one
+conditional UPDATE per product::
+
+    UPDATE product SET stock_quantity = stock_quantity - :q
+    WHERE id = :id AND stock_quantity >= :q
+
+The database checks and decrements in one step, under the row lock. A
+checkout waiting on that lock re-evaluates the condition against the
+committed stock (PostgreSQL READ COMMITTED), so stock never goes negative. An
+UPDATE that matches no row means the product ran out; the caller rolls back
+and nothing the checkout reserved is kept. Products are updated in
+product-id order, so two checkouts that share products lock them in the same
+order and cannot deadlock.
+
+Products in a flash sale skip the UPDATE and are admitted from an
+in-process stock pool instead; see flash_sale.py.
+
+Line prices are not taken from the client. ``verify_prices`` prices every
+line from the loaded product rows (see pricing.py) and rejects a cart whose
+prices or totals differ, so an order is always written at the current price.
+
+Orders, order items and payments are then written with one multi-row INSERT
+each instead of flushing every object separately.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+from models import db, Order, OrderItem, Payment, Product
+from sqlalchemy import insert
+from sqlalchemy.orm.util import identity_key
+from flash_sale import active_flash_sale, flash_stock, release_flash_units
+from pricing import current_price, prices_match
+
+
+class CheckoutError(Exception):
+    """A cart that cannot be checked out. ``message`` is returned to the client."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class OutOfStock(CheckoutError):
+    pass
+
+
+class PriceMismatch(CheckoutError):
+    """The cart's prices or totals are stale. ``prices`` maps each cart product to its current price."""
+
+    def __init__(self, message, prices):
+        super().__init__(message)
+        self.prices = prices
+
+
+def checkout_lines(items):
+    """Validate the request's cart items into [{'product_id', 'quantity', 'price'}]."""
+    lines = []
+    for item in items:
+        try:
+            product_id = int(item['id'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError(f'Invalid product: {item.get("id") if isinstance(item, dict) else item}')
+        quantity = item.get('quantity')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise CheckoutError(f'Invalid quantity for product {product_id}')
+        price = item.get('price')
+        if not isinstance(price, (int, float)) or isinstance(price, bool):
+            raise CheckoutError(f'Invalid price for product {product_id}')
+        lines.append({'product_id': product_id, 'quantity': quantity, 'price': price})
+    return lines
+
+
+def load_products(lines):
+    """{product_id: Product} for every line, in one query. CheckoutError names the first unknown product."""
+    product_ids = {line['product_id'] for line in lines}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    for line in lines:
+        if line['product_id'] not in products:
+            raise CheckoutError(f'Invalid product: {line["product_id"]}')
+    return products
+
+
+def verify_prices(lines, products, subtotal=None, tax=0, shipping_cost=0, total=None, now=None):
+    """Price every line from ``products`` and check the client's totals. Returns (subtotal, total).
+
+    Lines whose price differs from the current price, or a subtotal or total
+    that does not add up, raise PriceMismatch. Omitted totals are computed.
+    """
+    now = now or datetime.utcnow()
+    prices = {product_id: current_price(product, now) for product_id, product in products.items()}
+    for line in lines:
+        price = prices[line['product_id']]
+        if not prices_match(line['price'], price):
+            raise PriceMismatch(f'Price of {products[line["product_id"]].name} is now {price}', prices)
+        line['price'] = price
+
+    expected_subtotal = round(sum(line['price'] * line['quantity'] for line in lines), 2)
+    if subtotal is not None and not prices_match(subtotal, expected_subtotal):
+        raise PriceMismatch(f'Subtotal does not match the cart. Expected: {expected_subtotal}', prices)
+    expected_total = round(expected_subtotal + tax + shipping_cost, 2)
+    if total is not None and not prices_match(total, expected_total):
+        raise PriceMismatch(f'Total does not match the cart. Expected: {expected_total}', prices)
+    return expected_subtotal, expected_total
+
+
+def group_by_store(lines, products):
+    """{store_id: [line]} in cart order."""
+    items_by_store = {}
+    for line in lines:
+        items_by_store.setdefault(products[line['product_id']].store_id, []).append(line)
+    return items_by_store
+
+
+def _take_flash_units(quantities, products, now):
+    """Admit flash-sale lines from the in-process pools. Returns [(sale_id, quantity)] taken."""
+    taken = []
+    sale_ids = {}
+    for product_id in sorted(quantities):
+        sale = active_flash_sale(product_id, now)
+        if sale is None:
+            continue
+        if not flash_stock.take(sale.id, quantities[product_id]):
+            release_flash_units(taken)
+            raise OutOfStock(
+                f'Insufficient stock for product {products[product_id].name}. '
+                f'Available: {flash_stock.available(sale.id)}, Requested: {quantities[product_id]}'
+            )
+        taken.append((sale.id, quantities[product_id]))
+        sale_ids[product_id] = sale.id
+    return taken, sale_ids
+
+
+def reserve_stock(lines, products, now=None):
+    """Take every line's quantity off stock. Does not commit.
+
+    Products in an active flash sale are taken from its stock pool (see
+    flash_sale.py) and their lines get ``flash_sale_id``; the rest are taken
+    with the conditional UPDATE. Returns the flash units taken, which the
+    caller must hand to ``release_flash_units`` if the checkout does not
+    commit. Raises OutOfStock, after releasing them itself; the caller must
+    roll back.
+    """
+    quantities = defaultdict(int)
+    for line in lines:
+        quantities[line['product_id']] += line['quantity']
+
+    # Pools first: claiming more units commits on its own connection, which
+    # must not wait behind row locks this transaction already holds
+    taken, sale_ids = _take_flash_units(quantities, products, now)
+    for line in lines:
+        line['flash_sale_id'] = sale_ids.get(line['product_id'])
+
+    for product_id in sorted(quantities):
+        if product_id in sale_ids:
+            continue
+        quantity = quantities[product_id]
+        reserved = db.session.query(Product).filter(
+            Product.id == product_id,
+            Product.stock_quantity >= quantity
+        ).update({Product.stock_quantity: Product.stock_quantity - quantity}, synchronize_session=False)
+        if not reserved:
+            release_flash_units(taken)
+            available = db.session.query(Product.stock_quantity).filter(Product.id == product_id).scalar()
+            raise OutOfStock(
+                f'Insufficient stock for product {products[product_id].name}. '
+                f'Available: {available}, Requested: {quantity}'
+            )
+        loaded = db.session.identity_map.get(identity_key(Product, product_id))
+        if loaded is not None:
+            db.session.expire(loaded, ['stock_quantity', 'updated_at'])
+    return taken
+
+
+def write_orders(user_id, items_by_store, shipping_address, payment_method, subtotal, tax, shipping_cost):
+    """Insert one pending order per store with its items and payment. Returns the created_orders summary."""
+    num_stores = len(items_by_store)
+    now = datetime.utcnow()
+    order_rows = []
+    for store_id, store_items in items_by_store.items():
+        # Calculate this store's portion
+        store_subtotal = sum(item['price'] * item['quantity'] for item in store_items)
+
+        # Split tax and shipping proportionally
+        proportion = store_subtotal / subtotal if subtotal > 0 else (1 / num_stores)
+        store_tax = tax * proportion
+        store_shipping = shipping_cost * proportion
+        order_rows.append({
+            'user_id': user_id,
+            'store_id': store_id,
+            'total_amount': store_subtotal + store_tax + store_shipping,
+            'status': 'pending',
+            'shipping_address': shipping_address,
+            'created_at': now,
+            'updated_at': now,
+        })
+
+    order_ids = db.session.execute(
+        insert(Order).returning(Order.id, sort_by_parameter_order=True), order_rows
+    ).scalars().all()
+
+    item_rows = []
+    payment_rows = []
+    created_orders = []
+    for order_id, order_row, store_items in zip(order_ids, order_rows, items_by_store.values()):
+        item_rows.extend({
+            'order_id': order_id,
+            'product_id': item['product_id'],
+            'quantity': item['quantity'],
+            'price': item['price'],
+            'flash_sale_id': item.get('flash_sale_id')
+        } for item in store_items)
+        payment_rows.append({
+            'order_id': order_id,
+            'amount': order_row['total_amount'],
+            'payment_method': payment_method.card_type,
+            'status': 'completed',
+            'transaction_id': f"TXN_{order_id}_{now.timestamp()}",
+            'created_at': now,
+        })
+        created_orders.append({
+            'order_id': order_id,
+            'store_id': order_row['store_id'],
+            'amount': order_row['total_amount'],
+            'items_count': len(store_items)
+        })
+    db.session.execute(insert(OrderItem), item_rows)
+    db.session.execute(insert(Payment), payment_rows)
+    return created_orders
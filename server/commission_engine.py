@@ -0,0 +1,166 @@
+"""Commission calculation shared by the dashboards and the rates calculator.
+
+Commission on a sold item comes from the product's manual override when it
+has one. The override is either a fixed amount per unit or a percentage of
+the line total. Otherwise the active tier whose [min_price, max_price] range
+contains the sale price applies.
+
+Looking those up per order item costs two queries per row. The engine loads
+every active tier and every relevant override up front, then resolves each
+item in memory. Callers aggregate sales in SQL first, e.g. one row per
+(product, price), so the Python pass runs over groups, not individual items.
+
+The tier index is also cached per process (``CommissionTiers.current``) and
+rebuilt only after ``invalidate_commission_tiers`` bumps its version counter,
+which every rate write does in the same transaction.
+"""
+
+import bisect
+from collections import namedtuple
+
+from models import Commission, CommissionRate
+from cache_versions import VersionedCache, bump_version
+
+# Snapshot of an active CommissionRate, safe to keep across sessions
+Tier = namedtuple('Tier', ['id', 'name', 'min_price', 'max_price', 'commission_percentage'])
+
+# The rule applied to a sale: commission_type is 'manual_amount',
+# 'manual_percentage', 'tier' or 'none'; amount is per unit
+AppliedCommission = namedtuple(
+    'AppliedCommission', ['commission_type', 'rate_id', 'percentage', 'amount', 'earned']
+)
+
+
+class CommissionTiers:
+    """Active commission tiers indexed for O(log n) lookup by price.
+
+    Tier ranges are closed and may touch or overlap (the defaults share their
+    boundaries). Where several tiers cover a price, the oldest (lowest id) wins.
+    The price axis is cut at every tier boundary and the winning tier is
+    precomputed for each boundary point and each open gap between points, so
+    a lookup is one bisect.
+    """
+
+    def __init__(self, rates):
+        self.rates = sorted(rates, key=lambda r: (r.min_price, r.id))
+        points = sorted({r.min_price for r in self.rates} |
+                        {r.max_price for r in self.rates if r.max_price is not None})
+        self._points = points
+
+        # Slot 2i+1 is the point points[i]; slot 2i is the open gap below it
+        # (slot 0 is everything under points[0], the last slot everything above)
+        self._slots = []
+        for slot in range(2 * len(points) + 1):
+            index, is_point = divmod(slot, 2)
+            if is_point:
+                probe = points[index]
+            elif not points:
+                probe = 0.0
+            elif index == 0:
+                probe = points[0] - 1
+            elif index == len(points):
+                probe = points[-1] + 1
+            else:
+                probe = (points[index - 1] + points[index]) / 2
+            self._slots.append(self._winner(probe))
+
+    def _winner(self, price):
+        covering = [
+            r for r in self.rates
+            if r.min_price <= price and (r.max_price is None or price <= r.max_price)
+        ]
+        return min(covering, key=lambda r: r.id) if covering else None
+
+    @classmethod
+    def load(cls):
+        """Build from the database, bypassing the cache."""
+        rates = CommissionRate.query.filter(CommissionRate.is_active == True).all()
+        return cls([
+            Tier(r.id, r.name, r.min_price, r.max_price, r.commission_percentage)
+            for r in rates
+        ])
+
+    @classmethod
+    def current(cls):
+        """The process-wide cached tiers, rebuilt when the rates change."""
+        return _tier_cache.get()
+
+    def rate_for(self, price):
+        """The tier that applies to ``price``, or None."""
+        if price is None or not self._points:
+            return None
+        index = bisect.bisect_left(self._points, price)
+        if index < len(self._points) and self._points[index] == price:
+            return self._slots[2 * index + 1]
+        return self._slots[2 * index]
+
+
+class CommissionEngine:
+    """Resolves commission for sales using preloaded tiers and overrides."""
+
+    def __init__(self, tiers, overrides):
+        self.tiers = tiers
+        # {product_id: Commission}, the row each product's lookups would find first
+        self.overrides = overrides
+
+    @classmethod
+    def load(cls, product_ids=None):
+        """Load active tiers and the commission rows for ``product_ids`` (all when None)."""
+        query = Commission.query.order_by(Commission.id)
+        if product_ids is not None:
+            product_ids = set(product_ids)
+            if not product_ids:
+                return cls(CommissionTiers.current(), {})
+            query = query.filter(Commission.product_id.in_(product_ids))
+        overrides = {}
+        for commission in query.all():
+            overrides.setdefault(commission.product_id, commission)
+        return cls(CommissionTiers.current(), overrides)
+
+    def manual_override(self, product_id):
+        commission = self.overrides.get(product_id)
+        if commission is None or not commission.is_manual:
+            return None
+        if commission.commission_amount is None and commission.commission_percentage is None:
+            return None
+        return commission
+
+    def resolve(self, product_id, price, quantity):
+        """How commission applies to a sale, as an AppliedCommission."""
+        override = self.manual_override(product_id)
+        if override is not None:
+            if override.commission_amount is not None:
+                return AppliedCommission(
+                    'manual_amount', None, None, override.commission_amount,
+                    override.commission_amount * quantity
+                )
+            return AppliedCommission(
+                'manual_percentage', None, override.commission_percentage, None,
+                (price * quantity * override.commission_percentage) / 100
+            )
+
+        rate = self.tiers.rate_for(price)
+        if rate is None:
+            return AppliedCommission('none', None, None, None, 0.0)
+        return AppliedCommission(
+            'tier', rate.id, rate.commission_percentage, None,
+            (price * quantity * rate.commission_percentage) / 100
+        )
+
+    def commission_for(self, product_id, price, quantity):
+        """Commission earned on ``quantity`` units of a product sold at ``price``."""
+        return self.resolve(product_id, price, quantity).earned
+
+    def total(self, groups):
+        """Total commission over rows with product_id, price and quantity."""
+        return sum(self.commission_for(g.product_id, g.price, g.quantity) for g in groups)
+
+
+TIERS_CACHE = 'commission_rates'
+
+_tier_cache = VersionedCache(TIERS_CACHE, CommissionTiers.load)
+
+
+def invalidate_commission_tiers():
+    """Mark the cached tiers stale in every worker. Call before committing a rate change."""
+    bump_version(TIERS_CACHE)
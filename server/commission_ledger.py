@@ -0,0 +1,130 @@
+"""Commission ledger: commission recorded once, when an order is delivered.
+
+Dashboards used to recompute commission from orders, overrides and the
+current tiers on every request. That was slow, and editing a tier silently
+rewrote history. ``commission_ledger`` instead stores one row per delivered
+order item with the rule and rate that applied at delivery, so reporting is a
+plain SUM and past earnings stay fixed.
+
+``record_delivery`` is called when an order becomes ``delivered``, and
+``void_order`` when a delivered order changes to another status. Neither
+commits, so the ledger changes in the same transaction as the order.
+``scripts/backfill_commission_ledger.py`` records orders delivered before the
+ledger existed, or rebuilds it from scratch.
+"""
+
+from datetime import datetime
+
+from models import db, Order, OrderItem, CommissionLedger
+from commission_engine import CommissionEngine
+
+
+def _ledger_rows(orders, items, engine, recorded_at):
+    store_by_order = {order.id: order.store_id for order in orders}
+    created_by_order = {order.id: order.created_at for order in orders}
+    rows = []
+    for item in items:
+        applied = engine.resolve(item.product_id, item.price, item.quantity)
+        rows.append({
+            'order_id': item.order_id,
+            'order_item_id': item.id,
+            'product_id': item.product_id,
+            'store_id': store_by_order[item.order_id],
+            'quantity': item.quantity,
+            'unit_price': item.price,
+            'commission_type': applied.commission_type,
+            'commission_rate_id': applied.rate_id,
+            'commission_percentage': applied.percentage,
+            'commission_amount': applied.amount,
+            'commission_earned': applied.earned,
+            'order_created_at': created_by_order[item.order_id] or recorded_at,
+            'recorded_at': recorded_at
+        })
+    return rows
+
+
+def record_orders(orders, engine=None):
+    """Write ledger rows for delivered ``orders`` that have none yet. Does not commit.
+
+    Returns the number of rows written.
+    """
+    orders = [order for order in orders if order.status == 'delivered']
+    if not orders:
+        return 0
+    order_ids = [order.id for order in orders]
+
+    already_recorded = {
+        order_id for (order_id,) in db.session.query(CommissionLedger.order_id).filter(
+            CommissionLedger.order_id.in_(order_ids)
+        ).distinct()
+    }
+    pending = [order for order in orders if order.id not in already_recorded]
+    if not pending:
+        return 0
+
+    items = OrderItem.query.filter(OrderItem.order_id.in_([order.id for order in pending])).all()
+    if engine is None:
+        engine = CommissionEngine.load(product_ids={item.product_id for item in items})
+
+    rows = _ledger_rows(pending, items, engine, datetime.utcnow())
+    if rows:
+        db.session.execute(CommissionLedger.__table__.insert(), rows)
+    return len(rows)
+
+
+def record_delivery(order):
+    """Record commission for an order that just became delivered. Does not commit."""
+    return record_orders([order])
+
+
+def void_order(order):
+    """Drop ledger rows for an order that is no longer delivered. Does not commit."""
+    CommissionLedger.query.filter_by(order_id=order.id).delete(synchronize_session=False)
+
+
+def backfill_ledger(rebuild=False, batch_size=500, log=print):
+    """Record every delivered order missing from the ledger.
+
+    With ``rebuild`` the ledger is emptied first and every delivered order is
+    recorded against the current tiers and overrides. Either mode commits per
+    batch and can be re-run safely; a rebuild always converges to the same
+    ledger for the same orders and rates.
+    """
+    if rebuild:
+        deleted = CommissionLedger.query.delete(synchronize_session=False)
+        db.session.commit()
+        log(f'Cleared {deleted} ledger row(s)')
+
+    # One engine for the whole run: the rates are the same for every batch
+    engine = CommissionEngine.load()
+
+    recorded = db.session.query(CommissionLedger.order_id).distinct()
+    base = Order.query.filter(
+        Order.status == 'delivered',
+        ~Order.id.in_(recorded)
+    ).order_by(Order.id)
+
+    total_rows = 0
+    last_id = 0
+    while True:
+        batch = base.filter(Order.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        written = record_orders(batch, engine=engine)
+        db.session.commit()
+        total_rows += written
+        last_id = batch[-1].id
+        log(f'Recorded {written} item(s) for orders up to #{last_id}')
+        db.session.expunge_all()
+    return total_rows
+
+
+def ledger_totals_by_product(product_ids=None):
+    """{product_id: commission earned} from the ledger."""
+    query = db.session.query(
+        CommissionLedger.product_id,
+        db.func.sum(CommissionLedger.commission_earned).label('earned')
+    )
+    if product_ids is not None:
+        query = query.filter(CommissionLedger.product_id.in_(product_ids))
+    return {row.product_id: float(row.earned or 0) for row in query.group_by(CommissionLedger.product_id)}
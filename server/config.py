@@ -10,3 +10,36 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-here')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=2)
+
+    # Buffered analytics ingestion (see analytics_ingest.py)
+    ANALYTICS_SPOOL_DIR = os.getenv('ANALYTICS_SPOOL_DIR')
+    ANALYTICS_FLUSH_EVENTS = int(os.getenv('ANALYTICS_FLUSH_EVENTS', 500))
+    ANALYTICS_FLUSH_INTERVAL_MS = int(os.getenv('ANALYTICS_FLUSH_INTERVAL_MS', 1000))
+    ANALYTICS_MAX_PENDING = int(os.getenv('ANALYTICS_MAX_PENDING', 50000))
+    ANALYTICS_BATCH_MAX_EVENTS = int(os.getenv('ANALYTICS_BATCH_MAX_EVENTS', 500))
+
+    # Cross-request cache for the JWT user loader (see user_cache.py); 0 disables
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+
+    # Catalog response cache and Cache-Control (see response_cache.py); TTL 0 disables
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 512))
+    CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+
+    # Flash-sale stock pools (see flash_sale.py): units claimed per refill, seconds between flushes
+    FLASH_SALE_CHUNK_SIZE = int(os.getenv('FLASH_SALE_CHUNK_SIZE', 20))
+    FLASH_SALE_FLUSH_INTERVAL = int(os.getenv('FLASH_SALE_FLUSH_INTERVAL', 1))
+
+    # Idempotency-Key replay for order submission (see idempotency.py): seconds a stored
+    # response is kept, seconds a duplicate waits for the first request, seconds before an
+    # unfinished claim is considered abandoned
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 86400))
+    IDEMPOTENCY_WAIT = int(os.getenv('IDEMPOTENCY_WAIT', 10))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+    # Seconds between sale-window repricing runs (see pricing.py)
+    PRICING_INTERVAL = int(os.getenv('PRICING_INTERVAL', 60))
+
+    # Threads per process building resized image variants of uploads (see image_variants.py)
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
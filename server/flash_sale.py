@@ -0,0 +1,257 @@
+"""Flash-sale mode: hot products sold from in-process stock pools.
+
+When a flash sale opens, every buyer races for the same ``product`` row. The
+conditional UPDATE in checkout.py never oversells, but it makes those buyers
+queue on one row lock. Flash mode takes that row out of the checkout path:
+
+* Creating a ``FlashSale`` moves ``units`` out of the product's
+  ``stock_quantity`` into the sale, in one transaction. Regular checkouts can
+  no longer sell those units.
+* Each app process sells from a local ``StockPool``. Admitting a buyer is a
+  lock plus an integer decrement. When a pool runs dry, the process claims
+  the next ``FLASH_SALE_CHUNK_SIZE`` units from ``flash_sale.allocated`` with
+  a compare-and-set UPDATE, on its own short transaction. Together the
+  processes can never hand out more than ``units``.
+* Orders record the sale on their items (``order_item.flash_sale_id``).
+  Checkout does not touch the product or store rows for those units.
+* ``flush_flash_sales`` runs every ``FLASH_SALE_FLUSH_INTERVAL`` seconds on a
+  background thread. It writes the sold units (the sum of the sale's order
+  items) to ``units_sold`` in one relative UPDATE. Shortly after the window
+  ends (``CLOSE_GRACE``), it returns the unsold units to ``stock_quantity``
+  and closes the sale.
+
+Crash safety: the sold count always comes from committed order items, and
+``flushed_units`` is stored in the same transaction as the counters it fed.
+A flush therefore applies exactly the units that are not applied yet,
+whenever and wherever it runs. A process that dies holding unsold pool units
+strands them only until the sale closes. Closing returns everything not
+sold, whoever held it.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from models import db, FlashSale, OrderItem, Product
+from sqlalchemy import func, update
+from cache_versions import VersionedCache, bump_version
+from response_cache import invalidate_catalog
+from sales_counters import record_sale
+from logger import setup_logger
+
+logger = setup_logger()
+
+FLASH_SALES_CACHE = 'flash_sales'
+# A sale closes this long after its window ends, so checkouts admitted just
+# before the end have committed before the unsold units are counted
+CLOSE_GRACE = timedelta(seconds=30)
+
+# Snapshot of an open FlashSale, safe to keep across sessions
+SaleWindow = namedtuple('SaleWindow', ['id', 'product_id', 'starts_at', 'ends_at', 'units'])
+
+
+def _load_windows():
+    return {
+        sale.product_id: SaleWindow(sale.id, sale.product_id, sale.starts_at, sale.ends_at, sale.units)
+        for sale in FlashSale.query.filter(FlashSale.closed_at.is_(None))
+    }
+
+
+_windows = VersionedCache(FLASH_SALES_CACHE, _load_windows)
+
+
+def invalidate_flash_sales():
+    """Call before committing a flash sale create or close."""
+    bump_version(FLASH_SALES_CACHE)
+
+
+def active_flash_sale(product_id, now=None):
+    """The SaleWindow selling ``product_id`` right now, or None."""
+    window = _windows.get().get(product_id)
+    now = now or datetime.utcnow()
+    if window is None or not (window.starts_at <= now < window.ends_at):
+        return None
+    return window
+
+
+def _claim_units(sale_id, wanted):
+    """Move up to ``wanted`` units of the sale to this process. Commits on its own connection."""
+    with db.engine.begin() as connection:
+        while True:
+            units, allocated = connection.execute(
+                db.select(FlashSale.units, FlashSale.allocated).where(
+                    FlashSale.id == sale_id, FlashSale.closed_at.is_(None)
+                )
+            ).one_or_none() or (0, 0)
+            claim = min(wanted, units - allocated)
+            if claim <= 0:
+                return 0
+            claimed = connection.execute(
+                update(FlashSale).where(
+                    FlashSale.id == sale_id, FlashSale.allocated == allocated
+                ).values(allocated=allocated + claim)
+            ).rowcount
+            if claimed:
+                return claim
+
+
+class StockPool:
+    """Units of one flash sale this process may sell without asking the database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.budget = 0
+        self.exhausted = False
+
+
+class FlashStock:
+    """Per-process stock pools, one per flash sale."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, sale_id):
+        pool = self._pools.get(sale_id)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.setdefault(sale_id, StockPool())
+        return pool
+
+    def take(self, sale_id, quantity):
+        """Admit ``quantity`` units. False once the sale is sold out everywhere."""
+        pool = self._pool(sale_id)
+        with pool.lock:
+            while pool.budget < quantity:
+                if pool.exhausted:
+                    return False
+                chunk = current_app.config.get('FLASH_SALE_CHUNK_SIZE', 20)
+                claimed = _claim_units(sale_id, max(chunk, quantity - pool.budget))
+                if not claimed:
+                    pool.exhausted = True
+                    return False
+                pool.budget += claimed
+            pool.budget -= quantity
+            return True
+
+    def release(self, sale_id, quantity):
+        """Give back units of a checkout that did not commit."""
+        pool = self._pool(sale_id)
+        with pool.lock:
+            pool.budget += quantity
+
+    def available(self, sale_id):
+        """Units this process can still sell without claiming more."""
+        return self._pool(sale_id).budget
+
+    def forget(self, sale_id):
+        with self._lock:
+            self._pools.pop(sale_id, None)
+
+
+flash_stock = FlashStock()
+
+
+def release_flash_units(taken):
+    """Return [(sale_id, quantity)] taken by a failed checkout to the pools."""
+    for sale_id, quantity in taken:
+        flash_stock.release(sale_id, quantity)
+
+
+def create_flash_sale(product, units, starts_at, ends_at):
+    """Move ``units`` of stock into a new flash sale. None if the product lacks the stock. Caller commits."""
+    moved = db.session.query(Product).filter(
+        Product.id == product.id,
+        Product.stock_quantity >= units
+    ).update({Product.stock_quantity: Product.stock_quantity - units}, synchronize_session=False)
+    if not moved:
+        return None
+    sale = FlashSale(product_id=product.id, starts_at=starts_at, ends_at=ends_at, units=units)
+    db.session.add(sale)
+    invalidate_flash_sales()
+    invalidate_catalog()
+    return sale
+
+
+def _sold_units(sale_id):
+    return db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(
+        OrderItem.flash_sale_id == sale_id
+    ).scalar()
+
+
+def flush_flash_sale(sale_id, now=None):
+    """Apply one sale's newly sold units, and close it if its window is over. Commits."""
+    now = now or datetime.utcnow()
+    sale = FlashSale.query.filter(FlashSale.id == sale_id).with_for_update().one_or_none()
+    if sale is None or sale.closed_at is not None:
+        db.session.rollback()
+        return
+    sold = _sold_units(sale.id)
+    delta = sold - sale.flushed_units
+    if delta:
+        store_id = db.session.query(Product.store_id).filter(Product.id == sale.product_id).scalar()
+        record_sale([(sale.product_id, store_id, delta)])
+        sale.flushed_units = sold
+    if now >= sale.ends_at + CLOSE_GRACE:
+        unsold = sale.units - sold
+        if unsold:
+            db.session.query(Product).filter(Product.id == sale.product_id).update(
+                {Product.stock_quantity: Product.stock_quantity + unsold}, synchronize_session=False
+            )
+        sale.closed_at = now
+        invalidate_flash_sales()
+        invalidate_catalog()
+        logger.info(f"Closed flash sale {sale.id}: sold {sold} of {sale.units}, returned {unsold} to stock")
+    db.session.commit()
+    if sale.closed_at is not None:
+        flash_stock.forget(sale.id)
+
+
+def flush_flash_sales(now=None):
+    """Flush every open flash sale. Safe to run from any number of processes at once."""
+    sale_ids = [sale_id for (sale_id,) in db.session.query(FlashSale.id).filter(FlashSale.closed_at.is_(None))]
+    db.session.rollback()
+    for sale_id in sale_ids:
+        flush_flash_sale(sale_id, now)
+    return len(sale_ids)
+
+
+class FlashSaleWorker:
+    """Background thread that writes flash-sale sales behind (one per process)."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def ensure_started(self):
+        if self.app is None or self.app.config.get('TESTING'):
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='flash-sale-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    flush_flash_sales()
+            except Exception as e:
+                logger.error(f"Flash sale flush failed: {str(e)}")
+            time.sleep(self.app.config.get('FLASH_SALE_FLUSH_INTERVAL', 1))
+
+
+flash_sale_worker = FlashSaleWorker()
@@ -0,0 +1,168 @@
+"""Precomputed storefront homepage.
+
+``/api/home`` returns the featured, new-arrival and top-sale sections in one
+response. ``build_home_sections`` runs the three product queries and then
+renders every card through one ProductCardContext, so categories, stores and
+review stats are looked up once for the whole page instead of once per
+section.
+
+The serialized response is kept as a per-process snapshot and served as is,
+so a request does no database work. A background thread rebuilds it when the
+catalog version counter (see response_cache.py) changes, and at least every
+``SNAPSHOT_MAX_AGE`` seconds, because sale windows, the new-arrivals window
+and stock levels change without a catalog write. The request path builds the
+snapshot only when there is none yet, or when the refresher has fallen well
+behind (and always when TESTING, where no thread runs).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from models import db, Product
+from cache_versions import current_version
+from response_cache import CATALOG_CACHE, CachedResponse
+from serializers import ProductCardContext, serialize_product_card
+from logger import setup_logger
+
+logger = setup_logger()
+
+FEATURED_LIMIT = 6
+NEW_ARRIVALS_LIMIT = 8
+TOP_SALES_LIMIT = 6
+# Products created this recently count as new arrivals
+NEW_ARRIVAL_WINDOW = timedelta(days=30)
+
+# Seconds between catalog version checks, and the longest a snapshot is served
+SNAPSHOT_POLL_INTERVAL = 2
+SNAPSHOT_MAX_AGE = 60
+
+
+def featured_products():
+    return Product.query.filter_by(is_featured=True).order_by(
+        Product.featured_order, Product.created_at.desc()
+    ).limit(FEATURED_LIMIT).all()
+
+
+def new_arrival_products(now=None):
+    """Products created in the last 30 days or explicitly marked as new arrivals."""
+    since = (now or datetime.utcnow()) - NEW_ARRIVAL_WINDOW
+    return Product.query.filter(
+        db.or_(
+            Product.created_at >= since,
+            Product.is_new_arrival == True
+        )
+    ).order_by(Product.created_at.desc()).limit(NEW_ARRIVALS_LIMIT).all()
+
+
+def top_sale_products(now=None):
+    """Products on an active sale, highest discount first."""
+    now = now or datetime.utcnow()
+    return Product.query.filter(
+        Product.sale_type.isnot(None),
+        Product.sale_start_date <= now,
+        Product.sale_end_date >= now,
+        Product.sale_discount_percentage > 0
+    ).order_by(
+        Product.sale_discount_percentage.desc(),
+        Product.created_at.desc()
+    ).limit(TOP_SALES_LIMIT).all()
+
+
+def build_home_sections(now=None):
+    """{section: [product card]} for every homepage section, with shared lookups."""
+    now = now or datetime.utcnow()
+    sections = {
+        'featured': featured_products(),
+        'new_arrivals': new_arrival_products(now),
+        'top_sales': top_sale_products(now),
+    }
+    products = {p.id: p for section in sections.values() for p in section}
+    context = ProductCardContext(products.values())
+    cards = {
+        product_id: serialize_product_card(product, context, include_display_fields=True)
+        for product_id, product in products.items()
+    }
+    return {name: [cards[p.id] for p in section] for name, section in sections.items()}
+
+
+class HomeSnapshot:
+    """The serialized /api/home response, kept fresh by a background thread."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._entry = None
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def refresh(self):
+        """Rebuild the snapshot. Needs an app context."""
+        version = current_version(CATALOG_CACHE)
+        payload = build_home_sections()
+        payload['generated_at'] = datetime.utcnow().isoformat()
+        body = current_app.json.dumps(payload).encode('utf-8')
+        self._entry = CachedResponse(
+            body, 'application/json', hashlib.md5(body).hexdigest(),
+            version, time.monotonic() + SNAPSHOT_MAX_AGE
+        )
+        return self._entry
+
+    def clear(self):
+        """Drop the snapshot; the next get() rebuilds it."""
+        with self._lock:
+            self._entry = None
+
+    def _is_stale(self, entry):
+        return entry is None or entry.expires_at <= time.monotonic()
+
+    def get(self):
+        """The current snapshot as a CachedResponse."""
+        entry = self._entry
+        refresher_running = self._thread is not None and self._thread.is_alive()
+        if refresher_running:
+            # Only step in when the refresher is missing a whole cycle
+            needs_build = entry is None or entry.expires_at + SNAPSHOT_MAX_AGE <= time.monotonic()
+        else:
+            needs_build = self._is_stale(entry) or entry.version != current_version(CATALOG_CACHE)
+        if needs_build:
+            with self._lock:
+                if self._entry is entry:
+                    entry = self.refresh()
+                else:
+                    entry = self._entry
+        return entry
+
+    def ensure_started(self):
+        if self.app is None or self.app.config.get('TESTING'):
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='home-snapshot', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    entry = self._entry
+                    if self._is_stale(entry) or entry.version != current_version(CATALOG_CACHE):
+                        with self._lock:
+                            self.refresh()
+            except Exception as e:
+                logger.error(f"Home snapshot refresh failed: {str(e)}")
+            time.sleep(SNAPSHOT_POLL_INTERVAL)
+
+
+home_snapshot = HomeSnapshot()
@@ -0,0 +1,205 @@
+"""Idempotency-Key support for POST endpoints that must not run twice.
+
+A slow checkout makes clients retry. Without a key, each retry splits the
+cart, takes stock and creates payments again. A client that sends an
+``Idempotency-Key`` header gets at most one execution per key:
+
+* The first request claims the key by inserting an ``idempotency_key`` row
+  with no result, in its own short transaction.
+* The view stores its response on the row with ``remember_response``, in the
+  same transaction as its writes. The orders and the stored response commit
+  together or not at all. Views that return without writing (validation
+  errors) are stored by the decorator afterwards.
+* A duplicate that arrives later replays the stored status and body, marked
+  with ``Idempotent-Replayed: true``. A duplicate that arrives while the first
+  request is in flight polls for up to ``IDEMPOTENCY_WAIT`` seconds, then
+  gives up with a 409 and ``Retry-After``.
+* Server errors (5xx) release the claim, so a retry executes again.
+* Reusing a key with a different request body is a 422.
+
+A claim left unfinished for ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds (the worker
+died) can be taken over. ``locked_at`` acts as a fencing token: a request
+whose claim was taken over cannot store its response, so its transaction
+rolls back instead of executing twice. Rows expire after
+``IDEMPOTENCY_KEY_TTL`` seconds. Each process deletes expired rows at most
+every ``PRUNE_INTERVAL`` seconds, so the table stays at about a day of keys.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from models import db, IdempotencyKey
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from logger import setup_logger
+
+logger = setup_logger()
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Seconds between polls while a duplicate waits, and between expired-row sweeps
+POLL_INTERVAL = 0.1
+PRUNE_INTERVAL = 300
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+class IdempotencyKeyLost(Exception):
+    """The key was taken over by another request; the current one must not commit."""
+
+
+def prune_idempotency_keys(now=None):
+    """Delete expired keys. Commits."""
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at <= (now or datetime.utcnow())
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _prune_if_due():
+    global _last_prune
+    with _prune_lock:
+        if time.monotonic() - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = time.monotonic()
+    try:
+        prune_idempotency_keys()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Pruning idempotency keys failed: {str(e)}")
+
+
+def _replay(row):
+    response = current_app.response_class(row.response_body, status=row.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user_id, key, request_hash):
+    """Own the key, returning its locked_at; or a response for the duplicate to send."""
+    config = current_app.config
+    ttl = timedelta(seconds=config.get('IDEMPOTENCY_KEY_TTL', 86400))
+    lock_timeout = timedelta(seconds=config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    deadline = time.monotonic() + config.get('IDEMPOTENCY_WAIT', 10)
+    while True:
+        now = datetime.utcnow()
+        try:
+            db.session.execute(insert(IdempotencyKey).values(
+                user_id=user_id, key=key, request_hash=request_hash, locked_at=now, expires_at=now + ttl
+            ))
+            db.session.commit()
+            return now, None
+        except IntegrityError:
+            db.session.rollback()
+
+        row = IdempotencyKey.query.filter_by(user_id=user_id, key=key).one_or_none()
+        if row is None:
+            # Released between our insert and this read
+            continue
+        expired = row.expires_at <= now
+        if not expired and row.request_hash != request_hash:
+            db.session.rollback()
+            return None, (jsonify({'message': f'{HEADER} was already used for a different request'}), 422)
+        if expired or (row.status_code is None and row.locked_at <= now - lock_timeout):
+            # Take over an expired key or an abandoned claim, unless someone else just did
+            taken = IdempotencyKey.query.filter_by(user_id=user_id, key=key, locked_at=row.locked_at).update({
+                IdempotencyKey.request_hash: request_hash,
+                IdempotencyKey.status_code: None,
+                IdempotencyKey.response_body: None,
+                IdempotencyKey.locked_at: now,
+                IdempotencyKey.expires_at: now + ttl
+            }, synchronize_session=False)
+            db.session.commit()
+            if taken:
+                return now, None
+            continue
+        if row.status_code is not None:
+            response = _replay(row)
+            db.session.rollback()
+            return None, response
+        db.session.rollback()
+        if time.monotonic() >= deadline:
+            response = jsonify({'message': f'A request with this {HEADER} is still being processed'})
+            response.headers['Retry-After'] = '1'
+            return None, (response, 409)
+        time.sleep(POLL_INTERVAL)
+
+
+def _owned(claim):
+    user_id, key, locked_at = claim
+    return IdempotencyKey.query.filter_by(user_id=user_id, key=key, locked_at=locked_at)
+
+
+def remember_response(response, status_code):
+    """Store the view's response for replay, in the current transaction. Caller commits.
+
+    No-op for requests without an Idempotency-Key. Raises IdempotencyKeyLost
+    if the claim was taken over, so the caller rolls back instead of
+    committing a second execution.
+    """
+    claim = g.get('idempotency_claim')
+    if claim is None:
+        return
+    stored = _owned(claim).update({
+        IdempotencyKey.status_code: status_code,
+        IdempotencyKey.response_body: response.get_data(as_text=True)
+    }, synchronize_session=False)
+    if not stored:
+        raise IdempotencyKeyLost(f'{HEADER} was taken over by another request')
+    g.idempotency_stored = True
+
+
+def _release(claim):
+    db.session.rollback()
+    try:
+        _owned(claim).filter(IdempotencyKey.status_code.is_(None)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Releasing idempotency key failed: {str(e)}")
+
+
+def idempotent(view):
+    """Run a JWT-protected POST view at most once per Idempotency-Key (see module docstring)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'message': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+        _prune_if_due()
+        user_id = int(get_jwt_identity())
+        locked_at, duplicate = _claim(user_id, key, hashlib.sha256(request.get_data()).hexdigest())
+        if duplicate is not None:
+            return duplicate
+
+        claim = (user_id, key, locked_at)
+        g.idempotency_claim = claim
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            _release(claim)
+            raise
+        if response.status_code >= 500:
+            _release(claim)
+        elif not g.pop('idempotency_stored', False):
+            # Nothing was committed with the response; store it on its own
+            db.session.rollback()
+            try:
+                remember_response(response, response.status_code)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Storing idempotent response failed: {str(e)}")
+        return response
+    return wrapper
@@ -0,0 +1,202 @@
+"""Resized WebP/AVIF variants of uploaded images.
+
+Uploads are stored as sent, often multi-megabyte photos, and the storefront
+used to download those originals even for 160px thumbnails. Each uploaded
+image now also gets one file per size in ``VARIANTS`` and per format in
+``variant_formats()`` (WebP, plus AVIF when Pillow was built with it). For
+``/uploads/<name>.<ext>`` the variants are
+``/uploads/variants/<name>-<size>.<format>``. They never upscale, so an
+original smaller than a size is only re-encoded.
+
+Encoding takes a second or more for a large photo, so uploads are queued on
+``image_pipeline`` (a thread pool of ``IMAGE_WORKERS``) after the request
+commits. When the variants are written, the worker stores their URLs on the
+row: ``Product.image_variants``, ``Store.logo_variants`` or
+``User.profile_picture_variants``. The update matches on the row's current
+URL, so a variant set never lands on a row whose image was replaced in the
+meantime. Until then the column is null and clients fall back to the
+original. Under TESTING the work runs inline.
+
+``scripts/build_image_variants.py`` builds variants for existing uploads.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps, features
+from models import db, Product, Store, User
+from response_cache import invalidate_catalog
+from user_cache import invalidate_user
+from logger import setup_logger
+
+logger = setup_logger()
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Where /uploads/ is served from, in lookup order (see serve_uploaded_file in app.py)
+UPLOAD_DIRS = (os.path.join(ROOT, 'uploads'), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+VARIANTS_DIR = 'variants'
+
+# Longest side in pixels of each variant
+VARIANTS = {'thumb': 160, 'card': 400, 'detail': 1200}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff', '.avif'}
+# Encoder settings per format: quality, and speed where the encoder has one
+ENCODE_OPTIONS = {
+    'webp': {'quality': 80, 'method': 4},
+    'avif': {'quality': 60, 'speed': 6},
+}
+
+# Columns holding an image URL and its variants, by the kind of row
+TARGETS = {
+    'product': (Product, 'image_url', 'image_variants'),
+    'store': (Store, 'logo_url', 'logo_variants'),
+    'user': (User, 'profile_picture', 'profile_picture_variants'),
+}
+
+
+def variant_formats():
+    return ('webp', 'avif') if features.check('avif') else ('webp',)
+
+
+def upload_path(url):
+    """The file behind an /uploads/ URL, or None."""
+    if not url or not url.startswith('/uploads/'):
+        return None
+    relative = url[len('/uploads/'):]
+    for directory in UPLOAD_DIRS:
+        path = os.path.abspath(os.path.join(directory, relative))
+        if path.startswith(directory + os.sep) and os.path.isfile(path):
+            return path
+    return None
+
+
+def is_variant_source(path):
+    """Whether ``path`` is an original upload that should get variants."""
+    return (os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+            and os.path.basename(os.path.dirname(path)) != VARIANTS_DIR)
+
+
+def variant_urls(url, formats=None):
+    """{size: {format: url}} for an /uploads/ URL. Does not check that the files exist."""
+    directory, filename = url.rsplit('/', 1)
+    stem = os.path.splitext(filename)[0]
+    return {
+        size: {fmt: f'{directory}/{VARIANTS_DIR}/{stem}-{size}.{fmt}' for fmt in formats or variant_formats()}
+        for size in VARIANTS
+    }
+
+
+def _prepare(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    has_alpha = image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def build_variants(path, force=False):
+    """Write every variant of the image at ``path``. Returns {size: {format: filename}}.
+
+    Existing variant files are kept unless ``force``. Raises OSError (or
+    Pillow's DecompressionBombError) for files that are not usable images.
+    """
+    directory, filename = os.path.split(path)
+    stem = os.path.splitext(filename)[0]
+    out_dir = os.path.join(directory, VARIANTS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    formats = variant_formats()
+    names = {size: {fmt: f'{stem}-{size}.{fmt}' for fmt in formats} for size in VARIANTS}
+    if not force and all(os.path.exists(os.path.join(out_dir, name))
+                         for by_format in names.values() for name in by_format.values()):
+        return names
+
+    with Image.open(path) as source:
+        largest = max(VARIANTS.values())
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, which is much cheaper than resizing later
+        source.draft('RGB', (largest, largest))
+        image = _prepare(source)
+        image.load()
+    # Largest first, so each smaller size is resized from the previous one
+    for size, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        for fmt in formats:
+            target = os.path.join(out_dir, names[size][fmt])
+            partial = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+            image.save(partial, fmt.upper(), **ENCODE_OPTIONS[fmt])
+            os.replace(partial, target)
+    return names
+
+
+def record_variants(kind, row_id, url, variants):
+    """Store variant URLs on the row if its image is still ``url``. Caller commits."""
+    model, url_column, variants_column = TARGETS[kind]
+    updated = db.session.query(model).filter(
+        model.id == row_id, getattr(model, url_column) == url
+    ).update({getattr(model, variants_column): variants}, synchronize_session=False)
+    if updated and kind in ('product', 'store'):
+        invalidate_catalog()
+    return updated
+
+
+def process_upload(kind, row_id, url):
+    """Build the variants of ``url`` and record them on the row. Commits."""
+    path = upload_path(url)
+    if path is None or not is_variant_source(path):
+        return None
+    build_variants(path)
+    variants = variant_urls(url)
+    if kind is not None:
+        record_variants(kind, row_id, url, variants)
+        db.session.commit()
+        if kind == 'user':
+            invalidate_user(row_id)
+        elif kind == 'store':
+            manager_id = db.session.query(Store.manager_id).filter(Store.id == row_id).scalar()
+            if manager_id is not None:
+                invalidate_user(manager_id)
+    return variants
+
+
+class ImagePipeline:
+    """Thread pool that builds image variants after the request (one per process)."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._pid != pid or self._executor is None:
+            with self._lock:
+                if self._pid != pid or self._executor is None:
+                    self._pid = pid
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.app.config.get('IMAGE_WORKERS', 2), thread_name_prefix='image-variants'
+                    )
+        return self._executor
+
+    def submit(self, kind, row_id, url):
+        """Queue variants for an upload saved at ``url``. ``kind`` is a TARGETS key, or None to only build files."""
+        if not url:
+            return
+        if self.app is None or self.app.config.get('TESTING'):
+            self._process(kind, row_id, url, current_app._get_current_object())
+            return
+        self._pool().submit(self._process, kind, row_id, url, self.app)
+
+    @staticmethod
+    def _process(kind, row_id, url, app):
+        try:
+            with app.app_context():
+                process_upload(kind, row_id, url)
+        except Exception as e:
+            logger.error(f"Building image variants for {url} failed: {str(e)}")
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,29 @@
+"""cache version counters
+
+Revision ID: a2c6e9f4b813
+Revises: f1b7d2c9a4e8
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c6e9f4b813'
+down_revision = 'f1b7d2c9a4e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    cache_version = op.create_table('cache_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(cache_version, [{'name': 'commission_rates', 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('cache_version')
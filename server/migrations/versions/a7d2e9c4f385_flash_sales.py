@@ -0,0 +1,48 @@
+"""flash sale stock pools
+
+Revision ID: a7d2e9c4f385
+Revises: f6c1d8b3e927
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2e9c4f385'
+down_revision = 'f6c1d8b3e927'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('flash_sale',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('allocated', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('flushed_units', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('closed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_flash_sale_product_id'), 'flash_sale', ['product_id'], unique=False)
+
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('flash_sale_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_order_item_flash_sale_id'), ['flash_sale_id'], unique=False)
+        batch_op.create_foreign_key('fk_order_item_flash_sale_id', 'flash_sale', ['flash_sale_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_order_item_flash_sale_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_order_item_flash_sale_id'))
+        batch_op.drop_column('flash_sale_id')
+
+    op.drop_index(op.f('ix_flash_sale_product_id'), table_name='flash_sale')
+    op.drop_table('flash_sale')
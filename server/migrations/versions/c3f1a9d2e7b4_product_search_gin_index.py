@@ -0,0 +1,36 @@
+"""product search GIN index
+
+Revision ID: c3f1a9d2e7b4
+Revises: 468a55f43aca
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d2e7b4'
+down_revision = '468a55f43aca'
+branch_labels = None
+depends_on = None
+
+
+# Must match search.SEARCH_VECTOR_SQL exactly for the planner to use it
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+def upgrade():
+    # Full-text search is PostgreSQL only; other databases use the in-process index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_product_search ON product USING GIN (({SEARCH_VECTOR}))")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_product_search")
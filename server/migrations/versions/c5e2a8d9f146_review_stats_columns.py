@@ -0,0 +1,49 @@
+"""denormalized review stats on product and store
+
+Revision ID: c5e2a8d9f146
+Revises: b8d4f1a6c327
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2a8d9f146'
+down_revision = 'b8d4f1a6c327'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('product', 'store'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('avg_rating', sa.Float(), server_default='0', nullable=False))
+
+    # Backfill from existing reviews
+    op.execute("""
+        UPDATE product SET
+            rating_sum = COALESCE((SELECT SUM(review.rating) FROM review WHERE review.product_id = product.id), 0),
+            rating_count = (SELECT COUNT(*) FROM review WHERE review.product_id = product.id)
+    """)
+    op.execute("""
+        UPDATE store SET
+            rating_sum = COALESCE((SELECT SUM(product.rating_sum) FROM product WHERE product.store_id = store.id), 0),
+            rating_count = COALESCE((SELECT SUM(product.rating_count) FROM product WHERE product.store_id = store.id), 0)
+    """)
+    for table in ('product', 'store'):
+        op.execute(f"""
+            UPDATE {table} SET avg_rating = CASE WHEN rating_count > 0
+                THEN rating_sum * 1.0 / rating_count ELSE 0 END
+        """)
+
+
+def downgrade():
+    for table in ('product', 'store'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('avg_rating')
+            batch_op.drop_column('rating_count')
+            batch_op.drop_column('rating_sum')
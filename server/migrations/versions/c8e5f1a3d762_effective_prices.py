@@ -0,0 +1,59 @@
+"""stored effective price and sale flag on product
+
+Revision ID: c8e5f1a3d762
+Revises: b3f8c2d1e649
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e5f1a3d762'
+down_revision = 'b3f8c2d1e649'
+branch_labels = None
+depends_on = None
+
+
+def _sale_price(price, discount):
+    discounted = Decimal(str(price)) * (100 - Decimal(str(discount))) / 100
+    return float(discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('effective_price', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('sale_active', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Backfill: list price, discounted for products whose sale window is open now.
+    # Rounded in Python with the same rule as pricing.sale_price.
+    op.execute("UPDATE product SET effective_price = price")
+    bind = op.get_bind()
+    on_sale = bind.execute(sa.text("""
+        SELECT id, price, sale_discount_percentage FROM product
+        WHERE sale_type IS NOT NULL
+            AND sale_start_date <= :now AND sale_end_date >= :now
+            AND sale_discount_percentage > 0
+    """), {'now': datetime.utcnow()}).fetchall()
+    if on_sale:
+        bind.execute(
+            sa.text("UPDATE product SET sale_active = TRUE, effective_price = :price WHERE id = :id"),
+            [{'id': row.id, 'price': _sale_price(row.price, row.sale_discount_percentage)} for row in on_sale]
+        )
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.alter_column('effective_price', existing_type=sa.Float(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_product_effective_price'), ['effective_price'], unique=False)
+        batch_op.create_index(batch_op.f('ix_product_sale_active'), ['sale_active'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_sale_active'))
+        batch_op.drop_index(batch_op.f('ix_product_effective_price'))
+        batch_op.drop_column('sale_active')
+        batch_op.drop_column('effective_price')
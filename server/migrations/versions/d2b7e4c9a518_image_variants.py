@@ -0,0 +1,38 @@
+"""resized image variant urls
+
+Revision ID: d2b7e4c9a518
+Revises: c8e5f1a3d762
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7e4c9a518'
+down_revision = 'c8e5f1a3d762'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('store', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('logo_variants', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_picture_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('profile_picture_variants')
+
+    with op.batch_alter_table('store', schema=None) as batch_op:
+        batch_op.drop_column('logo_variants')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('image_variants')
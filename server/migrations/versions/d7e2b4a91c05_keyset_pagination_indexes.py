@@ -0,0 +1,30 @@
+"""keyset pagination indexes
+
+Revision ID: d7e2b4a91c05
+Revises: c3f1a9d2e7b4
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b4a91c05'
+down_revision = 'c3f1a9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_product_created_at_id', 'product', ['created_at', 'id'])
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'])
+    op.create_index('ix_orders_store_id_created_at_id', 'orders', ['store_id', 'created_at', 'id'])
+    op.create_index('ix_notification_created_at_id', 'notification', ['created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_notification_created_at_id', table_name='notification')
+    op.drop_index('ix_orders_store_id_created_at_id', table_name='orders')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
+    op.drop_index('ix_product_created_at_id', table_name='product')
@@ -0,0 +1,49 @@
+"""units sold counters and best-sellers indexes
+
+Revision ID: d9a3c7e5b218
+Revises: c5e2a8d9f146
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3c7e5b218'
+down_revision = 'c5e2a8d9f146'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('product', 'store'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('units_sold', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from existing orders that were not cancelled
+    op.execute("""
+        UPDATE product SET units_sold = COALESCE((
+            SELECT SUM(order_item.quantity) FROM order_item
+            JOIN orders ON orders.id = order_item.order_id
+            WHERE order_item.product_id = product.id AND orders.status != 'cancelled'
+        ), 0)
+    """)
+    op.execute("""
+        UPDATE store SET units_sold = COALESCE((
+            SELECT SUM(order_item.quantity) FROM order_item
+            JOIN orders ON orders.id = order_item.order_id
+            WHERE orders.store_id = store.id AND orders.status != 'cancelled'
+        ), 0)
+    """)
+
+    op.create_index('ix_product_units_sold_id', 'product', ['units_sold', 'id'], unique=False)
+    op.create_index('ix_product_category_units_sold_id', 'product', ['category', 'units_sold', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_category_units_sold_id', table_name='product')
+    op.drop_index('ix_product_units_sold_id', table_name='product')
+    for table in ('store', 'product'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('units_sold')
@@ -0,0 +1,35 @@
+"""precomputed product recommendations
+
+Revision ID: e4b7a1d6c953
+Revises: d9a3c7e5b218
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a1d6c953'
+down_revision = 'd9a3c7e5b218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_recommendations',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('recommended_product_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['recommended_product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'rank')
+    )
+    op.create_index(op.f('ix_product_recommendations_recommended_product_id'), 'product_recommendations', ['recommended_product_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_product_recommendations_recommended_product_id'), table_name='product_recommendations')
+    op.drop_table('product_recommendations')
@@ -0,0 +1,44 @@
+"""product analytics daily rollups
+
+Revision ID: e5a8c3f17b62
+Revises: d7e2b4a91c05
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c3f17b62'
+down_revision = 'd7e2b4a91c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_analytics_daily',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('time_spent_sum', sa.Float(), nullable=False),
+    sa.Column('time_spent_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'date', 'action')
+    )
+    op.create_index('ix_product_analytics_daily_date_action', 'product_analytics_daily', ['date', 'action'])
+    op.create_table('analytics_rollup_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('rolled_through', sa.Date(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index('ix_product_analytics_timestamp', 'product_analytics', ['timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_product_analytics_timestamp', table_name='product_analytics')
+    op.drop_table('analytics_rollup_state')
+    op.drop_index('ix_product_analytics_daily_date_action', table_name='product_analytics_daily')
+    op.drop_table('product_analytics_daily')
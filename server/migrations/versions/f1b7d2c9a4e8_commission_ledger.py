@@ -0,0 +1,54 @@
+"""commission ledger
+
+Revision ID: f1b7d2c9a4e8
+Revises: e5a8c3f17b62
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7d2c9a4e8'
+down_revision = 'e5a8c3f17b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('commission_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('order_item_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('commission_type', sa.String(length=20), nullable=False),
+    sa.Column('commission_rate_id', sa.Integer(), nullable=True),
+    sa.Column('commission_percentage', sa.Float(), nullable=True),
+    sa.Column('commission_amount', sa.Float(), nullable=True),
+    sa.Column('commission_earned', sa.Float(), nullable=False),
+    sa.Column('order_created_at', sa.DateTime(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['commission_rate_id'], ['commission_rate.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['order_item_id'], ['order_item.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.ForeignKeyConstraint(['store_id'], ['store.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('order_item_id')
+    )
+    op.create_index(op.f('ix_commission_ledger_order_id'), 'commission_ledger', ['order_id'], unique=False)
+    op.create_index(op.f('ix_commission_ledger_product_id'), 'commission_ledger', ['product_id'], unique=False)
+    op.create_index(op.f('ix_commission_ledger_store_id'), 'commission_ledger', ['store_id'], unique=False)
+    op.create_index(op.f('ix_commission_ledger_order_created_at'), 'commission_ledger', ['order_created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_commission_ledger_order_created_at'), table_name='commission_ledger')
+    op.drop_index(op.f('ix_commission_ledger_store_id'), table_name='commission_ledger')
+    op.drop_index(op.f('ix_commission_ledger_product_id'), table_name='commission_ledger')
+    op.drop_index(op.f('ix_commission_ledger_order_id'), table_name='commission_ledger')
+    op.drop_table('commission_ledger')
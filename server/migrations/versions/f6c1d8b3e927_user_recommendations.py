@@ -0,0 +1,35 @@
+"""precomputed per-user recommendation feed
+
+Revision ID: f6c1d8b3e927
+Revises: e4b7a1d6c953
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c1d8b3e927'
+down_revision = 'e4b7a1d6c953'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'rank')
+    )
+    op.create_index(op.f('ix_user_recommendations_product_id'), 'user_recommendations', ['product_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_user_recommendations_product_id'), table_name='user_recommendations')
+    op.drop_table('user_recommendations')
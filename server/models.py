@@ -11,7 +11,10 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=True)
     role = db.Column(db.String(20), default='customer')
     profile_picture = db.Column(db.Text, nullable=True)
+    profile_picture_variants = db.Column(db.JSON, nullable=True)  # {size: {format: url}}, see image_variants.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped to revoke issued tokens when role or credentials change (see authz.py)
+    perms_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     carts = db.relationship('Cart', backref='user', lazy=True)
@@ -31,9 +34,16 @@ class Store(db.Model):
     name = db.Column(db.String(200), nullable=False)
     address = db.Column(db.Text, nullable=True)
     logo_url = db.Column(db.String(500), nullable=True)
+    logo_variants = db.Column(db.JSON, nullable=True)  # {size: {format: url}}, see image_variants.py
     contact_number = db.Column(db.String(20), nullable=True)
     description = db.Column(db.Text, nullable=True)
     manager_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=False)
+    # Review totals across the store's products, maintained by review_stats.py
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    avg_rating = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    # Units in non-cancelled orders across the store, maintained by sales_counters.py
+    units_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -44,6 +54,10 @@ class Store(db.Model):
     def __repr__(self):
         return f'<Store {self.name}>'
 
+def _list_price(context):
+    """Default effective_price for inserts that do not set it: the undiscounted price."""
+    return context.get_current_parameters()['price']
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -52,6 +66,7 @@ class Product(db.Model):
     cost_price = db.Column(db.Float, nullable=True)  # Cost to the store for this product
     stock_quantity = db.Column(db.Integer, default=0)
     image_url = db.Column(db.String(500), nullable=True)
+    image_variants = db.Column(db.JSON, nullable=True)  # {size: {format: url}}, see image_variants.py
     category = db.Column(db.String(100), nullable=True)
     district = db.Column(db.String(100), nullable=True)  # e.g., 'Karachi', 'Sindh', 'Lahore'
     store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=False)
@@ -60,6 +75,9 @@ class Product(db.Model):
     sale_start_date = db.Column(db.DateTime, nullable=True)
     sale_end_date = db.Column(db.DateTime, nullable=True)
     sale_discount_percentage = db.Column(db.Float, nullable=True)  # e.g., 10.0 for 10%
+    # Price right now with any open sale applied, maintained by pricing.py
+    effective_price = db.Column(db.Float, nullable=False, index=True, default=_list_price)
+    sale_active = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false(), index=True)
 
     # Display control fields
     is_featured = db.Column(db.Boolean, default=False)  # For featured products section
@@ -67,6 +85,13 @@ class Product(db.Model):
     featured_order = db.Column(db.Integer, default=0)  # Display order for featured products
     new_arrival_order = db.Column(db.Integer, default=0)  # Display order for new arrivals
 
+    # Review totals, maintained by review_stats.py
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    avg_rating = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    # Units in non-cancelled orders, maintained by sales_counters.py
+    units_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -76,6 +101,14 @@ class Product(db.Model):
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     reviews = db.relationship('Review', backref='product', lazy=True)
 
+    __table_args__ = (
+        # Supports keyset pagination ordered by (created_at, id)
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        # Best-sellers index, global and per category (see sales_counters.py)
+        db.Index('ix_product_units_sold_id', 'units_sold', 'id'),
+        db.Index('ix_product_category_units_sold_id', 'category', 'units_sold', 'id'),
+    )
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
@@ -145,6 +178,12 @@ class Order(db.Model):
     items = db.relationship('OrderItem', backref='order', lazy=True)
     payment = db.relationship('Payment', backref='order', uselist=False, lazy=True)
 
+    # Support keyset pagination ordered by (created_at, id), globally and per store
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_store_id_created_at_id', 'store_id', 'created_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<Order {self.id}>'
 
@@ -154,10 +193,29 @@ class OrderItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    # Set when the unit came from a flash sale's stock pool (see flash_sale.py)
+    flash_sale_id = db.Column(db.Integer, db.ForeignKey('flash_sale.id'), nullable=True, index=True)
 
     def __repr__(self):
         return f'<OrderItem {self.id}>'
 
+class FlashSale(db.Model):
+    """A product's stock pool for a flash sale window, see flash_sale.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    units = db.Column(db.Integer, nullable=False)  # Taken out of stock_quantity when the sale is created
+    allocated = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Units handed to app processes
+    flushed_units = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Sold units applied to units_sold
+    closed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', lazy=True)
+
+    def __repr__(self):
+        return f'<FlashSale {self.id} for product {self.product_id}>'
+
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -208,6 +266,34 @@ class ButtonClick(db.Model):
         return f'<ButtonClick {self.button_name}>'
 
 
+class ProductRecommendation(db.Model):
+    """Precomputed item-to-item neighbours, rebuilt by scripts/build_recommendations.py"""
+    __tablename__ = 'product_recommendations'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    recommended_product = db.relationship('Product', foreign_keys=[recommended_product_id], lazy=True)
+
+    def __repr__(self):
+        return f'<ProductRecommendation {self.product_id} #{self.rank}: {self.recommended_product_id}>'
+
+class UserRecommendation(db.Model):
+    """Precomputed per-customer recommendation feed, see recommendations.py"""
+    __tablename__ = 'user_recommendations'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    product = db.relationship('Product', lazy=True)
+
+    def __repr__(self):
+        return f'<UserRecommendation {self.user_id} #{self.rank}: {self.product_id}>'
+
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -248,9 +334,60 @@ class ProductAnalytics(db.Model):
     # Relationships
     product = db.relationship('Product', backref='analytics', lazy=True)
 
+    # Bounds the raw-event scans that top up the daily rollups
+    __table_args__ = (db.Index('ix_product_analytics_timestamp', 'timestamp'),)
+
     def __repr__(self):
         return f'<ProductAnalytics {self.action} on product {self.product_id}>'
 
+class ProductAnalyticsDaily(db.Model):
+    """Per-day rollup of ProductAnalytics, maintained by analytics_rollup.py"""
+    __tablename__ = 'product_analytics_daily'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    time_spent_sum = db.Column(db.Float, nullable=False, default=0)
+    time_spent_count = db.Column(db.Integer, nullable=False, default=0)  # events that reported time_spent
+
+    __table_args__ = (db.Index('ix_product_analytics_daily_date_action', 'date', 'action'),)
+
+    def __repr__(self):
+        return f'<ProductAnalyticsDaily {self.action} on product {self.product_id} for {self.date}>'
+
+class CacheVersion(db.Model):
+    """Version counter per cached dataset, bumped on writes (see cache_versions.py)"""
+    __tablename__ = 'cache_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}: {self.version}>'
+
+class IdempotencyKey(db.Model):
+    """First response to a request sent with an Idempotency-Key header, see idempotency.py"""
+    __tablename__ = 'idempotency_key'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 of the request body
+    status_code = db.Column(db.SmallInteger, nullable=True)  # null while the first request is in flight
+    response_body = db.Column(db.Text, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key} {self.status_code}>'
+
+class AnalyticsRollupState(db.Model):
+    """Watermark for the daily rollups: every day up to rolled_through is aggregated"""
+    __tablename__ = 'analytics_rollup_state'
+    name = db.Column(db.String(50), primary_key=True)
+    rolled_through = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AnalyticsRollupState {self.name}: {self.rolled_through}>'
+
 class Address(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -299,6 +436,27 @@ class Commission(db.Model):
     def __repr__(self):
         return f'<Commission {self.commission_percentage or self.commission_amount} for product {self.product_id}>'
 
+class CommissionLedger(db.Model):
+    """Commission earned on one delivered order item, frozen at delivery time"""
+    __tablename__ = 'commission_ledger'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    order_item_id = db.Column(db.Integer, db.ForeignKey('order_item.id'), nullable=False, unique=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    commission_type = db.Column(db.String(20), nullable=False)  # 'manual_amount', 'manual_percentage', 'tier', 'none'
+    commission_rate_id = db.Column(db.Integer, db.ForeignKey('commission_rate.id', ondelete='SET NULL'), nullable=True)
+    commission_percentage = db.Column(db.Float, nullable=True)  # Percentage applied, if any
+    commission_amount = db.Column(db.Float, nullable=True)  # Fixed amount per unit applied, if any
+    commission_earned = db.Column(db.Float, nullable=False)
+    order_created_at = db.Column(db.DateTime, nullable=False, index=True)  # For trends by order date
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CommissionLedger {self.commission_earned} for order item {self.order_item_id}>'
+
 class CommissionRate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)  # e.g., "Standard", "Premium"
@@ -329,5 +487,8 @@ class Notification(db.Model):
     # Relationships
     user = db.relationship('User', backref='notifications', lazy=True)
 
+    # Supports keyset pagination ordered by (created_at, id)
+    __table_args__ = (db.Index('ix_notification_created_at_id', 'created_at', 'id'),)
+
     def __repr__(self):
         return f'<Notification {self.type}: {self.title} for user {self.user_id}>'
@@ -0,0 +1,174 @@
+"""Effective product prices, computed on the server.
+
+A product's price to the customer is ``price`` minus
+``sale_discount_percentage`` while its sale window is open, rounded half up
+to the cent (``sale_price``). Clients used to compute this from the raw sale fields, and checkout
+trusted whatever price they sent.
+
+The price is now stored on the product. ``effective_price`` (indexed) is the
+price right now, and ``sale_active`` records whether the sale discount is
+applied. Listings filter and sort on the column in SQL.
+
+* Product writes (create, update, bulk import) set both columns with
+  ``apply_pricing`` / ``pricing_values``.
+* Sale windows open and close with time, not with writes.
+  ``flip_sale_windows`` updates the products whose window opened or closed
+  since its last run. Closing is one set-based UPDATE. Opening reads the
+  products and writes ``sale_price`` for each in one executemany, because SQL
+  rounding of float prices does not agree with ``sale_price`` on every
+  value, and checkout compares against ``sale_price``. ``PricingWorker`` runs it
+  every ``PRICING_INTERVAL`` seconds. Stored prices can therefore lag a
+  window edge by up to one interval.
+* Checkout does not depend on that lag. It prices every line with
+  ``effective_price`` from the product rows it loads anyway (one IN query),
+  and rejects carts whose prices or totals do not match.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from models import db, Product
+from sqlalchemy import and_, bindparam, not_, update
+from response_cache import invalidate_catalog
+from logger import setup_logger
+
+logger = setup_logger()
+
+# Prices are compared and stored to the cent
+PRICE_TOLERANCE = 0.005
+CENT = Decimal('0.01')
+
+
+def sale_is_active(sale_type, sale_start, sale_end, sale_discount, now=None):
+    now = now or datetime.utcnow()
+    return bool(
+        sale_type and sale_start and sale_end and sale_discount
+        and sale_discount > 0 and sale_start <= now <= sale_end
+    )
+
+
+def sale_price(price, sale_discount):
+    """``price`` less ``sale_discount`` percent, rounded half up to the cent.
+
+    Computed in decimal from the prices as written, so 4466.69 at 50% is
+    2233.35; float arithmetic and ``round`` would give 2233.34.
+    """
+    discounted = Decimal(str(price)) * (100 - Decimal(str(sale_discount))) / 100
+    return float(discounted.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def effective_price(price, sale_type, sale_start, sale_end, sale_discount, now=None):
+    """The price a customer pays at ``now``."""
+    if sale_is_active(sale_type, sale_start, sale_end, sale_discount, now):
+        return sale_price(price, sale_discount)
+    return price
+
+
+def pricing_values(values, now=None):
+    """``effective_price`` and ``sale_active`` for a dict of Product column values."""
+    args = (values.get('sale_type'), values.get('sale_start_date'), values.get('sale_end_date'),
+            values.get('sale_discount_percentage'), now)
+    return {
+        'effective_price': effective_price(values['price'], *args),
+        'sale_active': sale_is_active(*args),
+    }
+
+
+def apply_pricing(product, now=None):
+    """Set ``product.effective_price`` and ``product.sale_active`` from its price and sale fields."""
+    args = (product.sale_type, product.sale_start_date, product.sale_end_date,
+            product.sale_discount_percentage, now)
+    product.effective_price = effective_price(product.price, *args)
+    product.sale_active = sale_is_active(*args)
+
+
+def current_price(product, now=None):
+    """The product's price at ``now``, from its columns rather than the stored effective_price."""
+    return effective_price(product.price, product.sale_type, product.sale_start_date,
+                           product.sale_end_date, product.sale_discount_percentage, now)
+
+
+def prices_match(a, b):
+    return abs(a - b) < PRICE_TOLERANCE
+
+
+def _in_window(now):
+    return and_(
+        Product.sale_type.isnot(None),
+        Product.sale_start_date <= now,
+        Product.sale_end_date >= now,
+        Product.sale_discount_percentage > 0
+    )
+
+
+def flip_sale_windows(now=None):
+    """Reprice products whose sale window opened or closed. Returns (opened, closed). Commits."""
+    now = now or datetime.utcnow()
+    opening = db.session.query(Product.id, Product.price, Product.sale_discount_percentage).filter(
+        Product.sale_active == False, _in_window(now)
+    ).all()
+    opened = 0
+    if opening:
+        # Skips products whose price or discount was edited since the read; the edit repriced them
+        table = Product.__table__
+        db.session.execute(
+            update(table).where(
+                table.c.id == bindparam('product_id'),
+                table.c.price == bindparam('list_price'),
+                table.c.sale_discount_percentage == bindparam('discount'),
+                table.c.sale_active == False
+            ).values(sale_active=True, effective_price=bindparam('new_price')),
+            [{'product_id': row.id, 'list_price': row.price, 'discount': row.sale_discount_percentage,
+              'new_price': sale_price(row.price, row.sale_discount_percentage)} for row in opening]
+        )
+        opened = len(opening)
+    closed = db.session.query(Product).filter(
+        Product.sale_active == True, not_(_in_window(now))
+    ).update({Product.sale_active: False, Product.effective_price: Product.price}, synchronize_session=False)
+    if opened or closed:
+        invalidate_catalog()
+    db.session.commit()
+    return opened, closed
+
+
+class PricingWorker:
+    """Background thread that opens and closes sale windows (one per process)."""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def ensure_started(self):
+        if self.app is None or self.app.config.get('TESTING'):
+            return
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='sale-windows', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    opened, closed = flip_sale_windows()
+                    if opened or closed:
+                        logger.info(f"Sale windows: {opened} product(s) went on sale, {closed} came off sale")
+            except Exception as e:
+                logger.error(f"Sale window update failed: {str(e)}")
+            time.sleep(self.app.config.get('PRICING_INTERVAL', 60))
+
+
+pricing_worker = PricingWorker()
@@ -0,0 +1,275 @@
+"""Bulk product import and export for store managers.
+
+Imports stream CSV (with a header row) or JSON Lines. Rows are validated in
+chunks of ``CHUNK_SIZE`` with the same rules as ``create_product``.
+Categories are resolved from a name/id map and commission tiers from the
+cached tier index, both loaded once per import, so validation does not touch
+the database. Each chunk's valid products and their automatic commissions
+are written with two multi-row INSERTs and committed together. A bad row is
+reported with its row number and skipped; it does not fail its chunk.
+
+Exports stream the same columns back, reading the store's products in id
+order ``CHUNK_SIZE`` rows at a time, so neither direction holds the whole
+catalog in memory.
+
+Images are not uploaded here: ``image_url`` is taken as given.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from models import db, Category, Commission, Product
+from sqlalchemy import insert, select
+from commission_engine import CommissionTiers
+from pricing import pricing_values
+from response_cache import invalidate_catalog
+from search import reset_search_index
+from time_buckets import parse_utc_datetime
+
+CHUNK_SIZE = 1000
+# Row errors listed in an import result; the rest are only counted
+ERROR_REPORT_LIMIT = 100
+
+FORMATS = ('csv', 'jsonl')
+
+IMPORT_FIELDS = [
+    'name', 'description', 'price', 'cost_price', 'stock_quantity', 'image_url', 'category',
+    'district', 'is_featured', 'sale_type', 'sale_start_date', 'sale_end_date', 'sale_discount_percentage'
+]
+EXPORT_FIELDS = ['id'] + IMPORT_FIELDS
+
+TRUE_VALUES = {'true', '1', 'yes', 'y'}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message is returned to the caller."""
+
+
+def detect_format(filename=None, mimetype=None):
+    """'csv' or 'jsonl' from a file name or content type, or None."""
+    name = (filename or '').lower()
+    if name.endswith('.csv') or (mimetype or '').startswith('text/csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')) or (mimetype or '') in ('application/jsonl', 'application/x-ndjson'):
+        return 'jsonl'
+    return None
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict) from a text stream. Rows are numbered from 1, header excluded."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif fmt == 'jsonl':
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(row, field, cast, label):
+    value = _text(row, field)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise RowError(f'Invalid {label}')
+
+
+def _date(row, field):
+    value = _text(row, field)
+    if value is None:
+        return None
+    try:
+        return parse_utc_datetime(value)
+    except ValueError:
+        raise RowError(f'Invalid {field} format. Use ISO format.')
+
+
+class ProductImporter:
+    """Validates and inserts product rows for one store."""
+
+    def __init__(self, store_id, chunk_size=CHUNK_SIZE):
+        self.store_id = store_id
+        self.chunk_size = chunk_size
+        self.tiers = CommissionTiers.current()
+        self.categories_by_id = {}
+        self.categories_by_name = {}
+        for category_id, name in db.session.query(Category.id, Category.name):
+            self.categories_by_id[category_id] = name
+            self.categories_by_name[name.lower()] = name
+
+    def _category(self, row):
+        category_id = _text(row, 'category_id')
+        if category_id is not None:
+            try:
+                name = self.categories_by_id.get(int(category_id))
+            except ValueError:
+                name = None
+            if name is None:
+                raise RowError('Invalid category_id')
+            return name
+        category = _text(row, 'category')
+        if category is None:
+            return None
+        name = self.categories_by_name.get(category.lower())
+        if name is None:
+            raise RowError(f'Unknown category: {category}')
+        return name
+
+    def validate(self, row):
+        """The Product column values for a row, or RowError."""
+        if row is None:
+            raise RowError('Row is not a JSON object')
+        name = _text(row, 'name')
+        price = _number(row, 'price', float, 'price or stock quantity')
+        if not name or price is None:
+            raise RowError('Name and price are required')
+        stock_quantity = _number(row, 'stock_quantity', int, 'price or stock quantity') or 0
+        cost_price = _number(row, 'cost_price', float, 'cost_price')
+
+        sale_type = _text(row, 'sale_type')
+        sale_start = _date(row, 'sale_start_date')
+        sale_end = _date(row, 'sale_end_date')
+        sale_discount = _number(row, 'sale_discount_percentage', float, 'sale_discount_percentage')
+        if sale_discount is not None and (sale_discount < 0 or sale_discount > 100):
+            raise RowError('sale_discount_percentage must be between 0 and 100')
+        if sale_type and not (sale_start and sale_end and sale_discount is not None):
+            raise RowError('If sale_type is provided, sale_start_date, sale_end_date, and sale_discount_percentage are required')
+        if (sale_start or sale_end or sale_discount is not None) and not sale_type:
+            raise RowError('If sale dates or discount are provided, sale_type is required')
+        if sale_start and sale_end and sale_start >= sale_end:
+            raise RowError('sale_start_date must be before sale_end_date')
+
+        values = {
+            'name': name,
+            'description': _text(row, 'description'),
+            'price': price,
+            'cost_price': cost_price,
+            'stock_quantity': stock_quantity,
+            'image_url': _text(row, 'image_url'),
+            'category': self._category(row),
+            'district': _text(row, 'district') or '',
+            'store_id': self.store_id,
+            'is_featured': (_text(row, 'is_featured') or '').lower() in TRUE_VALUES,
+            'sale_type': sale_type,
+            'sale_start_date': sale_start,
+            'sale_end_date': sale_end,
+            'sale_discount_percentage': sale_discount,
+        }
+        values.update(pricing_values(values))
+        return values
+
+    def _write_chunk(self, products):
+        ids = db.session.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True), products
+        ).scalars().all()
+        commissions = []
+        for product_id, values in zip(ids, products):
+            rate = self.tiers.rate_for(values['price'])
+            if rate:
+                commissions.append({
+                    'product_id': product_id,
+                    'store_id': self.store_id,
+                    'commission_percentage': rate.commission_percentage,
+                    'commission_amount': None,
+                    'is_manual': False,
+                })
+        if commissions:
+            db.session.execute(insert(Commission), commissions)
+        invalidate_catalog()
+        db.session.commit()
+
+    def run(self, rows):
+        """Import (row number, dict) pairs. Returns counts and the first row errors."""
+        imported = 0
+        failed = 0
+        errors = []
+        chunk = []
+        for number, row in rows:
+            try:
+                chunk.append(self.validate(row))
+            except RowError as e:
+                failed += 1
+                if len(errors) < ERROR_REPORT_LIMIT:
+                    errors.append({'row': number, 'message': str(e)})
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk)
+                imported += len(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+            imported += len(chunk)
+        if imported:
+            reset_search_index()
+        return {'imported': imported, 'failed': failed, 'errors': errors}
+
+
+def import_products(stream, fmt, store_id, chunk_size=CHUNK_SIZE):
+    """Import a CSV or JSONL text stream into ``store_id``."""
+    return ProductImporter(store_id, chunk_size).run(read_rows(stream, fmt))
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_product_rows(store_id=None, chunk_size=CHUNK_SIZE):
+    """Yield export dicts in id order, reading ``chunk_size`` products per query."""
+    columns = [getattr(Product, field) for field in EXPORT_FIELDS]
+    last_id = 0
+    while True:
+        query = select(*columns).where(Product.id > last_id).order_by(Product.id).limit(chunk_size)
+        if store_id is not None:
+            query = query.where(Product.store_id == store_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            return
+        for row in rows:
+            yield {field: _export_value(value) for field, value in zip(EXPORT_FIELDS, row)}
+        last_id = rows[-1].id
+
+
+def export_products(fmt, store_id=None, chunk_size=CHUNK_SIZE):
+    """Yield the export as text chunks of CSV (with header) or JSONL."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported format: {fmt}')
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    pending = 0
+    for row in iter_product_rows(store_id, chunk_size):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + '\n')
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,113 @@
+"""Offline builder for the ``product_recommendations`` table.
+
+Every shopper contributes one row of a sparse user x product matrix, holding
+a weighted sum of their signals for each product:
+
+* bought it in an order that was not cancelled
+* has it on a wishlist
+* viewed it while logged in within the last ``view_days`` days
+
+The weights and queries for these are ``signal_selects`` in recommendations.py,
+which the per-customer feeds share.
+
+The similarity of two products is the cosine of their columns, so products
+that the same shoppers engage with score high, and a handful of very popular
+products does not dominate everyone's neighbours. The similarity matrix is
+computed ``BLOCK_SIZE`` rows at a time with SciPy sparse math, and
+only the ``top_n`` best neighbours of each row are kept, so memory stays
+bounded by the block size rather than the square of the catalog.
+
+The table is replaced in one transaction; readers see the old neighbours
+until the commit.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+from models import db, Product, ProductRecommendation
+from recommendations import INSERT_BATCH_SIZE, VIEW_WINDOW_DAYS, signal_selects
+from response_cache import invalidate_catalog
+
+TOP_N = 20
+BLOCK_SIZE = 2048
+
+
+def interaction_matrix(view_days=VIEW_WINDOW_DAYS):
+    """Returns (users x products CSR matrix, array of product ids by column)."""
+    product_ids = np.array([pid for (pid,) in db.session.query(Product.id).order_by(Product.id)], dtype=np.int64)
+    column_of = {int(pid): i for i, pid in enumerate(product_ids)}
+    row_of = {}
+    rows, cols, weights = [], [], []
+    for signal in signal_selects(view_days=view_days):
+        for user_id, product_id, weight in db.session.execute(signal).yield_per(10000):
+            col = column_of.get(product_id)
+            if col is None or user_id is None:
+                continue
+            rows.append(row_of.setdefault(user_id, len(row_of)))
+            cols.append(col)
+            weights.append(weight)
+    # Duplicate (user, product) entries from different signals are summed
+    matrix = sparse.csr_matrix(
+        (np.array(weights, dtype=np.float32), (np.array(rows), np.array(cols))),
+        shape=(len(row_of), len(product_ids))
+    )
+    return matrix, product_ids
+
+
+def nearest_neighbours(matrix, top_n=TOP_N, block_size=BLOCK_SIZE):
+    """Yield (column, [(neighbour column, cosine)], best first) for every column with neighbours."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (matrix @ sparse.diags(inverse)).tocsc()
+    transposed = normalized.T.tocsr()
+
+    for start in range(0, normalized.shape[1], block_size):
+        block = (transposed[start:start + block_size] @ normalized).tocsr()
+        for offset in range(block.shape[0]):
+            column = start + offset
+            begin, end = block.indptr[offset], block.indptr[offset + 1]
+            neighbours = block.indices[begin:end]
+            scores = block.data[begin:end]
+            keep = (neighbours != column) & (scores > 0)
+            neighbours, scores = neighbours[keep], scores[keep]
+            if not len(neighbours):
+                continue
+            if len(neighbours) > top_n:
+                best = np.argpartition(-scores, top_n - 1)[:top_n]
+                neighbours, scores = neighbours[best], scores[best]
+            order = np.lexsort((neighbours, -scores))
+            yield column, list(zip(neighbours[order].tolist(), scores[order].tolist()))
+
+
+def build_recommendations(top_n=TOP_N, view_days=VIEW_WINDOW_DAYS, log=print):
+    """Recompute and replace every product's neighbours. Returns the number of rows written."""
+    matrix, product_ids = interaction_matrix(view_days)
+    log(f'Interaction matrix: {matrix.shape[0]} shopper(s) x {matrix.shape[1]} product(s), {matrix.nnz} signal(s)')
+
+    computed_at = datetime.utcnow()
+    ProductRecommendation.query.delete(synchronize_session=False)
+    batch = []
+    written = 0
+    for column, neighbours in nearest_neighbours(matrix, top_n):
+        product_id = int(product_ids[column])
+        for rank, (neighbour, score) in enumerate(neighbours, start=1):
+            batch.append({
+                'product_id': product_id,
+                'rank': rank,
+                'recommended_product_id': int(product_ids[neighbour]),
+                'score': float(score),
+                'computed_at': computed_at
+            })
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(ProductRecommendation.__table__.insert(), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(ProductRecommendation.__table__.insert(), batch)
+        written += len(batch)
+    # Cached /recommendations responses hold the previous neighbours
+    invalidate_catalog()
+    db.session.commit()
+    return written
@@ -0,0 +1,219 @@
+"""Product recommendations for the product page and the customer dashboard.
+
+The main source is ``product_recommendations``: the top neighbours of each
+product by co-purchases, co-views and wishlist overlap. It is rebuilt offline
+by ``scripts/build_recommendations.py`` (see recommendation_builder.py), so
+serving it is one indexed lookup.
+
+Products with no precomputed neighbours yet, such as new products or ones
+nobody has bought, viewed or wishlisted, fall back to the category heuristic
+that used to serve every request.
+
+Each customer also has a feed in ``user_recommendations``: the neighbours of
+everything they bought, wishlisted or recently viewed, weighted like the
+builder's signals, leaving out what they already bought or wishlisted. The
+builder script rebuilds every feed. ``refresh_user_recommendations`` rebuilds
+one customer's feed in the transaction that places an order or changes the
+wishlist. Customers without a feed get ``sample_products``, a random sample
+that costs a few index seeks instead of ``ORDER BY random()`` over the
+catalog.
+"""
+
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import (db, Order, OrderItem, Product, ProductAnalytics, ProductRecommendation,
+                    UserRecommendation, Wishlist, WishlistItem)
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import joinedload
+
+RECOMMENDATION_LIMIT = 8
+
+# Weight of each kind of signal a shopper has on a product
+ORDER_WEIGHT = 3.0
+WISHLIST_WEIGHT = 2.0
+VIEW_WEIGHT = 1.0
+# Only product views this recent count
+VIEW_WINDOW_DAYS = 90
+
+# Products kept in each customer's feed
+USER_FEED_SIZE = 20
+# Random id probes per requested product when sampling, to make up for gaps and exclusions
+SAMPLE_OVERDRAW = 3
+INSERT_BATCH_SIZE = 5000
+
+
+def precomputed_recommendations(product_id, limit=RECOMMENDATION_LIMIT):
+    """Precomputed neighbours of a product, best first. Empty if none were built."""
+    rows = ProductRecommendation.query.options(
+        joinedload(ProductRecommendation.recommended_product)
+    ).filter(
+        ProductRecommendation.product_id == product_id
+    ).order_by(ProductRecommendation.rank).limit(limit).all()
+    return [row.recommended_product for row in rows if row.recommended_product is not None]
+
+
+def heuristic_recommendations(product, limit=RECOMMENDATION_LIMIT):
+    """Other products in the same category scored by same-store boost, popularity and recency."""
+    if not product.category:
+        return []
+
+    candidates = Product.query.filter(Product.category == product.category, Product.id != product.id).all()
+
+    scored = []
+    for p in candidates:
+        # popularity: total units sold
+        popularity = p.units_sold or 0
+
+        # same store boost
+        same_store = 1 if (p.store_id and product.store_id and p.store_id == product.store_id) else 0
+
+        # recency factor (days since creation) -> newer is better
+        recency = 0
+        try:
+            age_seconds = (product.created_at - p.created_at).total_seconds()
+            recency = max(0, -age_seconds / (60 * 60 * 24))  # negative age -> positive recency
+        except Exception:
+            recency = 0
+
+        score = (same_store * 100) + (popularity * 2) + recency
+        scored.append((score, p))
+
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [p for (_s, p) in scored[:limit]]
+
+
+def recommendations_for(product, limit=RECOMMENDATION_LIMIT):
+    return precomputed_recommendations(product.id, limit) or heuristic_recommendations(product, limit)
+
+
+def signal_selects(user_id=None, include_views=True, view_days=VIEW_WINDOW_DAYS):
+    """SELECTs of distinct (user_id, product_id, weight), one per kind of signal."""
+    purchases = select(
+        Order.user_id, OrderItem.product_id, literal(ORDER_WEIGHT).label('weight')
+    ).join(Order, Order.id == OrderItem.order_id).where(Order.status != 'cancelled')
+    wishlisted = select(
+        Wishlist.user_id, WishlistItem.product_id, literal(WISHLIST_WEIGHT).label('weight')
+    ).join(Wishlist, Wishlist.id == WishlistItem.wishlist_id)
+    selects = [(purchases, Order.user_id), (wishlisted, Wishlist.user_id)]
+    if include_views:
+        viewed = select(
+            ProductAnalytics.user_id, ProductAnalytics.product_id, literal(VIEW_WEIGHT).label('weight')
+        ).where(
+            ProductAnalytics.user_id.isnot(None),
+            ProductAnalytics.action == 'view',
+            ProductAnalytics.timestamp >= datetime.utcnow() - timedelta(days=view_days)
+        )
+        selects.append((viewed, ProductAnalytics.user_id))
+    if user_id is not None:
+        selects = [(query.where(user_column == user_id), user_column) for query, user_column in selects]
+    return [query.distinct() for query, _user_column in selects]
+
+
+def _owned_products(user_id=None):
+    """{user_id: {product_id}} the customer already bought or wishlisted."""
+    owned = union_all(*signal_selects(user_id, include_views=False)).subquery()
+    by_user = defaultdict(set)
+    for row_user_id, product_id in db.session.query(owned.c.user_id, owned.c.product_id):
+        by_user[row_user_id].add(product_id)
+    return by_user
+
+
+def _scored_candidates(user_id=None):
+    """(user_id, product_id, score) for every neighbour of a customer's history."""
+    history = union_all(*signal_selects(user_id)).subquery()
+    return db.session.query(
+        history.c.user_id,
+        ProductRecommendation.recommended_product_id,
+        func.sum(ProductRecommendation.score * history.c.weight).label('score')
+    ).join(
+        ProductRecommendation, ProductRecommendation.product_id == history.c.product_id
+    ).group_by(history.c.user_id, ProductRecommendation.recommended_product_id)
+
+
+def _feed_rows(user_id, candidates, owned, computed_at):
+    best = sorted(
+        ((product_id, score) for product_id, score in candidates if product_id not in owned),
+        key=lambda candidate: (-candidate[1], candidate[0])
+    )[:USER_FEED_SIZE]
+    return [{
+        'user_id': user_id,
+        'rank': rank,
+        'product_id': product_id,
+        'score': float(score),
+        'computed_at': computed_at
+    } for rank, (product_id, score) in enumerate(best, start=1)]
+
+
+def refresh_user_recommendations(user_id):
+    """Rebuild one customer's feed from their current history. Does not commit."""
+    user_id = int(user_id)
+    owned = _owned_products(user_id)[user_id]
+    candidates = [(product_id, score) for _user_id, product_id, score in _scored_candidates(user_id)]
+    UserRecommendation.query.filter(UserRecommendation.user_id == user_id).delete(synchronize_session=False)
+    rows = _feed_rows(user_id, candidates, owned, datetime.utcnow())
+    if rows:
+        db.session.execute(UserRecommendation.__table__.insert(), rows)
+
+
+def build_user_feeds():
+    """Rebuild every customer's feed from product_recommendations and commit. Returns rows written."""
+    owned = _owned_products()
+    candidates = defaultdict(list)
+    for user_id, product_id, score in _scored_candidates().yield_per(10000):
+        candidates[user_id].append((product_id, score))
+
+    computed_at = datetime.utcnow()
+    UserRecommendation.query.delete(synchronize_session=False)
+    batch = []
+    written = 0
+    for user_id, user_candidates in candidates.items():
+        batch.extend(_feed_rows(user_id, user_candidates, owned[user_id], computed_at))
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(UserRecommendation.__table__.insert(), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(UserRecommendation.__table__.insert(), batch)
+        written += len(batch)
+    db.session.commit()
+    return written
+
+
+def sample_products(limit, exclude_ids=()):
+    """Up to ``limit`` random products, found by seeking to random points of the id range.
+
+    Each probe is one index seek (the first product with id >= a random id),
+    and all probes go out in one statement, so the cost does not grow with the
+    catalog. Products right after a gap in the ids are a little more likely
+    to be picked, which is fine for filler recommendations.
+    """
+    low, high = db.session.query(func.min(Product.id), func.max(Product.id)).one()
+    if low is None:
+        return []
+    probes = [
+        select(Product.id).where(Product.id >= random.randint(low, high)).order_by(Product.id).limit(1).subquery()
+        for _ in range(limit * SAMPLE_OVERDRAW)
+    ]
+    sampled = union_all(*[select(probe.c.id) for probe in probes])
+    query = Product.query.options(joinedload(Product.store)).filter(Product.id.in_(sampled))
+    if exclude_ids:
+        query = query.filter(~Product.id.in_(list(exclude_ids)))
+    products = query.all()
+    random.shuffle(products)
+    return products[:limit]
+
+
+def recommended_for_user(user_id, limit=4):
+    """The top of a customer's feed, topped up with random products when it is short."""
+    rows = UserRecommendation.query.options(
+        joinedload(UserRecommendation.product).joinedload(Product.store)
+    ).filter(
+        UserRecommendation.user_id == user_id
+    ).order_by(UserRecommendation.rank).limit(limit).all()
+    products = [row.product for row in rows if row.product is not None]
+    if len(products) < limit:
+        exclude = _owned_products(user_id)[user_id] | {p.id for p in products}
+        products += sample_products(limit - len(products), exclude)
+    return products
@@ -0,0 +1,107 @@
+"""HTTP caching for the public catalog endpoints.
+
+Anonymous catalog reads (product lists and pages, the homepage rails, store
+pages, reviews and comments) are wrapped in ``@cached_response``. A rendered
+200 response is kept in an in-process LRU keyed by path and query string,
+together with a weak ETag over its body. A later request for the same URL is
+served from memory, and one whose ``If-None-Match`` matches gets a bodiless
+304.
+
+Entries are tagged with the ``catalog`` version counter (see
+cache_versions.py). Routes that write products, reviews, comments or stores
+call ``invalidate_catalog()`` before committing, which stales the entries in
+every worker. A single counter is cheaper to check than aggregating
+``Product.updated_at`` or review counts per request, and it also catches
+deletes. Entries also expire after ``CATALOG_CACHE_TTL`` seconds, because
+stock levels, sales counts and sale windows change without a catalog write.
+
+``Cache-Control`` lets shared caches (a CDN) keep a response for
+``CATALOG_CACHE_MAX_AGE`` seconds. Browsers revalidate every time, which
+costs a 304.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, request
+from cache_versions import bump_version, current_version
+
+CATALOG_CACHE = 'catalog'
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'mimetype', 'etag', 'version', 'expires_at'])
+
+
+class ResponseCache:
+    """LRU of CachedResponse by request path."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, max_size):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def invalidate_catalog():
+    """Stale every cached catalog response. Call before committing a catalog write."""
+    bump_version(CATALOG_CACHE)
+
+
+def render_cached(entry):
+    """A response for ``entry`` with its ETag and Cache-Control, or a 304."""
+    response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+    response.set_etag(entry.etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.cache_control.s_maxage = current_app.config.get('CATALOG_CACHE_MAX_AGE', 60)
+    # Turns the response into a 304 when If-None-Match matches
+    return response.make_conditional(request)
+
+
+def cached_response(view):
+    """Serve an anonymous GET view from the catalog response cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        ttl = current_app.config.get('CATALOG_CACHE_TTL', 0)
+        key = request.full_path
+        version = current_version(CATALOG_CACHE)
+
+        entry = response_cache.get(key, version) if ttl > 0 else None
+        if entry is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = CachedResponse(
+                body, response.mimetype, hashlib.md5(body).hexdigest(),
+                version, time.monotonic() + ttl
+            )
+            if ttl > 0:
+                response_cache.put(key, entry, current_app.config.get('CATALOG_CACHE_SIZE', 512))
+        return render_cached(entry)
+    return wrapper
@@ -0,0 +1,111 @@
+"""Denormalized review statistics on Product and Store.
+
+Listings used to run a GROUP BY over Review for every page, and the product
+and store pages loaded every review of a store to average them in Python.
+Product and Store now carry ``rating_sum``, ``rating_count`` and
+``avg_rating`` instead.
+
+``record_review`` and ``remove_review`` adjust them in the same transaction
+as the review write. Each UPDATE adds to the current column values rather
+than writing values computed in Python, so concurrent reviews cannot lose an
+increment. ``avg_rating`` is derived in the same statement.
+``scripts/reconcile_review_stats.py`` recomputes everything from Review and
+reports any drift.
+"""
+
+from models import db, Product, Store, Review
+from sqlalchemy import case, func
+from sqlalchemy.orm.util import identity_key
+
+STAT_COLUMNS = ['rating_sum', 'rating_count', 'avg_rating']
+
+
+def _average(rating_sum, rating_count):
+    return case((rating_count > 0, rating_sum * 1.0 / rating_count), else_=0.0)
+
+
+def _adjust(model, row_id, rating_delta, count_delta):
+    new_sum = model.rating_sum + rating_delta
+    new_count = model.rating_count + count_delta
+    db.session.query(model).filter(model.id == row_id).update({
+        model.rating_sum: new_sum,
+        model.rating_count: new_count,
+        model.avg_rating: _average(new_sum, new_count),
+        # A review is not an edit of the product or store
+        model.updated_at: model.updated_at,
+    }, synchronize_session=False)
+    loaded = db.session.identity_map.get(identity_key(model, row_id))
+    if loaded is not None:
+        db.session.expire(loaded, STAT_COLUMNS)
+
+
+def record_review(product, rating):
+    """Count a new review of ``product``. Does not commit."""
+    _adjust(Product, product.id, rating, 1)
+    _adjust(Store, product.store_id, rating, 1)
+
+
+def remove_review(product, rating):
+    """Uncount a deleted review of ``product``. Does not commit."""
+    _adjust(Product, product.id, -rating, -1)
+    _adjust(Store, product.store_id, -rating, -1)
+
+
+def review_stats(row):
+    """(average rounded to one decimal, review count) for a Product or Store."""
+    if not row.rating_count:
+        return 0, 0
+    return round(float(row.avg_rating), 1), row.rating_count
+
+
+def _expected_stats():
+    by_product = {
+        row.product_id: (int(row.rating_sum or 0), row.rating_count)
+        for row in db.session.query(
+            Review.product_id,
+            func.sum(Review.rating).label('rating_sum'),
+            func.count(Review.id).label('rating_count')
+        ).group_by(Review.product_id)
+    }
+    by_store = {
+        row.store_id: (int(row.rating_sum or 0), row.rating_count)
+        for row in db.session.query(
+            Product.store_id,
+            func.sum(Review.rating).label('rating_sum'),
+            func.count(Review.id).label('rating_count')
+        ).join(Review, Review.product_id == Product.id).group_by(Product.store_id)
+    }
+    return {Product: by_product, Store: by_store}
+
+
+def reconcile_review_stats(fix=True, log=print):
+    """Recompute every product's and store's stats from Review.
+
+    Logs each row whose stored values differ, and rewrites them when ``fix``.
+    Returns {'product': drifted rows, 'store': drifted rows}.
+    """
+    expected = _expected_stats()
+    drift = {}
+    for model, totals in expected.items():
+        drifted = 0
+        rows = db.session.query(model.id, model.rating_sum, model.rating_count, model.avg_rating)
+        for row in rows.all():
+            rating_sum, rating_count = totals.get(row.id, (0, 0))
+            avg_rating = rating_sum / rating_count if rating_count else 0.0
+            if (row.rating_sum, row.rating_count) == (rating_sum, rating_count) \
+                    and abs((row.avg_rating or 0) - avg_rating) < 1e-9:
+                continue
+            drifted += 1
+            log(f'{model.__tablename__} {row.id}: sum {row.rating_sum} -> {rating_sum}, '
+                f'count {row.rating_count} -> {rating_count}')
+            if fix:
+                db.session.query(model).filter(model.id == row.id).update({
+                    model.rating_sum: rating_sum,
+                    model.rating_count: rating_count,
+                    model.avg_rating: avg_rating,
+                    model.updated_at: model.updated_at,
+                }, synchronize_session=False)
+        drift[model.__tablename__] = drifted
+    if fix:
+        db.session.commit()
+    return drift
@@ -1,6 +1,9 @@
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from models import db, ProductAnalytics, Product, User, Store, Review, Comment, Order, OrderItem
+from analytics_ingest import IngestBackpressure, ingestor, validate_event
+from analytics_rollup import analytics_events_subquery
+from time_buckets import as_date, fill_buckets, parse_window_args, time_bucket
 from sqlalchemy import func, desc, extract
 from sqlalchemy.sql import case
 from datetime import datetime, timedelta
@@ -9,6 +12,14 @@ from logger import setup_logger
 analytics_bp = Blueprint('analytics', __name__)
 logger = setup_logger()
 
+# Aggregates over analytics_events_subquery() rows (see analytics_rollup.py)
+def action_count(events, action):
+    return func.coalesce(func.sum(case((events.c.action == action, events.c.event_count), else_=0)), 0)
+
+def avg_view_time(events):
+    return func.sum(case((events.c.action == 'view', events.c.time_spent_sum), else_=0)) / \
+        func.nullif(func.sum(case((events.c.action == 'view', events.c.time_spent_count), else_=0)), 0)
+
 @analytics_bp.route('/product-views', methods=['GET'])
 @jwt_required()
 def get_product_views():
@@ -31,21 +42,19 @@ def get_product_views():
         store_filter = user.store.id
 
     # Query product views
+    events = analytics_events_subquery(start_date, actions=['view'])
     query = db.session.query(
-        ProductAnalytics.product_id,
+        events.c.product_id,
         Product.name,
         Product.store_id,
-        func.count(ProductAnalytics.id).label('views'),
-        func.avg(ProductAnalytics.time_spent).label('avg_time_spent')
-    ).join(Product).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= start_date
-    )
+        func.sum(events.c.event_count).label('views'),
+        avg_view_time(events).label('avg_time_spent')
+    ).join(Product, Product.id == events.c.product_id)
 
     if store_filter:
         query = query.filter(Product.store_id == store_filter)
 
-    query = query.group_by(ProductAnalytics.product_id, Product.name, Product.store_id).order_by(desc('views'))
+    query = query.group_by(events.c.product_id, Product.name, Product.store_id).order_by(desc('views'))
 
     results = query.all()
 
@@ -55,8 +64,8 @@ def get_product_views():
             'product_id': row.product_id,
             'product_name': row.name,
             'store_id': row.store_id,
-            'views': row.views,
-            'avg_time_spent': round(row.avg_time_spent or 0, 2)
+            'views': int(row.views),
+            'avg_time_spent': round(float(row.avg_time_spent or 0), 2)
         })
 
     return jsonify({'analytics': data}), 200
@@ -80,20 +89,18 @@ def get_product_clicks():
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
+    events = analytics_events_subquery(start_date, actions=['click'])
     query = db.session.query(
-        ProductAnalytics.product_id,
+        events.c.product_id,
         Product.name,
         Product.store_id,
-        func.count(ProductAnalytics.id).label('clicks')
-    ).join(Product).filter(
-        ProductAnalytics.action == 'click',
-        ProductAnalytics.timestamp >= start_date
-    )
+        func.sum(events.c.event_count).label('clicks')
+    ).join(Product, Product.id == events.c.product_id)
 
     if store_filter:
         query = query.filter(Product.store_id == store_filter)
 
-    query = query.group_by(ProductAnalytics.product_id, Product.name, Product.store_id).order_by(desc('clicks'))
+    query = query.group_by(events.c.product_id, Product.name, Product.store_id).order_by(desc('clicks'))
 
     results = query.all()
 
@@ -103,7 +110,7 @@ def get_product_clicks():
             'product_id': row.product_id,
             'product_name': row.name,
             'store_id': row.store_id,
-            'clicks': row.clicks
+            'clicks': int(row.clicks)
         })
 
     return jsonify({'analytics': data}), 200
@@ -127,58 +134,36 @@ def get_analytics_overview():
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
-    # Total views
-    views_query = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= start_date
-    )
-    if store_filter:
-        views_query = views_query.join(Product).filter(Product.store_id == store_filter)
-    total_views = views_query.scalar() or 0
-
-    # Total clicks
-    clicks_query = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'click',
-        ProductAnalytics.timestamp >= start_date
-    )
-    if store_filter:
-        clicks_query = clicks_query.join(Product).filter(Product.store_id == store_filter)
-    total_clicks = clicks_query.scalar() or 0
+    events = analytics_events_subquery(start_date, actions=['view', 'click', 'add_to_cart'])
 
-    # Total add to cart
-    cart_query = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'add_to_cart',
-        ProductAnalytics.timestamp >= start_date
-    )
-    if store_filter:
-        cart_query = cart_query.join(Product).filter(Product.store_id == store_filter)
-    total_cart_adds = cart_query.scalar() or 0
-
-    # Average time spent
-    time_query = db.session.query(func.avg(ProductAnalytics.time_spent)).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= start_date,
-        ProductAnalytics.time_spent.isnot(None)
+    # Totals per action in one pass over rollups plus recent raw events
+    totals_query = db.session.query(
+        action_count(events, 'view').label('views'),
+        action_count(events, 'click').label('clicks'),
+        action_count(events, 'add_to_cart').label('cart_adds'),
+        avg_view_time(events).label('avg_time_spent')
     )
     if store_filter:
-        time_query = time_query.join(Product).filter(Product.store_id == store_filter)
-    avg_time_spent = time_query.scalar() or 0
+        totals_query = totals_query.join(Product, Product.id == events.c.product_id)\
+            .filter(Product.store_id == store_filter)
+    totals = totals_query.one()
+    total_views = int(totals.views or 0)
+    total_clicks = int(totals.clicks or 0)
+    total_cart_adds = int(totals.cart_adds or 0)
+    avg_time_spent = float(totals.avg_time_spent or 0)
 
     # Top products by views
     top_products_query = db.session.query(
-        ProductAnalytics.product_id,
+        events.c.product_id,
         Product.name,
-        func.count(ProductAnalytics.id).label('views')
-    ).join(Product).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= start_date
-    )
+        func.sum(events.c.event_count).label('views')
+    ).join(Product, Product.id == events.c.product_id).filter(events.c.action == 'view')
 
     if store_filter:
         top_products_query = top_products_query.filter(Product.store_id == store_filter)
 
     top_products_query = top_products_query.group_by(
-        ProductAnalytics.product_id, Product.name
+        events.c.product_id, Product.name
     ).order_by(desc('views')).limit(5)
 
     top_products = []
@@ -186,7 +171,7 @@ def get_analytics_overview():
         top_products.append({
             'product_id': row.product_id,
             'name': row.name,
-            'views': row.views
+            'views': int(row.views)
         })
 
     return jsonify({
@@ -203,53 +188,83 @@ def get_analytics_overview():
 def log_analytics():
     data = request.get_json() or {}
 
-    product_id = data.get('product_id')
-    action = data.get('action')
-    time_spent = data.get('time_spent')
-    referrer = data.get('referrer')
+    record, error, status = validate_event(
+        data, user_id=get_optional_user_id(), user_agent=request.headers.get('User-Agent')
+    )
+    if error:
+        return jsonify({'message': error}), status
+
+    # Spooled and written by the ingest worker, not on the request path
+    try:
+        ingestor.enqueue([record])
+    except IngestBackpressure:
+        return backpressure_response()
+
+    return jsonify({'message': 'Analytics logged successfully'}), 202
+
+@analytics_bp.route('/log/batch', methods=['POST'])
+def log_analytics_batch():
+    """Accept many events in one request: {"events": [{product_id, action, ...}, ...]}"""
+    data = request.get_json() or {}
+    events = data.get('events')
+    if not isinstance(events, list) or not events:
+        return jsonify({'message': 'events must be a non-empty list'}), 400
+
+    max_events = current_app.config.get('ANALYTICS_BATCH_MAX_EVENTS', 500)
+    if len(events) > max_events:
+        return jsonify({'message': f'At most {max_events} events per batch'}), 413
+
+    user_id = get_optional_user_id()
     user_agent = request.headers.get('User-Agent')
+    records = []
+    errors = []
+    for index, event in enumerate(events):
+        record, error, _ = validate_event(event, user_id=user_id, user_agent=user_agent)
+        if error:
+            errors.append({'index': index, 'message': error})
+        else:
+            records.append(record)
+
+    try:
+        ingestor.enqueue(records)
+    except IngestBackpressure:
+        return backpressure_response()
+
+    return jsonify({
+        'message': 'Analytics batch accepted',
+        'accepted': len(records),
+        'rejected': len(errors),
+        'errors': errors
+    }), 202
+
+@analytics_bp.route('/ingest-stats', methods=['GET'])
+@jwt_required()
+def get_ingest_stats():
+    """Backpressure and throughput metrics for the analytics ingest pipeline"""
+    try:
+        user_id = int(get_jwt_identity())
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid token identity'}), 422
+    user = User.query.get(user_id)
 
-    if not product_id or not action:
-        return jsonify({'message': 'product_id and action are required'}), 400
+    if not user or user.role != 'super_admin':
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    return jsonify(ingestor.metrics()), 200
 
-    # Try to get user_id from JWT if present
-    user_id = None
+def get_optional_user_id():
+    """Return the user id from the JWT if one was sent, else None"""
     try:
-        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
         verify_jwt_in_request(optional=True)
         identity = get_jwt_identity()
-        if identity:
-            try:
-                user_id = int(identity)
-            except Exception:
-                user_id = None
+        return int(identity) if identity else None
     except Exception:
-        pass
-
-    # Validate action
-    valid_actions = ['view', 'click', 'add_to_cart', 'add_to_wishlist']
-    if action not in valid_actions:
-        return jsonify({'message': f'Invalid action. Must be one of: {", ".join(valid_actions)}'}), 400
-
-    # Check if product exists
-    product = Product.query.get(product_id)
-    if not product:
-        return jsonify({'message': 'Product not found'}), 404
-
-    # Create analytics entry
-    analytics_entry = ProductAnalytics(
-        product_id=product_id,
-        user_id=user_id,
-        action=action,
-        time_spent=time_spent,
-        referrer=referrer,
-        user_agent=user_agent
-    )
-
-    db.session.add(analytics_entry)
-    db.session.commit()
+        return None
 
-    return jsonify({'message': 'Analytics logged successfully'}), 201
+def backpressure_response():
+    response = jsonify({'message': 'Analytics ingestion is overloaded, retry later'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @analytics_bp.route('/reviews-overview', methods=['GET'])
 @jwt_required()
@@ -322,30 +337,31 @@ def get_reviews_trends():
     if not user or user.role not in ['manager', 'super_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
 
-    days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    try:
+        start_date, end_date, granularity = parse_window_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
     store_filter = None
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
-    # Reviews over time (daily)
+    # Reviews over time, one row per day/week/month bucket
+    bucket = time_bucket(Review.created_at, granularity)
     reviews_trends_query = db.session.query(
-        func.date(Review.created_at).label('date'),
+        bucket.label('bucket'),
         func.count(Review.id).label('reviews')
-    ).filter(Review.created_at >= start_date)
+    ).filter(Review.created_at >= start_date, Review.created_at <= end_date)
 
     if store_filter:
         reviews_trends_query = reviews_trends_query.join(Product).filter(Product.store_id == store_filter)
 
-    reviews_trends_query = reviews_trends_query.group_by(func.date(Review.created_at)).order_by('date')
+    reviews_trends_query = reviews_trends_query.group_by(bucket)
 
-    reviews_trends = []
-    for row in reviews_trends_query.all():
-        reviews_trends.append({
-            'date': row.date.isoformat(),
-            'reviews': row.reviews
-        })
+    reviews_trends = fill_buckets(
+        ((row.bucket, {'reviews': row.reviews}) for row in reviews_trends_query.all()),
+        start_date, end_date, granularity, {'reviews': 0}
+    )
 
     return jsonify({'reviews_trends': reviews_trends}), 200
 
@@ -402,30 +418,31 @@ def get_comments_trends():
     if not user or user.role not in ['manager', 'super_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
 
-    days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    try:
+        start_date, end_date, granularity = parse_window_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
     store_filter = None
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
-    # Comments over time (daily)
+    # Comments over time, one row per day/week/month bucket
+    bucket = time_bucket(Comment.created_at, granularity)
     comments_trends_query = db.session.query(
-        func.date(Comment.created_at).label('date'),
+        bucket.label('bucket'),
         func.count(Comment.id).label('comments')
-    ).filter(Comment.created_at >= start_date)
+    ).filter(Comment.created_at >= start_date, Comment.created_at <= end_date)
 
     if store_filter:
         comments_trends_query = comments_trends_query.join(Product).filter(Product.store_id == store_filter)
 
-    comments_trends_query = comments_trends_query.group_by(func.date(Comment.created_at)).order_by('date')
+    comments_trends_query = comments_trends_query.group_by(bucket)
 
-    comments_trends = []
-    for row in comments_trends_query.all():
-        comments_trends.append({
-            'date': row.date.isoformat(),
-            'comments': row.comments
-        })
+    comments_trends = fill_buckets(
+        ((row.bucket, {'comments': row.comments}) for row in comments_trends_query.all()),
+        start_date, end_date, granularity, {'comments': 0}
+    )
 
     return jsonify({'comments_trends': comments_trends}), 200
 
@@ -459,16 +476,27 @@ def get_products_analytics():
     elif user.role == 'super_admin' and store_id:
         store_filter = store_id
 
+    # Event totals per product from rollups plus recent raw events; one row
+    # per product so the joins below do not multiply them
+    events = analytics_events_subquery(start_date, actions=['view', 'click', 'add_to_cart'])
+    event_stats = db.session.query(
+        events.c.product_id.label('product_id'),
+        action_count(events, 'view').label('views'),
+        action_count(events, 'click').label('clicks'),
+        action_count(events, 'add_to_cart').label('cart_adds'),
+        avg_view_time(events).label('avg_time_spent')
+    ).group_by(events.c.product_id).subquery()
+
     # Query products with analytics
     query = db.session.query(
         Product.id,
         Product.name,
         Product.store_id,
         Store.name.label('store_name'),
-        func.count(ProductAnalytics.id).label('total_views'),
-        func.sum(case((ProductAnalytics.action == 'click', 1), else_=0)).label('total_clicks'),
-        func.sum(case((ProductAnalytics.action == 'add_to_cart', 1), else_=0)).label('total_cart_adds'),
-        func.avg(case((ProductAnalytics.action == 'view', ProductAnalytics.time_spent), else_=None)).label('avg_time_spent'),
+        func.coalesce(event_stats.c.views, 0).label('total_views'),
+        func.coalesce(event_stats.c.clicks, 0).label('total_clicks'),
+        func.coalesce(event_stats.c.cart_adds, 0).label('total_cart_adds'),
+        event_stats.c.avg_time_spent.label('avg_time_spent'),
         func.count(func.distinct(Review.id)).label('total_reviews'),
         func.avg(Review.rating).label('avg_rating'),
         func.count(func.distinct(Comment.id)).label('total_comments'),
@@ -477,19 +505,21 @@ def get_products_analytics():
         func.sum(OrderItem.quantity).label('total_units_sold'),
         func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity).label('total_costs'),
         (func.sum(Order.total_amount) - func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity)).label('total_profit')
-    ).outerjoin(ProductAnalytics, Product.id == ProductAnalytics.product_id)\
+    ).outerjoin(event_stats, Product.id == event_stats.c.product_id)\
      .outerjoin(Store, Product.store_id == Store.id)\
      .outerjoin(Review, Product.id == Review.product_id)\
      .outerjoin(Comment, Product.id == Comment.product_id)\
      .outerjoin(OrderItem, Product.id == OrderItem.product_id)\
      .outerjoin(Order, OrderItem.order_id == Order.id)\
-     .filter(ProductAnalytics.timestamp >= start_date if ProductAnalytics.timestamp else True)\
      .filter(Order.status == 'delivered')
 
     if store_filter:
         query = query.filter(Product.store_id == store_filter)
 
-    query = query.group_by(Product.id, Product.name, Product.store_id, Store.name).order_by(desc('total_views'))
+    query = query.group_by(
+        Product.id, Product.name, Product.store_id, Store.name,
+        event_stats.c.views, event_stats.c.clicks, event_stats.c.cart_adds, event_stats.c.avg_time_spent
+    ).order_by(desc('total_views'))
 
     # Get total count for pagination
     total_count = query.count()
@@ -506,10 +536,10 @@ def get_products_analytics():
             'product_name': row.name,
             'store_id': row.store_id,
             'store_name': row.store_name,
-            'total_views': row.total_views or 0,
-            'total_clicks': row.total_clicks or 0,
-            'total_cart_adds': row.total_cart_adds or 0,
-            'avg_time_spent': round(row.avg_time_spent or 0, 2),
+            'total_views': int(row.total_views or 0),
+            'total_clicks': int(row.total_clicks or 0),
+            'total_cart_adds': int(row.total_cart_adds or 0),
+            'avg_time_spent': round(float(row.avg_time_spent or 0), 2),
             'total_reviews': row.total_reviews or 0,
             'avg_rating': round(row.avg_rating or 0, 2),
             'total_comments': row.total_comments or 0,
@@ -553,27 +583,39 @@ def get_stores_analytics():
     # Use explicit subqueries to properly filter delivered orders
     delivered_orders_subq = db.session.query(Order.id).filter(Order.status == 'delivered').subquery()
     
+    # Event totals per store from rollups plus recent raw events
+    events = analytics_events_subquery(start_date, actions=['view', 'click', 'add_to_cart'])
+    event_stats = db.session.query(
+        Product.store_id.label('store_id'),
+        action_count(events, 'view').label('views'),
+        action_count(events, 'click').label('clicks'),
+        action_count(events, 'add_to_cart').label('cart_adds'),
+        avg_view_time(events).label('avg_time_spent')
+    ).join(Product, Product.id == events.c.product_id).group_by(Product.store_id).subquery()
+
     query = db.session.query(
         Store.id,
         Store.name,
         func.count(func.distinct(Product.id)).label('total_products'),
-        func.count(ProductAnalytics.id).label('total_views'),
-        func.sum(case((ProductAnalytics.action == 'click', 1), else_=0)).label('total_clicks'),
-        func.sum(case((ProductAnalytics.action == 'add_to_cart', 1), else_=0)).label('total_cart_adds'),
-        func.avg(case((ProductAnalytics.action == 'view', ProductAnalytics.time_spent), else_=None)).label('avg_time_spent'),
+        func.coalesce(event_stats.c.views, 0).label('total_views'),
+        func.coalesce(event_stats.c.clicks, 0).label('total_clicks'),
+        func.coalesce(event_stats.c.cart_adds, 0).label('total_cart_adds'),
+        event_stats.c.avg_time_spent.label('avg_time_spent'),
         func.count(func.distinct(Review.id)).label('total_reviews'),
         func.avg(Review.rating).label('avg_rating'),
         func.count(func.distinct(Comment.id)).label('total_comments')
-    ).outerjoin(Product, Store.id == Product.store_id)\
-     .outerjoin(ProductAnalytics, Product.id == ProductAnalytics.product_id)\
+    ).outerjoin(event_stats, Store.id == event_stats.c.store_id)\
+     .outerjoin(Product, Store.id == Product.store_id)\
      .outerjoin(Review, Product.id == Review.product_id)\
-     .outerjoin(Comment, Product.id == Comment.product_id)\
-     .filter(db.or_(ProductAnalytics.timestamp >= start_date, ProductAnalytics.timestamp == None))
+     .outerjoin(Comment, Product.id == Comment.product_id)
 
     if store_filter:
         query = query.filter(Store.id == store_filter)
 
-    query = query.group_by(Store.id, Store.name).order_by(desc('total_views'))
+    query = query.group_by(
+        Store.id, Store.name,
+        event_stats.c.views, event_stats.c.clicks, event_stats.c.cart_adds, event_stats.c.avg_time_spent
+    ).order_by(desc('total_views'))
 
     results = query.all()
 
@@ -600,10 +642,10 @@ def get_stores_analytics():
             'store_id': row.id,
             'store_name': row.name,
             'total_products': row.total_products or 0,
-            'total_views': row.total_views or 0,
-            'total_clicks': row.total_clicks or 0,
-            'total_cart_adds': row.total_cart_adds or 0,
-            'avg_time_spent': round(row.avg_time_spent or 0, 2),
+            'total_views': int(row.total_views or 0),
+            'total_clicks': int(row.total_clicks or 0),
+            'total_cart_adds': int(row.total_cart_adds or 0),
+            'avg_time_spent': round(float(row.avg_time_spent or 0), 2),
             'total_reviews': row.total_reviews or 0,
             'avg_rating': round(row.avg_rating or 0, 2),
             'total_comments': row.total_comments or 0,
@@ -644,17 +686,18 @@ def get_store_analytics(store_id):
 
     total_products = len(products)
 
-    analytics_q = ProductAnalytics.query.filter(
-        ProductAnalytics.product_id.in_(product_ids) if product_ids else False,
-        ProductAnalytics.timestamp >= start_date
-    ).all()
-
-    total_views = sum(1 for a in analytics_q if a.action == 'view')
-    total_clicks = sum(1 for a in analytics_q if a.action == 'click')
-    total_cart_adds = sum(1 for a in analytics_q if a.action == 'add_to_cart')
+    events = analytics_events_subquery(start_date, actions=['view', 'click', 'add_to_cart'])
+    totals = db.session.query(
+        action_count(events, 'view').label('views'),
+        action_count(events, 'click').label('clicks'),
+        action_count(events, 'add_to_cart').label('cart_adds'),
+        avg_view_time(events).label('avg_time_spent')
+    ).join(Product, Product.id == events.c.product_id).filter(Product.store_id == store_id).one()
 
-    time_spent_values = [a.time_spent for a in analytics_q if a.action == 'view' and a.time_spent]
-    avg_time_spent = sum(time_spent_values) / len(time_spent_values) if time_spent_values else 0
+    total_views = int(totals.views or 0)
+    total_clicks = int(totals.clicks or 0)
+    total_cart_adds = int(totals.cart_adds or 0)
+    avg_time_spent = float(totals.avg_time_spent or 0)
 
     total_reviews = Review.query.filter(Review.product_id.in_(product_ids)).count() if product_ids else 0
     avg_rating = db.session.query(func.avg(Review.rating)).filter(Review.product_id.in_(product_ids)).scalar() if product_ids else 0
@@ -717,21 +760,28 @@ def get_products_by_store():
 
     products = Product.query.filter_by(store_id=store_id).all()
 
+    # Event totals for every product of the store in one query
+    events = analytics_events_subquery(start_date, actions=['view', 'click', 'add_to_cart'])
+    event_rows = db.session.query(
+        events.c.product_id,
+        action_count(events, 'view').label('views'),
+        action_count(events, 'click').label('clicks'),
+        action_count(events, 'add_to_cart').label('cart_adds'),
+        avg_view_time(events).label('avg_time_spent')
+    ).join(Product, Product.id == events.c.product_id)\
+     .filter(Product.store_id == store_id)\
+     .group_by(events.c.product_id).all()
+    event_stats = {row.product_id: row for row in event_rows}
+
     data = []
     for product in products:
         product_id = product.id
 
-        analytics_q = ProductAnalytics.query.filter(
-            ProductAnalytics.product_id == product_id,
-            ProductAnalytics.timestamp >= start_date
-        ).all()
-
-        total_views = sum(1 for a in analytics_q if a.action == 'view')
-        total_clicks = sum(1 for a in analytics_q if a.action == 'click')
-        total_cart_adds = sum(1 for a in analytics_q if a.action == 'add_to_cart')
-
-        time_spent_vals = [a.time_spent for a in analytics_q if a.action == 'view' and a.time_spent]
-        avg_time_spent = sum(time_spent_vals) / len(time_spent_vals) if time_spent_vals else 0
+        stats = event_stats.get(product_id)
+        total_views = int(stats.views or 0) if stats else 0
+        total_clicks = int(stats.clicks or 0) if stats else 0
+        total_cart_adds = int(stats.cart_adds or 0) if stats else 0
+        avg_time_spent = float(stats.avg_time_spent or 0) if stats else 0
 
         total_reviews = Review.query.filter_by(product_id=product_id).count()
         avg_rating = db.session.query(func.avg(Review.rating)).filter_by(product_id=product_id).scalar() or 0
@@ -1005,8 +1055,10 @@ def get_financial_trends():
     if not user or user.role not in ['manager', 'super_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
 
-    days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    try:
+        start_date, end_date, granularity = parse_window_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
     # Support store_id parameter for both super_admin and managers
     store_id = request.args.get('store_id', type=int)
@@ -1019,56 +1071,110 @@ def get_financial_trends():
         # Super admins can filter by specific store
         store_filter = store_id
 
-    # Query daily financial data
+    # Query financial data per day/week/month bucket
+    bucket = time_bucket(Order.created_at, granularity)
     query = db.session.query(
-        func.date(Order.created_at).label('date'),
-        func.sum(Order.total_amount).label('daily_sales'),
-        func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity).label('daily_costs'),
-        (func.sum(Order.total_amount) - func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity)).label('daily_profit')
+        bucket.label('bucket'),
+        func.sum(Order.total_amount).label('sales'),
+        func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity).label('costs'),
+        (func.sum(Order.total_amount) - func.sum(func.coalesce(Product.cost_price, Product.price) * OrderItem.quantity)).label('profit')
     ).join(OrderItem, Order.id == OrderItem.order_id)\
      .join(Product, OrderItem.product_id == Product.id)\
      .filter(Order.status == 'delivered')\
-     .filter(Order.created_at >= start_date)
+     .filter(Order.created_at >= start_date, Order.created_at <= end_date)
 
     if store_filter:
         query = query.filter(Order.store_id == store_filter)
 
-    query = query.group_by(func.date(Order.created_at)).order_by('date')
-
-    results = query.all()
+    query = query.group_by(bucket)
 
-    # Fill in missing dates with zero values
-    data = []
-    current_date = start_date.date()
-    end_date = datetime.utcnow().date()
-
-    # Create a dict of existing data
-    existing_data = {row.date: row for row in results}
-
-    while current_date <= end_date:
-        if current_date in existing_data:
-            row = existing_data[current_date]
-            data.append({
-                'date': current_date.isoformat(),
-                'sales': round(float(row.daily_sales or 0), 2),
-                'costs': round(float(row.daily_costs or 0), 2),
-                'profit': round(float(row.daily_profit or 0), 2)
+    # Fill in missing buckets with zero values
+    data = fill_buckets(
+        (
+            (row.bucket, {
+                'sales': round(float(row.sales or 0), 2),
+                'costs': round(float(row.costs or 0), 2),
+                'profit': round(float(row.profit or 0), 2)
             })
-        else:
-            data.append({
-                'date': current_date.isoformat(),
-                'sales': 0.0,
-                'costs': 0.0,
-                'profit': 0.0
-            })
-        current_date += timedelta(days=1)
+            for row in query.all()
+        ),
+        start_date, end_date, granularity, {'sales': 0.0, 'costs': 0.0, 'profit': 0.0}
+    )
 
     return jsonify({'financial_trends': data}), 200
 
+def event_summary(action, key, store_filter=None, window=None):
+    """Total, today, this week, this month and the last 30 days for one action.
+
+    Reads rollups plus recent raw events: one query for the all-time total and
+    one bucketed by day for the recent window. ``window`` is an optional
+    ``(start, end, granularity)`` for an extra bucketed ``series``.
+    """
+    now = datetime.utcnow()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today_start - timedelta(days=today_start.weekday())
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    daily_start = today_start - timedelta(days=29)
+
+    def bucketed(start, end, granularity):
+        events = analytics_events_subquery(start, actions=[action])
+        bucket = time_bucket(events.c.day, granularity)
+        query = db.session.query(
+            bucket.label('bucket'),
+            func.sum(events.c.event_count).label('events')
+        ).filter(events.c.day <= end.date())
+        if store_filter:
+            query = query.join(Product, Product.id == events.c.product_id)\
+                .filter(Product.store_id == store_filter)
+        return {as_date(row.bucket): int(row.events) for row in query.group_by(bucket).all()}
+
+    all_events = analytics_events_subquery(actions=[action])
+    total_query = db.session.query(func.sum(all_events.c.event_count))
+    if store_filter:
+        total_query = total_query.join(Product, Product.id == all_events.c.product_id)\
+            .filter(Product.store_id == store_filter)
+    total = total_query.scalar() or 0
+
+    counts = bucketed(min(daily_start, month_start), now, 'day')
+
+    def since(start):
+        return sum(n for day, n in counts.items() if day >= start.date())
+
+    summary = {
+        'total': int(total),
+        'today': since(today_start),
+        'this_week': since(week_start),
+        'this_month': since(month_start),
+        'daily': fill_buckets(
+            ((day, {key: n}) for day, n in counts.items()),
+            daily_start, today_start, 'day', {key: 0}
+        )
+    }
+
+    if window:
+        start, end, granularity = window
+        series = bucketed(start, end, granularity)
+        summary['series'] = fill_buckets(
+            ((bucket, {key: n}) for bucket, n in series.items()),
+            start, end, granularity, {key: 0}
+        )
+
+    return summary
+
+def summary_window_args():
+    """Optional bucketed series window for the summary endpoints, or None"""
+    if not any(arg in request.args for arg in ('granularity', 'days', 'start_date', 'end_date')):
+        return None
+    return parse_window_args()
+
 @analytics_bp.route('/views-summary', methods=['GET'])
 @jwt_required()
 def get_views_summary():
-    """Get views summary by day, week, month with totals"""
+    """Get views summary by day, week, month with totals
+
+    Pass ?granularity=day|week|month with ?days= or ?start_date=/?end_date=
+    to also get a bucketed ``series``.
+    """
     try:
         user_id = int(get_jwt_identity())
     except (TypeError, ValueError):
@@ -1078,82 +1184,26 @@ def get_views_summary():
     if not user or user.role not in ['manager', 'super_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
 
-    # Get date ranges
-    now = datetime.utcnow()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
     # Store filter
     store_filter = None
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
-    # Total views query
-    total_views_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'view'
-    )
-    if store_filter:
-        total_views_q = total_views_q.join(Product).filter(Product.store_id == store_filter)
-    total_views = total_views_q.scalar() or 0
-
-    # Views today
-    views_today_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= today_start
-    )
-    if store_filter:
-        views_today_q = views_today_q.join(Product).filter(Product.store_id == store_filter)
-    views_today = views_today_q.scalar() or 0
-
-    # Views this week
-    views_week_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= week_start
-    )
-    if store_filter:
-        views_week_q = views_week_q.join(Product).filter(Product.store_id == store_filter)
-    views_week = views_week_q.scalar() or 0
-
-    # Views this month
-    views_month_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'view',
-        ProductAnalytics.timestamp >= month_start
-    )
-    if store_filter:
-        views_month_q = views_month_q.join(Product).filter(Product.store_id == store_filter)
-    views_month = views_month_q.scalar() or 0
-
-    # Get daily views for last 30 days
-    daily_data = []
-    for i in range(30):
-        day = today_start - timedelta(days=29-i)
-        day_end = day + timedelta(days=1)
-        day_views_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-            ProductAnalytics.action == 'view',
-            ProductAnalytics.timestamp >= day,
-            ProductAnalytics.timestamp < day_end
-        )
-        if store_filter:
-            day_views_q = day_views_q.join(Product).filter(Product.store_id == store_filter)
-        day_views = day_views_q.scalar() or 0
-        daily_data.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'views': day_views
-        })
+    try:
+        window = summary_window_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    return jsonify({
-        'total': total_views,
-        'today': views_today,
-        'this_week': views_week,
-        'this_month': views_month,
-        'daily': daily_data
-    }), 200
+    return jsonify(event_summary('view', 'views', store_filter, window)), 200
 
 @analytics_bp.route('/clicks-summary', methods=['GET'])
 @jwt_required()
 def get_clicks_summary():
-    """Get clicks summary by day, week, month with totals"""
+    """Get clicks summary by day, week, month with totals
+
+    Pass ?granularity=day|week|month with ?days= or ?start_date=/?end_date=
+    to also get a bucketed ``series``.
+    """
     try:
         user_id = int(get_jwt_identity())
     except (TypeError, ValueError):
@@ -1163,77 +1213,17 @@ def get_clicks_summary():
     if not user or user.role not in ['manager', 'super_admin']:
         return jsonify({'message': 'Unauthorized'}), 403
 
-    # Get date ranges
-    now = datetime.utcnow()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
     # Store filter
     store_filter = None
     if user.role == 'manager' and user.store:
         store_filter = user.store.id
 
-    # Total clicks query
-    total_clicks_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'click'
-    )
-    if store_filter:
-        total_clicks_q = total_clicks_q.join(Product).filter(Product.store_id == store_filter)
-    total_clicks = total_clicks_q.scalar() or 0
-
-    # Clicks today
-    clicks_today_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'click',
-        ProductAnalytics.timestamp >= today_start
-    )
-    if store_filter:
-        clicks_today_q = clicks_today_q.join(Product).filter(Product.store_id == store_filter)
-    clicks_today = clicks_today_q.scalar() or 0
-
-    # Clicks this week
-    clicks_week_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'click',
-        ProductAnalytics.timestamp >= week_start
-    )
-    if store_filter:
-        clicks_week_q = clicks_week_q.join(Product).filter(Product.store_id == store_filter)
-    clicks_week = clicks_week_q.scalar() or 0
-
-    # Clicks this month
-    clicks_month_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-        ProductAnalytics.action == 'click',
-        ProductAnalytics.timestamp >= month_start
-    )
-    if store_filter:
-        clicks_month_q = clicks_month_q.join(Product).filter(Product.store_id == store_filter)
-    clicks_month = clicks_month_q.scalar() or 0
-
-    # Get daily clicks for last 30 days
-    daily_data = []
-    for i in range(30):
-        day = today_start - timedelta(days=29-i)
-        day_end = day + timedelta(days=1)
-        day_clicks_q = db.session.query(func.count(ProductAnalytics.id)).filter(
-            ProductAnalytics.action == 'click',
-            ProductAnalytics.timestamp >= day,
-            ProductAnalytics.timestamp < day_end
-        )
-        if store_filter:
-            day_clicks_q = day_clicks_q.join(Product).filter(Product.store_id == store_filter)
-        day_clicks = day_clicks_q.scalar() or 0
-        daily_data.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'clicks': day_clicks
-        })
+    try:
+        window = summary_window_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    return jsonify({
-        'total': total_clicks,
-        'today': clicks_today,
-        'this_week': clicks_week,
-        'this_month': clicks_month,
-        'daily': daily_data
-    }), 200
+    return jsonify(event_summary('click', 'clicks', store_filter, window)), 200
 
 @analytics_bp.route('/financial-summary', methods=['GET'])
 @jwt_required()
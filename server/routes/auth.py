@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, current_user
 from models import db, User
+from authz import token_claims
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -40,9 +41,12 @@ def login():
     if not user or not check_password_hash(user.password_hash, password):
         return jsonify({'message': 'Invalid credentials'}), 401
 
-    # Ensure the JWT "sub"/identity is a string to satisfy PyJWT validation
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    # Ensure the JWT "sub"/identity is a string to satisfy PyJWT validation.
+    # Role, store and permissions version ride along so routes can authorize
+    # from the token alone.
+    claims = token_claims(user)
+    access_token = create_access_token(identity=str(user.id), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user.id), additional_claims=claims)
 
     # Prepare user payload; include store details for managers so the frontend
     # can filter products by store_name/store_address without an extra request.
@@ -76,6 +80,7 @@ def login():
 def refresh():
     # Issue a new access token using a valid refresh token
     identity = get_jwt_identity()
-    # identity stored as string; return access token with same identity
-    new_access = create_access_token(identity=identity)
+    # identity stored as string; return access token with same identity and
+    # the user's current claims (a store may have been created since login)
+    new_access = create_access_token(identity=identity, additional_claims=token_claims(current_user))
     return jsonify({'access_token': new_access}), 200
@@ -31,6 +31,7 @@ def get_cart():
             'name': item.product.name,
             'price': item.product.price,
             'image_url': item.product.image_url,
+            'image_variants': item.product.image_variants,
             'store': {
                 'id': item.product.store.id,
                 'name': item.product.store.name
@@ -1,22 +1,17 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, CommissionRate, User, Notification
+from authz import require_role
+from models import db, CommissionRate, Notification
+from commission_engine import CommissionTiers, invalidate_commission_tiers
 from datetime import datetime
 import json
 
 commission_rates_bp = Blueprint('commission_rates', __name__, url_prefix='/api/commission-rates')
 
 @commission_rates_bp.route('', methods=['GET'])
-@jwt_required()
+@require_role('super_admin')
 def get_commission_rates():
     """Get all commission rates"""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         rates = CommissionRate.query.order_by(CommissionRate.min_price.asc()).all()
         
         rates_data = [{
@@ -36,16 +31,10 @@ def get_commission_rates():
         return jsonify({'message': f'Error fetching commission rates: {str(e)}'}), 500
 
 @commission_rates_bp.route('', methods=['POST'])
-@jwt_required()
+@require_role('super_admin')
 def create_commission_rate():
     """Create a new commission rate"""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         data = request.get_json()
         
         if not data.get('name') or data.get('commission_percentage') is None:
@@ -80,6 +69,7 @@ def create_commission_rate():
         )
         
         db.session.add(new_rate)
+        invalidate_commission_tiers()
         db.session.commit()
         
         # Send notifications to all managers about the new commission rate
@@ -106,16 +96,10 @@ def create_commission_rate():
         return jsonify({'message': f'Error creating commission rate: {str(e)}'}), 500
 
 @commission_rates_bp.route('/<int:rate_id>', methods=['PUT'])
-@jwt_required()
+@require_role('super_admin')
 def update_commission_rate(rate_id):
     """Update a commission rate"""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         rate = CommissionRate.query.get(rate_id)
         if not rate:
             return jsonify({'message': 'Commission rate not found'}), 404
@@ -158,6 +142,7 @@ def update_commission_rate(rate_id):
                     return jsonify({'message': f'Price range overlaps with existing rate: {existing_rate.name}'}), 400
         
         rate.updated_at = datetime.utcnow()
+        invalidate_commission_tiers()
         db.session.commit()
         
         # Send notifications if commission percentage changed
@@ -186,16 +171,10 @@ def update_commission_rate(rate_id):
         return jsonify({'message': f'Error updating commission rate: {str(e)}'}), 500
 
 @commission_rates_bp.route('/<int:rate_id>', methods=['DELETE'])
-@jwt_required()
+@require_role('super_admin')
 def delete_commission_rate(rate_id):
     """Delete a commission rate"""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         rate = CommissionRate.query.get(rate_id)
         if not rate:
             return jsonify({'message': 'Commission rate not found'}), 404
@@ -203,6 +182,7 @@ def delete_commission_rate(rate_id):
         # Instead of deleting, deactivate the rate
         rate.is_active = False
         rate.updated_at = datetime.utcnow()
+        invalidate_commission_tiers()
         
         # Send notification about deactivation
         send_commission_change_notification(
@@ -220,16 +200,10 @@ def delete_commission_rate(rate_id):
         return jsonify({'message': f'Error deactivating commission rate: {str(e)}'}), 500
 
 @commission_rates_bp.route('/calculate', methods=['POST'])
-@jwt_required()
+@require_role('manager', 'super_admin')
 def calculate_commission():
     """Calculate commission for a product price"""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
-        
-        if not user or user.role not in ['manager', 'super_admin']:
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         data = request.get_json()
         product_price = data.get('product_price')
         
@@ -237,11 +211,7 @@ def calculate_commission():
             return jsonify({'message': 'Valid product price is required'}), 400
         
         # Find applicable commission rate
-        applicable_rate = CommissionRate.query.filter(
-            CommissionRate.is_active == True,
-            CommissionRate.min_price <= product_price,
-            db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= product_price)
-        ).first()
+        applicable_rate = CommissionTiers.current().rate_for(product_price)
         
         if not applicable_rate:
             return jsonify({
@@ -1,22 +1,17 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Commission, Product, Store, User, CommissionRate
+from authz import require_role
+from models import db, Commission, Product, Store, CommissionRate
+from commission_engine import CommissionEngine
 import logging
 
 commissions_bp = Blueprint('commissions', __name__, url_prefix='/api/commissions')
 logger = logging.getLogger(__name__)
 
 @commissions_bp.route('', methods=['GET'])
-@jwt_required()
+@require_role('super_admin')
 def get_commissions():
     """Get all commissions with product and store details (paginated)"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-
         # Get pagination parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
@@ -34,14 +29,13 @@ def get_commissions():
             error_out=False
         )
 
+        # Commission rows and tiers for the whole page in two queries
+        engine = CommissionEngine.load(product_ids=[p.id for p in products.items])
+
         commissions_data = []
         for product in products.items:
-            commission = Commission.query.filter_by(product_id=product.id).first()
-            applicable_rate = CommissionRate.query.filter(
-                CommissionRate.is_active == True,
-                CommissionRate.min_price <= product.price,
-                db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= product.price)
-            ).first()
+            commission = engine.overrides.get(product.id)
+            applicable_rate = engine.tiers.rate_for(product.price)
             product_data = {
                 'product_id': product.id,
                 'product_name': product.name,
@@ -76,16 +70,10 @@ def get_commissions():
         return jsonify({'message': f'Error fetching commissions: {str(e)}'}), 500
 
 @commissions_bp.route('', methods=['POST'])
-@jwt_required()
+@require_role('super_admin')
 def create_or_update_commission():
     """Create or update commission for a product"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-
         data = request.get_json()
 
         if not data.get('product_id'):
@@ -190,16 +178,10 @@ def create_or_update_commission():
         return jsonify({'message': f'Error creating/updating commission: {str(e)}'}), 500
 
 @commissions_bp.route('/<int:commission_id>', methods=['PUT'])
-@jwt_required()
+@require_role('super_admin')
 def update_commission(commission_id):
     """Update a specific commission"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-
         commission = Commission.query.get(commission_id)
         if not commission:
             return jsonify({'message': 'Commission not found'}), 404
@@ -246,16 +228,10 @@ def update_commission(commission_id):
         return jsonify({'message': f'Error updating commission: {str(e)}'}), 500
 
 @commissions_bp.route('/<int:commission_id>', methods=['DELETE'])
-@jwt_required()
+@require_role('super_admin')
 def delete_commission(commission_id):
     """Delete a commission"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
-
-        if not user or user.role != 'super_admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-
         commission = Commission.query.get(commission_id)
         if not commission:
             return jsonify({'message': 'Commission not found'}), 404
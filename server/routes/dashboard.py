@@ -2,8 +2,18 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from models import db, User, Order, Product, PageView, ButtonClick, Review, Comment, Store, OrderItem, Address, PaymentMethod, Cart, CartItem, WishlistItem, Commission, CommissionRate
+from models import db, User, Order, Product, PageView, ButtonClick, Review, Comment, Store, OrderItem, Address, PaymentMethod, Cart, CartItem, Wishlist, WishlistItem, Commission, CommissionRate, CommissionLedger
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from commission_engine import CommissionEngine
+from commission_ledger import ledger_totals_by_product
+from time_buckets import fill_buckets
+from user_cache import invalidate_user, load_user
+from authz import revoke_user_tokens
+from response_cache import invalidate_catalog
+from review_stats import remove_review
+from recommendations import recommended_for_user
+from image_variants import image_pipeline
 import os
 from datetime import datetime, timedelta
 
@@ -17,11 +27,16 @@ def customer_dashboard():
         user_id = int(get_jwt_identity())
     except (TypeError, ValueError):
         return jsonify({'message': 'Invalid token identity'}), 422
-    user = User.query.get(user_id)
+    # Served from the user cache when warm
+    user = load_user(user_id)
 
     if not user or user.role != 'customer':
         return jsonify({'message': 'Unauthorized'}), 403
 
+    # The page is built from a fixed number of queries: recent orders, order
+    # totals, cart items and wishlist items (each with its products eagerly
+    # loaded), and the recommendation feed. Nothing below lazy-loads per item.
+
     # Get user's orders
     orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).limit(5).all()
     orders_data = [{
@@ -31,54 +46,56 @@ def customer_dashboard():
         'created_at': order.created_at.isoformat()
     } for order in orders]
 
-    # Get user's cart items
-    cart = user.carts[0] if user.carts else None
+    # Get user's cart items (from their first cart)
+    first_cart_id = db.session.query(func.min(Cart.id)).filter(Cart.user_id == user_id).scalar_subquery()
+    cart_rows = CartItem.query.options(joinedload(CartItem.product)).filter(
+        CartItem.cart_id == first_cart_id
+    ).order_by(CartItem.id).all()
     cart_items = []
     cart_total_value = 0.0
-    if cart:
-        for item in cart.items:
-            item_total = item.quantity * item.product.price
-            cart_total_value += item_total
-            cart_items.append({
-                'product_id': item.product_id,
-                'product_name': item.product.name,
-                'quantity': item.quantity,
-                'price': item.product.price,
-                'total': item_total,
-                'image_url': item.product.image_url
-            })
-
-    # Get user's wishlist items
-    wishlist = user.wishlists[0] if user.wishlists else None
-    wishlist_items = []
-    if wishlist:
-        for item in wishlist.items:
-            wishlist_items.append({
-                'product_id': item.product_id,
-                'product_name': item.product.name,
-                'price': item.product.price,
-                'image_url': item.product.image_url,
-                'store_name': item.product.store.name if item.product.store else 'Unknown'
-            })
+    for item in cart_rows:
+        item_total = item.quantity * item.product.price
+        cart_total_value += item_total
+        cart_items.append({
+            'product_id': item.product_id,
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'price': item.product.price,
+            'total': item_total,
+            'image_url': item.product.image_url,
+            'image_variants': item.product.image_variants
+        })
 
-    # Calculate total spent
-    total_spent_result = db.session.query(func.sum(Order.total_amount)).filter(Order.user_id == user_id).scalar()
+    # Get user's wishlist items (from their first wishlist)
+    first_wishlist_id = db.session.query(func.min(Wishlist.id)).filter(Wishlist.user_id == user_id).scalar_subquery()
+    wishlist_rows = WishlistItem.query.options(
+        joinedload(WishlistItem.product).joinedload(Product.store)
+    ).filter(
+        WishlistItem.wishlist_id == first_wishlist_id
+    ).order_by(WishlistItem.id).all()
+    wishlist_items = [{
+        'product_id': item.product_id,
+        'product_name': item.product.name,
+        'price': item.product.price,
+        'image_url': item.product.image_url,
+        'image_variants': item.product.image_variants,
+        'store_name': item.product.store.name if item.product.store else 'Unknown'
+    } for item in wishlist_rows]
+
+    # Order summary and total spent in one aggregate
+    total_orders, total_spent_result = db.session.query(
+        func.count(Order.id), func.sum(Order.total_amount)
+    ).filter(Order.user_id == user_id).one()
     total_spent = float(total_spent_result) if total_spent_result else 0.0
 
-    # Order summary
-    total_orders = Order.query.filter_by(user_id=user_id).count()
-
-    # Get ordered product IDs to exclude from recommendations
-    ordered_product_ids = db.session.query(OrderItem.product_id).join(Order, OrderItem.order_id == Order.id).filter(Order.user_id == user_id).distinct().all()
-    ordered_product_ids = [p.product_id for p in ordered_product_ids]
-
-    # Recommended products: random 4 products not ordered by user
-    recommended_products = Product.query.filter(~Product.id.in_(ordered_product_ids)).order_by(func.random()).limit(4).all() if ordered_product_ids else Product.query.order_by(func.random()).limit(4).all()
+    # Recommended products: the customer's precomputed feed, or a random sample for new customers
+    recommended_products = recommended_for_user(user_id, limit=4)
     recommended_data = [{
         'id': p.id,
         'name': p.name,
         'price': p.price,
         'image_url': p.image_url,
+        'image_variants': p.image_variants,
         'store_name': p.store.name if p.store else 'Unknown'
     } for p in recommended_products]
 
@@ -89,6 +106,7 @@ def customer_dashboard():
             'email': user.email,
             'role': user.role,
             'profile_picture': user.profile_picture,
+            'profile_picture_variants': user.profile_picture_variants,
             'created_at': user.created_at.isoformat()
         },
         'orders': orders_data,
@@ -124,43 +142,11 @@ def admin_dashboard():
 
     # Commission analytics for super_admin
     if user.role == 'super_admin':
-        # Calculate total commission using product commissions
-        total_commission_earned = 0.0
-        
-        # Get all delivered orders with their items
-        orders_with_items = db.session.query(
-            OrderItem.product_id,
-            OrderItem.quantity,
-            OrderItem.price
-        ).join(Order, OrderItem.order_id == Order.id)\
-         .filter(Order.status == 'delivered').all()
-        
-        # Calculate commission for each order item using overrides or tier defaults
-        for item in orders_with_items:
-            commission = Commission.query.filter_by(product_id=item.product_id).first()
-
-            if commission and commission.is_manual:
-                if commission.commission_amount is not None:
-                    commission_earned = commission.commission_amount * item.quantity
-                    total_commission_earned += commission_earned
-                    continue
-                if commission.commission_percentage is not None:
-                    item_total = item.price * item.quantity
-                    commission_earned = (item_total * commission.commission_percentage) / 100
-                    total_commission_earned += commission_earned
-                    continue
-
-            # Fall back to tier rate for non-manual or missing overrides
-            applicable_rate = CommissionRate.query.filter(
-                CommissionRate.is_active == True,
-                CommissionRate.min_price <= item.price,
-                db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= item.price)
-            ).first()
-
-            if applicable_rate:
-                item_total = item.price * item.quantity
-                commission_earned = (item_total * applicable_rate.commission_percentage) / 100
-                total_commission_earned += commission_earned
+        # Commission recorded at delivery time (see commission_ledger.py)
+        total_commission_earned = db.session.query(
+            func.sum(CommissionLedger.commission_earned)
+        ).scalar()
+        total_commission_earned = float(total_commission_earned) if total_commission_earned else 0.0
 
     # Total products (global for super_admin, store-specific for manager)
     if user.role == 'super_admin':
@@ -346,6 +332,7 @@ def get_commission_analytics():
 
     # Get commission data using tiered commission rates
     commission_data = db.session.query(
+        Product.id.label('product_id'),
         Store.name.label('store_name'),
         Product.name.label('product_name'),
         Product.price.label('product_price'),
@@ -357,33 +344,37 @@ def get_commission_analytics():
      .outerjoin(OrderItem, Product.id == OrderItem.product_id)\
      .outerjoin(Order, OrderItem.order_id == Order.id)\
      .filter(Order.status == 'delivered')\
-     .group_by(Store.name, Product.name, Product.price)\
+     .group_by(Product.id, Store.name, Product.name, Product.price)\
      .all()
 
-    # Calculate commission earnings using tiered rates
+    # Earned commission comes from the ledger; the engine only describes the
+    # rule that currently applies to each product
+    product_ids = [row.product_id for row in commission_data]
+    commission_by_product = ledger_totals_by_product(product_ids)
+    engine = CommissionEngine.load(product_ids=product_ids)
+
     commission_summary = []
     total_commission_earned = 0.0
-    
+
     for row in commission_data:
-        # Find applicable commission rate for this product
-        applicable_rate = CommissionRate.query.filter(
-            CommissionRate.is_active == True,
-            CommissionRate.min_price <= row.product_price,
-            db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= row.product_price)
-        ).first()
-        
-        if applicable_rate and row.total_revenue:
-            commission_earned = (row.total_revenue * applicable_rate.commission_percentage) / 100
-            total_commission_earned += commission_earned
+        override = engine.manual_override(row.product_id)
+        applicable_rate = engine.tiers.rate_for(row.product_price)
+        commission_earned = commission_by_product.get(row.product_id, 0.0)
+        total_commission_earned += commission_earned
+
+        if override is not None:
+            commission_rate = override.commission_percentage if override.commission_amount is None else 0
+            commission_type = 'manual_override'
         else:
-            commission_earned = 0.0
-            
+            commission_rate = applicable_rate.commission_percentage if applicable_rate else 0
+            commission_type = 'tiered_rate'
+
         commission_summary.append({
             'store_name': row.store_name,
             'product_name': row.product_name,
             'product_price': float(row.product_price or 0),
-            'commission_rate': applicable_rate.commission_percentage if applicable_rate else 0,
-            'commission_type': 'tiered_rate',
+            'commission_rate': commission_rate,
+            'commission_type': commission_type,
             'total_revenue': float(row.total_revenue or 0),
             'total_units_sold': int(row.total_units_sold or 0),
             'total_orders': int(row.total_orders or 0),
@@ -436,59 +427,21 @@ def get_commission_trends():
     days = request.args.get('days', 30, type=int)
     start_date = datetime.utcnow() - timedelta(days=days)
 
-    # Get daily commission trends using tiered rates
-    daily_commission_query = db.session.query(
-        func.date(Order.created_at).label('date'),
-        OrderItem.product_id,
-        OrderItem.quantity,
-        OrderItem.price,
-        Product.price.label('product_price')
-    ).select_from(Order)\
-     .join(OrderItem, Order.id == OrderItem.order_id)\
-     .join(Product, OrderItem.product_id == Product.id)\
-     .filter(Order.status == 'delivered')\
-     .filter(Order.created_at >= start_date)\
-     .order_by('date')
-
-    results = daily_commission_query.all()
+    # Ledger commission per order day
+    day = func.date(CommissionLedger.order_created_at)
+    daily_rows = db.session.query(
+        day.label('date'),
+        func.sum(CommissionLedger.commission_earned).label('earned')
+    ).filter(CommissionLedger.order_created_at >= start_date)\
+     .group_by(day).all()
 
-    # Process and aggregate the data using tiered commission rates
-    date_commission_map = {}
-    
-    for row in results:
-        date = row.date
-        
-        # Find applicable commission rate for this product
-        applicable_rate = CommissionRate.query.filter(
-            CommissionRate.is_active == True,
-            CommissionRate.min_price <= row.product_price,
-            db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= row.product_price)
-        ).first()
-        
-        if applicable_rate:
-            # Calculate commission based on the order item total
-            item_total = row.price * row.quantity
-            commission = (item_total * applicable_rate.commission_percentage) / 100
-        else:
-            commission = 0.0
-            
-        if date in date_commission_map:
-            date_commission_map[date] += commission
-        else:
-            date_commission_map[date] = commission
+    date_commission_map = {row.date: float(row.earned or 0) for row in daily_rows}
 
     # Fill in missing dates with zero values and format data
-    commission_trends = []
-    current_date = start_date.date()
-    end_date = datetime.utcnow().date()
-
-    while current_date <= end_date:
-        commission = date_commission_map.get(current_date, 0.0)
-        commission_trends.append({
-            'date': current_date.isoformat(),
-            'commission_earned': round(commission, 2)
-        })
-        current_date += timedelta(days=1)
+    commission_trends = fill_buckets(
+        ((date, {'commission_earned': round(commission, 2)}) for date, commission in date_commission_map.items()),
+        start_date, datetime.utcnow(), 'day', {'commission_earned': 0.0}
+    )
 
     return jsonify({
         'commission_trends': commission_trends
@@ -647,12 +600,18 @@ def update_user(user_id):
 
     if password:
         user.password_hash = generate_password_hash(password)
+        revoke_user_tokens(user)
 
-    if profile_picture is not None:
+    picture_changed = profile_picture is not None and profile_picture != user.profile_picture
+    if picture_changed:
         user.profile_picture = profile_picture
+        user.profile_picture_variants = None
 
     db.session.commit()
-    return jsonify({'message': 'User updated successfully', 'user': {'id': user.id, 'email': user.email, 'name': user.name, 'role': user.role, 'profile_picture': user.profile_picture}}), 200
+    invalidate_user(user.id)
+    if picture_changed:
+        image_pipeline.submit('user', user.id, user.profile_picture)
+    return jsonify({'message': 'User updated successfully', 'user': {'id': user.id, 'email': user.email, 'name': user.name, 'role': user.role, 'profile_picture': user.profile_picture, 'profile_picture_variants': user.profile_picture_variants}}), 200
 
 
 @dashboard_bp.route('/users/<int:user_id>', methods=['DELETE'])
@@ -677,6 +636,7 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     return jsonify({'message': 'User deleted successfully'}), 200
 
 @dashboard_bp.route('/users/<int:user_id>/role', methods=['PUT'])
@@ -705,8 +665,11 @@ def update_user_role(user_id):
     if user.id == current_user_id and new_role != 'super_admin':
         return jsonify({'message': 'Cannot change your own role'}), 400
 
-    user.role = new_role
+    if user.role != new_role:
+        user.role = new_role
+        revoke_user_tokens(user)
     db.session.commit()
+    invalidate_user(user.id)
 
     return jsonify({'message': 'Role updated successfully'}), 200
 
@@ -766,7 +729,10 @@ def create_store():
         manager_id=user_id
     )
     db.session.add(new_store)
+    invalidate_catalog()
     db.session.commit()
+    invalidate_user(user_id)
+    image_pipeline.submit('store', new_store.id, new_store.logo_url)
 
     return jsonify({
         'message': 'Store created successfully',
@@ -775,6 +741,7 @@ def create_store():
             'name': new_store.name,
             'address': new_store.address,
             'logo_url': new_store.logo_url,
+            'logo_variants': new_store.logo_variants,
             'contact_number': new_store.contact_number,
             'description': new_store.description,
         }
@@ -803,6 +770,7 @@ def get_store():
             'name': store.name,
             'address': store.address,
             'logo_url': store.logo_url,
+            'logo_variants': store.logo_variants,
             'contact_number': store.contact_number,
             'description': store.description,
             'created_at': store.created_at.isoformat(),
@@ -836,7 +804,9 @@ def update_store():
             manager_id=user_id
         )
         db.session.add(new_store)
+        invalidate_catalog()
         db.session.commit()
+        invalidate_user(user_id)
         return jsonify({
             'message': 'Store created successfully',
             'store': {
@@ -844,12 +814,14 @@ def update_store():
                 'name': new_store.name,
                 'address': new_store.address,
                 'logo_url': new_store.logo_url,
+                'logo_variants': new_store.logo_variants,
                 'contact_number': new_store.contact_number,
                 'description': new_store.description,
             }
         }), 201
 
     store = user.store
+    previous_logo = store.logo_url
 
     # Handle FormData for file uploads
     if request.content_type and 'multipart/form-data' in request.content_type:
@@ -898,7 +870,14 @@ def update_store():
         if 'description' in data:
             store.description = data['description']
 
+    logo_changed = store.logo_url != previous_logo
+    if logo_changed:
+        store.logo_variants = None
+    invalidate_catalog()
     db.session.commit()
+    invalidate_user(user_id)
+    if logo_changed:
+        image_pipeline.submit('store', store.id, store.logo_url)
 
     return jsonify({'message': 'Store updated successfully'}), 200
 
@@ -961,7 +940,9 @@ def delete_review(review_id):
         if not product or product.store_id != user.store.id:
             return jsonify({'message': 'Unauthorized to delete this review'}), 403
 
+    remove_review(Product.query.get(review.product_id), review.rating)
     db.session.delete(review)
+    invalidate_catalog()
     db.session.commit()
 
     return jsonify({'message': 'Review deleted successfully'}), 200
@@ -995,6 +976,7 @@ def reply_review(review_id):
 
     review.reply = reply_text
     review.replied_at = datetime.utcnow()
+    invalidate_catalog()
     db.session.commit()
 
     return jsonify({'message': 'Reply added successfully', 'review': {
@@ -1032,6 +1014,7 @@ def reply_comment(comment_id):
 
     comment.reply = reply_text
     comment.replied_at = datetime.utcnow()
+    invalidate_catalog()
     db.session.commit()
 
     return jsonify({'message': 'Reply added successfully', 'comment': {
@@ -1082,6 +1065,7 @@ def get_profile():
             'name': user.name,
             'email': user.email,
             'profile_picture': user.profile_picture,
+            'profile_picture_variants': user.profile_picture_variants,
             'role': user.role,
             'created_at': user.created_at.isoformat()
         },
@@ -1100,6 +1084,7 @@ def update_profile():
 
     if not user:
         return jsonify({'message': 'User not found'}), 404
+    previous_picture = user.profile_picture
 
     # Handle FormData for file uploads
     if request.content_type and 'multipart/form-data' in request.content_type:
@@ -1141,7 +1126,13 @@ def update_profile():
                 return jsonify({'message': 'Email already in use'}), 400
             user.email = data['email']
 
+    picture_changed = user.profile_picture != previous_picture
+    if picture_changed:
+        user.profile_picture_variants = None
     db.session.commit()
+    invalidate_user(user_id)
+    if picture_changed:
+        image_pipeline.submit('user', user.id, user.profile_picture)
     return jsonify({
         'message': 'Profile updated successfully',
         'user': {
@@ -1149,6 +1140,7 @@ def update_profile():
             'name': user.name,
             'email': user.email,
             'profile_picture': user.profile_picture,
+            'profile_picture_variants': user.profile_picture_variants,
             'role': user.role,
             'created_at': user.created_at.isoformat()
         }
@@ -0,0 +1,115 @@
+from flask import Blueprint, request, jsonify
+from authz import claimed_role, claimed_store_id, require_role
+from models import db, FlashSale, Product
+from flash_sale import create_flash_sale, flash_sale_worker, flush_flash_sale, invalidate_flash_sales
+from time_buckets import parse_utc_datetime
+from datetime import datetime
+import logging
+
+flash_sales_bp = Blueprint('flash_sales', __name__, url_prefix='/api/flash-sales')
+logger = logging.getLogger(__name__)
+
+
+def serialize_flash_sale(sale):
+    return {
+        'id': sale.id,
+        'product_id': sale.product_id,
+        'starts_at': sale.starts_at.isoformat(),
+        'ends_at': sale.ends_at.isoformat(),
+        'units': sale.units,
+        'allocated': sale.allocated,
+        'sold': sale.flushed_units,
+        'closed_at': sale.closed_at.isoformat() if sale.closed_at else None,
+        'created_at': sale.created_at.isoformat() if sale.created_at else None
+    }
+
+
+def _can_manage(product):
+    return claimed_role() == 'super_admin' or product.store_id == claimed_store_id()
+
+
+@flash_sales_bp.route('', methods=['GET'])
+@require_role('manager', 'super_admin')
+def get_flash_sales():
+    """Open flash sales (all for super admins, the store's own for managers); ?include_closed=true for all"""
+    flash_sale_worker.ensure_started()
+    query = FlashSale.query.join(Product, Product.id == FlashSale.product_id)
+    if claimed_role() != 'super_admin':
+        query = query.filter(Product.store_id == claimed_store_id())
+    if request.args.get('include_closed', 'false').lower() != 'true':
+        query = query.filter(FlashSale.closed_at.is_(None))
+    sales = query.order_by(FlashSale.starts_at.desc()).all()
+    return jsonify({'flash_sales': [serialize_flash_sale(sale) for sale in sales]}), 200
+
+
+@flash_sales_bp.route('', methods=['POST'])
+@require_role('manager', 'super_admin')
+def create_flash_sale_route():
+    """Move units of a product's stock into a flash sale window"""
+    try:
+        data = request.get_json() or {}
+        if not data.get('product_id') or not data.get('units') or not data.get('starts_at') or not data.get('ends_at'):
+            return jsonify({'message': 'product_id, units, starts_at and ends_at are required'}), 400
+
+        product = Product.query.get(data['product_id'])
+        if not product:
+            return jsonify({'message': 'Product not found'}), 404
+        if not _can_manage(product):
+            return jsonify({'message': 'Unauthorized'}), 403
+
+        try:
+            units = int(data['units'])
+            starts_at = parse_utc_datetime(data['starts_at'])
+            ends_at = parse_utc_datetime(data['ends_at'])
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'message': 'Invalid units or dates. Use ISO format for dates.'}), 400
+        if units <= 0:
+            return jsonify({'message': 'units must be positive'}), 400
+        if starts_at >= ends_at:
+            return jsonify({'message': 'starts_at must be before ends_at'}), 400
+        if FlashSale.query.filter(FlashSale.product_id == product.id, FlashSale.closed_at.is_(None)).first():
+            return jsonify({'message': 'Product already has an open flash sale'}), 400
+
+        sale = create_flash_sale(product, units, starts_at, ends_at)
+        if sale is None:
+            db.session.rollback()
+            return jsonify({'message': f'Insufficient stock for product {product.name}. Available: {product.stock_quantity}, Requested: {units}'}), 400
+        db.session.commit()
+        flash_sale_worker.ensure_started()
+
+        return jsonify({'message': 'Flash sale created', 'flash_sale': serialize_flash_sale(sale)}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating flash sale: {str(e)}")
+        return jsonify({'message': f'Error creating flash sale: {str(e)}'}), 500
+
+
+@flash_sales_bp.route('/<int:sale_id>/close', methods=['POST'])
+@require_role('manager', 'super_admin')
+def close_flash_sale(sale_id):
+    """End a flash sale now and return its unsold units to stock"""
+    try:
+        sale = FlashSale.query.get(sale_id)
+        if not sale:
+            return jsonify({'message': 'Flash sale not found'}), 404
+        if not _can_manage(sale.product):
+            return jsonify({'message': 'Unauthorized'}), 403
+        if sale.closed_at is not None:
+            return jsonify({'message': 'Flash sale already closed'}), 400
+
+        now = datetime.utcnow()
+        if sale.ends_at > now:
+            # Stop admitting buyers now; the flush closes the sale after the grace period
+            sale.ends_at = now
+            invalidate_flash_sales()
+            db.session.commit()
+        flush_flash_sale(sale_id)
+        flash_sale_worker.ensure_started()
+
+        return jsonify({'message': 'Flash sale ending', 'flash_sale': serialize_flash_sale(FlashSale.query.get(sale_id))}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error closing flash sale: {str(e)}")
+        return jsonify({'message': f'Error closing flash sale: {str(e)}'}), 500
@@ -2,10 +2,27 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Notification, User, Order, Product
 from datetime import datetime
+from pagination import InvalidCursor, MAX_CURSOR_PAGE_SIZE, cursor_total, keyset_page
 import json
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
+def serialize_notification(notification):
+    try:
+        data = json.loads(notification.data) if notification.data else {}
+    except:
+        data = {}
+
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'type': notification.type,
+        'is_read': notification.is_read,
+        'data': data,
+        'created_at': notification.created_at.isoformat()
+    }
+
 @notifications_bp.route('', methods=['GET'])
 @jwt_required()
 def get_notifications():
@@ -31,6 +48,24 @@ def get_notifications():
                 db.or_(Notification.user_id == user_id, Notification.user_id.is_(None))
             )
         
+        # Opt-in keyset pagination: ?cursor= (empty for the first page)
+        if 'cursor' in request.args:
+            try:
+                notifications, next_cursor = keyset_page(notifications_query, Notification, request.args.get('cursor'), limit)
+            except InvalidCursor:
+                return jsonify({'message': 'Invalid cursor'}), 400
+            include_total = request.args.get('include_total', 'false').lower() == 'true'
+            total_count, total_is_estimate = cursor_total(notifications_query, include_total)
+            return jsonify({
+                'notifications': [serialize_notification(n) for n in notifications],
+                'pagination': {
+                    'limit': min(max(limit, 1), MAX_CURSOR_PAGE_SIZE),
+                    'next_cursor': next_cursor,
+                    'total': total_count,
+                    'total_is_estimate': total_is_estimate
+                }
+            }), 200
+
         # Get total count
         total_count = notifications_query.count()
         
@@ -39,23 +74,8 @@ def get_notifications():
             Notification.created_at.desc()
         ).offset(offset).limit(limit).all()
         
-        notifications_data = []
-        for notification in notifications:
-            try:
-                data = json.loads(notification.data) if notification.data else {}
-            except:
-                data = {}
-            
-            notifications_data.append({
-                'id': notification.id,
-                'title': notification.title,
-                'message': notification.message,
-                'type': notification.type,
-                'is_read': notification.is_read,
-                'data': data,
-                'created_at': notification.created_at.isoformat()
-            })
-        
+        notifications_data = [serialize_notification(n) for n in notifications]
+
         return jsonify({
             'notifications': notifications_data,
             'pagination': {
@@ -1,7 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
-from models import db, Order, OrderItem, Address, PaymentMethod, User, Product, Payment
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, Order, OrderItem, Address, PaymentMethod, User
+from commission_ledger import record_delivery, void_order
+from sales_counters import record_sale, order_status_changed
+from recommendations import refresh_user_recommendations
+from checkout import (CheckoutError, OutOfStock, PriceMismatch, checkout_lines, group_by_store, load_products,
+                      reserve_stock, verify_prices, write_orders)
+from user_cache import load_user
+from flash_sale import flash_sale_worker, release_flash_units
+from pricing import pricing_worker
+from idempotency import idempotent, remember_response
+from pagination import InvalidCursor, MAX_CURSOR_PAGE_SIZE, cursor_total, keyset_page
+from time_buckets import parse_utc_datetime
+import json
 import logging
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/api/orders')
@@ -9,11 +22,14 @@ logger = logging.getLogger(__name__)
 
 @orders_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_order():
-    """Create orders for items, grouped by store"""
+    """Create orders for items, grouped by store. Send an Idempotency-Key header to make retries safe."""
+    flash_units = []
+    pricing_worker.ensure_started()
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(int(user_id))
+        user = load_user(int(user_id))
         data = request.get_json()
 
         # Validate required fields
@@ -30,109 +46,69 @@ def create_order():
         if not payment_method:
             return jsonify({'message': 'Invalid payment method'}), 400
 
-        # Group items by store and validate stock
-        items_by_store = {}
-        for item in data['items']:
-            product = Product.query.get(item['id'])
-            if not product:
-                return jsonify({'message': f'Invalid product: {item["id"]}'}), 400
+        # Validate the cart and load every product in one query
+        try:
+            lines = checkout_lines(data['items'])
+            products = load_products(lines)
+        except CheckoutError as e:
+            return jsonify({'message': e.message}), 400
+        items_by_store = group_by_store(lines, products)
 
-            # Check stock availability
-            if product.stock_quantity < item['quantity']:
-                return jsonify({'message': f'Insufficient stock for product {product.name}. Available: {product.stock_quantity}, Requested: {item["quantity"]}'}), 400
-
-            store_id = product.store_id
-            if store_id not in items_by_store:
-                items_by_store[store_id] = []
-
-            items_by_store[store_id].append({
-                'product_id': item['id'],
-                'quantity': item['quantity'],
-                'price': item['price'],
-                'product': product  # Keep product reference for stock update
-            })
+        # Prevent managers from buying from their own store
+        if user.role == 'manager' and user.store and user.store.id in items_by_store:
+            return jsonify({'message': 'Managers cannot purchase from their own store'}), 403
 
         # Calculate shipping address string
         shipping_address_str = f"{address.street_address}, {address.city}, {address.state} {address.postal_code}, {address.country}"
 
-        # Get original totals for calculation
-        subtotal = data.get('subtotal', 0)
+        # Price the cart on the server; the client's prices and totals must match
         tax = data.get('tax', 0)
         shipping_cost = data.get('shipping_cost', 0)
-        total_amount = data.get('total', subtotal + tax + shipping_cost)
-
-        # Create separate orders for each store
-        created_orders = []
-        num_stores = len(items_by_store)
-
-        for store_id, store_items in items_by_store.items():
-            # Prevent managers from buying from their own store
-            if user.role == 'manager' and user.store and user.store.id == store_id:
-                return jsonify({'message': 'Managers cannot purchase from their own store'}), 403
-
-            # Calculate this store's portion
-            store_subtotal = sum(item['price'] * item['quantity'] for item in store_items)
-
-            # Split tax and shipping proportionally
-            proportion = store_subtotal / subtotal if subtotal > 0 else (1 / num_stores)
-            store_tax = tax * proportion
-            store_shipping = shipping_cost * proportion
-            store_total = store_subtotal + store_tax + store_shipping
-
-            # Create order for this store
-            order = Order(
-                user_id=user_id,
-                store_id=store_id,
-                total_amount=store_total,
-                status='pending',
-                shipping_address=shipping_address_str
+        try:
+            subtotal, total_amount = verify_prices(
+                lines, products, data.get('subtotal'), tax, shipping_cost, data.get('total')
             )
-            db.session.add(order)
-            db.session.flush()
-
-            # Add order items for this store and update stock
-            for item in store_items:
-                order_item = OrderItem(
-                    order_id=order.id,
-                    product_id=item['product_id'],
-                    quantity=item['quantity'],
-                    price=item['price']
-                )
-                db.session.add(order_item)
-
-                # Update product stock
-                item['product'].stock_quantity -= item['quantity']
-
-            # Create payment record
-            payment = Payment(
-                order_id=order.id,
-                amount=store_total,
-                payment_method=payment_method.card_type,
-                status='completed',
-                transaction_id=f"TXN_{order.id}_{datetime.utcnow().timestamp()}"
-            )
-            db.session.add(payment)
-
-            created_orders.append({
-                'order_id': order.id,
-                'store_id': store_id,
-                'amount': store_total,
-                'items_count': len(store_items)
-            })
-
-        db.session.commit()
+        except PriceMismatch as e:
+            return jsonify({'message': e.message, 'prices': e.prices}), 409
+
+        # Take the stock atomically; nothing is kept if any product ran out
+        try:
+            flash_units = reserve_stock(lines, products)
+        except OutOfStock as e:
+            db.session.rollback()
+            return jsonify({'message': e.message}), 400
+        if flash_units:
+            flash_sale_worker.ensure_started()
+        # Flash-sale units are counted by the flash sale flush instead
+        record_sale(
+            (line['product_id'], products[line['product_id']].store_id, line['quantity'])
+            for line in lines if not line['flash_sale_id']
+        )
 
-        logger.info(f"Created {len(created_orders)} orders for user {user_id}: {[o['order_id'] for o in created_orders]}")
+        # Create separate orders for each store
+        created_orders = write_orders(
+            int(user_id), items_by_store, shipping_address_str, payment_method, subtotal, tax, shipping_cost
+        )
 
-        return jsonify({
+        refresh_user_recommendations(user_id)
+        response = jsonify({
             'message': 'Orders placed successfully',
             'orders': created_orders,
             'total_amount': total_amount,
             'num_orders': len(created_orders)
-        }), 201
+        })
+        # Stored with the orders, so a retry with the same key replays it
+        remember_response(response, 201)
+        db.session.commit()
+        flash_units = []
+
+        logger.info(f"Created {len(created_orders)} orders for user {user_id}: {[o['order_id'] for o in created_orders]}")
+
+        return response, 201
 
     except Exception as e:
         db.session.rollback()
+        release_flash_units(flash_units)
         logger.error(f"Error creating order: {str(e)}")
         return jsonify({'message': f'Error creating order: {str(e)}'}), 500
 
@@ -236,8 +212,15 @@ def update_order_status(order_id):
             return jsonify({'message': 'Unauthorized'}), 403
 
         if 'status' in data:
+            previous_status = order.status
             order.status = data['status']
             order.updated_at = datetime.utcnow()
+            # Freeze commission at delivery; drop it if the delivery is undone
+            if order.status == 'delivered' and previous_status != 'delivered':
+                record_delivery(order)
+            elif previous_status == 'delivered' and order.status != 'delivered':
+                void_order(order)
+            order_status_changed(order, previous_status)
             db.session.commit()
             logger.info(f"Order {order_id} status updated to {data['status']}")
 
@@ -265,8 +248,10 @@ def cancel_order(order_id):
         if order.status not in ['pending', 'processing']:
             return jsonify({'message': 'Order cannot be cancelled at this stage'}), 400
 
+        previous_status = order.status
         order.status = 'cancelled'
         order.updated_at = datetime.utcnow()
+        order_status_changed(order, previous_status)
         db.session.commit()
 
         logger.info(f"Order {order_id} cancelled by user {user_id}")
@@ -282,10 +267,190 @@ def cancel_order(order_id):
         logger.error(f"Error cancelling order: {str(e)}")
         return jsonify({'message': f'Error cancelling order: {str(e)}'}), 500
 
+# Rows per query when streaming an NDJSON export
+EXPORT_BATCH_SIZE = 500
+
+def load_customers(orders):
+    """Fetch the customers for a batch of orders in one query. Returns {id: User}"""
+    user_ids = {order.user_id for order in orders}
+    if not user_ids:
+        return {}
+    return {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()}
+
+def serialize_order_items(order):
+    return [
+        {
+            'product_id': item.product_id,
+            'product_name': item.product.name if item.product else None,
+            'quantity': item.quantity,
+            'price': item.price
+        }
+        for item in order.items
+    ]
+
+def serialize_manager_order(order, customers):
+    customer = customers.get(order.user_id)
+    return {
+        'id': order.id,
+        'customer_name': customer.name if customer else None,
+        'customer_email': customer.email if customer else None,
+        'store_id': order.store_id,
+        'total_amount': order.total_amount,
+        'status': order.status,
+        'shipping_address': order.shipping_address,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'items': serialize_order_items(order)
+    }
+
+def serialize_admin_order(order, customers):
+    customer = customers.get(order.user_id)
+    store = order.store
+    return {
+        'id': order.id,
+        'customer_name': customer.name if customer else None,
+        'customer_email': customer.email if customer else None,
+        'store_name': store.name if store else 'Unknown',
+        'store_id': order.store_id,
+        'total_amount': order.total_amount,
+        'status': order.status,
+        'shipping_address': order.shipping_address,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'items_count': len(order.items),
+        'items': serialize_order_items(order)
+    }
+
+def parse_date_arg(name, end_of_day=False):
+    """Parse an ISO date/datetime query arg as naive UTC. A bare date used as an upper bound covers the whole day"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = parse_utc_datetime(value)
+    if end_of_day and len(value) == 10:
+        try:
+            parsed += timedelta(days=1)
+        except OverflowError:
+            raise ValueError(f'Invalid {name}')
+    return parsed
+
+def filter_orders_query(orders_query, allow_store_filter=False):
+    """Apply ?status=, ?start_date=, ?end_date= (and ?store_id= for admins) and eager loading.
+
+    Raises ValueError for a malformed date.
+    """
+    status = request.args.get('status')
+    if status:
+        orders_query = orders_query.filter(Order.status == status)
+
+    start_date = parse_date_arg('start_date')
+    if start_date:
+        orders_query = orders_query.filter(Order.created_at >= start_date)
+
+    end_date = parse_date_arg('end_date', end_of_day=True)
+    if end_date:
+        orders_query = orders_query.filter(Order.created_at < end_date)
+
+    if allow_store_filter:
+        store_id = request.args.get('store_id', type=int)
+        if store_id:
+            orders_query = orders_query.filter(Order.store_id == store_id)
+
+    # Items and their products in two extra queries per page instead of two per order
+    return orders_query.options(selectinload(Order.items).joinedload(OrderItem.product))
+
+def orders_list_response(orders_query, serialize):
+    """Serve orders as an NDJSON export, a keyset page, an offset page or the full list"""
+    if request.args.get('format') == 'ndjson':
+        return stream_orders_response(orders_query, serialize)
+
+    # Opt-in keyset pagination: ?cursor= (empty for the first page)
+    if 'cursor' in request.args:
+        return cursor_orders_response(orders_query, serialize)
+
+    if 'page' in request.args:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        per_page = min(max(per_page, 1), 100)  # Max 100 items per page
+        orders = orders_query.order_by(Order.created_at.desc(), Order.id.desc()).paginate(
+            page=page,
+            per_page=per_page,
+            error_out=False
+        )
+        customers = load_customers(orders.items)
+        return jsonify({
+            'orders': [serialize(order, customers) for order in orders.items],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': orders.total,
+                'pages': orders.pages,
+                'has_next': orders.has_next,
+                'has_prev': orders.has_prev
+            }
+        }), 200
+
+    # Unpaginated list kept for existing clients
+    orders = orders_query.order_by(Order.created_at.desc()).all()
+    customers = load_customers(orders)
+    return jsonify([serialize(order, customers) for order in orders]), 200
+
+def cursor_orders_response(orders_query, serialize):
+    """Serve one keyset page of orders with an optional or estimated total"""
+    per_page = request.args.get('per_page', 20, type=int)
+    try:
+        orders, next_cursor = keyset_page(orders_query, Order, request.args.get('cursor'), per_page)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    total, total_is_estimate = cursor_total(orders_query, include_total)
+    customers = load_customers(orders)
+    return jsonify({
+        'orders': [serialize(order, customers) for order in orders],
+        'next_cursor': next_cursor,
+        'per_page': min(max(per_page, 1), MAX_CURSOR_PAGE_SIZE),
+        'total': total,
+        'total_is_estimate': total_is_estimate
+    }), 200
+
+def stream_orders_response(orders_query, serialize):
+    """Stream every matching order as newline-delimited JSON.
+
+    Orders are read in keyset batches and the session is cleared after each
+    batch, so memory use stays flat however many orders match.
+    """
+    def generate():
+        cursor = None
+        try:
+            while True:
+                orders, cursor = keyset_page(
+                    orders_query, Order, cursor, EXPORT_BATCH_SIZE, max_limit=EXPORT_BATCH_SIZE
+                )
+                customers = load_customers(orders)
+                for order in orders:
+                    yield json.dumps(serialize(order, customers)) + '\n'
+                db.session.expunge_all()
+                if not cursor:
+                    break
+        except Exception as e:
+            # Headers are already sent, so the client sees a truncated export
+            logger.error(f"Error streaming orders export: {str(e)}")
+            raise
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=orders.ndjson'}
+    )
+
 @orders_bp.route('/manager/all', methods=['GET'])
 @jwt_required()
 def get_manager_orders():
-    """Get all orders for manager's store"""
+    """Get orders for manager's store
+
+    Supports ?status=, ?start_date=, ?end_date=, offset (?page=) or keyset
+    (?cursor=) pagination and ?format=ndjson for a streaming export.
+    """
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
@@ -295,33 +460,12 @@ def get_manager_orders():
             return jsonify({'message': 'Not authorized'}), 403
 
         store_id = user.store.id
-        orders = Order.query.filter_by(store_id=store_id).order_by(Order.created_at.desc()).all()
+        try:
+            orders_query = filter_orders_query(Order.query.filter_by(store_id=store_id))
+        except ValueError:
+            return jsonify({'message': 'Invalid date filter'}), 400
 
-        orders_data = []
-        for order in orders:
-            customer = User.query.get(order.user_id)
-            order_dict = {
-                'id': order.id,
-                'customer_name': customer.name,
-                'customer_email': customer.email,
-                'store_id': order.store_id,
-                'total_amount': order.total_amount,
-                'status': order.status,
-                'shipping_address': order.shipping_address,
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat(),
-                'items': [
-                    {
-                        'product_id': item.product_id,
-                        'quantity': item.quantity,
-                        'price': item.price
-                    }
-                    for item in order.items
-                ]
-            }
-            orders_data.append(order_dict)
-
-        return jsonify(orders_data), 200
+        return orders_list_response(orders_query, serialize_manager_order)
 
     except Exception as e:
         logger.error(f"Error fetching manager orders: {str(e)}")
@@ -330,7 +474,11 @@ def get_manager_orders():
 @orders_bp.route('/admin/all', methods=['GET'])
 @jwt_required()
 def get_admin_orders():
-    """Get all orders for super admin"""
+    """Get orders for super admin
+
+    Supports ?status=, ?start_date=, ?end_date=, ?store_id=, offset (?page=) or
+    keyset (?cursor=) pagination and ?format=ndjson for a streaming export.
+    """
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
@@ -339,36 +487,13 @@ def get_admin_orders():
         if user.role != 'super_admin':
             return jsonify({'message': 'Not authorized'}), 403
 
-        orders = Order.query.order_by(Order.created_at.desc()).all()
+        try:
+            orders_query = filter_orders_query(Order.query, allow_store_filter=True)
+        except ValueError:
+            return jsonify({'message': 'Invalid date filter'}), 400
+        orders_query = orders_query.options(joinedload(Order.store))
 
-        orders_data = []
-        for order in orders:
-            customer = User.query.get(order.user_id)
-            store = order.store
-            order_dict = {
-                'id': order.id,
-                'customer_name': customer.name,
-                'customer_email': customer.email,
-                'store_name': store.name if store else 'Unknown',
-                'store_id': order.store_id,
-                'total_amount': order.total_amount,
-                'status': order.status,
-                'shipping_address': order.shipping_address,
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat(),
-                'items_count': len(order.items),
-                'items': [
-                    {
-                        'product_id': item.product_id,
-                        'quantity': item.quantity,
-                        'price': item.price
-                    }
-                    for item in order.items
-                ]
-            }
-            orders_data.append(order_dict)
-
-        return jsonify(orders_data), 200
+        return orders_list_response(orders_query, serialize_admin_order)
 
     except Exception as e:
         logger.error(f"Error fetching admin orders: {str(e)}")
@@ -402,6 +527,7 @@ def confirm_delivery(order_id):
             order.delivery_confirmed_by_customer = True
             order.delivery_confirmed_at = datetime.utcnow()
             order.status = 'delivered'
+            record_delivery(order)
             
             db.session.commit()
             
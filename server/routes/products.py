@@ -1,60 +1,58 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from werkzeug.utils import secure_filename
+import io
+import logging
 import os
 import time
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
-from models import db, Product, User, Category, Store, Review, Comment, OrderItem, Commission, CommissionRate
+from models import db, Product, User, Category, Store, Review, Comment, Commission
 from sqlalchemy import func
+from pagination import InvalidCursor, MAX_CURSOR_PAGE_SIZE, cursor_total, keyset_page
+from search import apply_product_search, index_product, remove_product
+from serializers import get_stores_by_id, serialize_product_cards
+from commission_engine import CommissionTiers
+from response_cache import cached_response, invalidate_catalog, render_cached
+from review_stats import record_review, review_stats
+from sales_counters import best_sellers
+from recommendations import recommendations_for
+from authz import claimed_role, claimed_store_id, require_role
+from product_bulk import FORMATS, detect_format, export_products, import_products
+from home_snapshot import home_snapshot, featured_products, new_arrival_products, top_sale_products
+from pricing import apply_pricing, pricing_worker
+from time_buckets import parse_utc_datetime
+from image_variants import image_pipeline
 
 products_bp = Blueprint('products', __name__)
+logger = logging.getLogger(__name__)
 
-def get_review_stats_for_products(product_ids):
-    """Get review stats for multiple products in a single query.
-    
-    Returns a dict {product_id: (avg_rating, review_count)}
-    """
-    if not product_ids:
-        return {}
-    
-    stats = db.session.query(
-        Review.product_id,
-        func.avg(Review.rating).label('avg_rating'),
-        func.count(Review.id).label('review_count')
-    ).filter(Review.product_id.in_(product_ids)).group_by(Review.product_id).all()
-    
-    stats_map = {}
-    for stat in stats:
-        avg_rating = round(float(stat.avg_rating), 1) if stat.avg_rating else 0
-        review_count = stat.review_count
-        stats_map[stat.product_id] = (avg_rating, review_count)
-    
-    # For products with no reviews, set to (0, 0)
-    for pid in product_ids:
-        if pid not in stats_map:
-            stats_map[pid] = (0, 0)
-    
-    return stats_map
+# ?sort= values for the product listing; newest first by default
+PRODUCT_SORTS = {
+    'price_asc': (Product.effective_price.asc(), Product.id.asc()),
+    'price_desc': (Product.effective_price.desc(), Product.id.desc()),
+}
 
 @products_bp.route('/products', methods=['GET'])
+@cached_response
 def get_products():
+    pricing_worker.ensure_started()
     # Get query parameters for filtering
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     district = request.args.get('district', '')
-    min_price = request.args.get('min_price', type=float, default=0)
-    max_price = request.args.get('max_price', type=float, default=float('inf'))
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
     stock = request.args.get('stock', '')
+    sort = request.args.get('sort', '')
     page = request.args.get('page', type=int, default=1)
     per_page = request.args.get('per_page', type=int, default=10)
 
     # Build query
     query = Product.query
+    # Whether a search matched more products than it could rank (see search.py)
+    total_is_capped = False
 
     if search:
-        query = query.filter(
-            (Product.name.ilike(f'%{search}%')) |
-            (Product.description.ilike(f'%{search}%'))
-        )
+        query, total_is_capped = apply_product_search(query, search)
 
     if category:
         query = query.filter(Product.category == category)
@@ -62,7 +60,12 @@ def get_products():
     if district:
         query = query.filter(Product.district == district)
 
-    query = query.filter(Product.price >= min_price, Product.price <= max_price)
+    # Filter on the price customers pay, sale discounts included (see pricing.py). Only
+    # when asked: an always-on range makes planners pick the price index over the sort index.
+    if min_price is not None:
+        query = query.filter(Product.effective_price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.effective_price <= max_price)
 
     if stock:
         if stock == 'in-stock':
@@ -72,44 +75,41 @@ def get_products():
         elif stock == 'out-of-stock':
             query = query.filter(Product.stock_quantity == 0)
 
+    if sort and sort not in PRODUCT_SORTS:
+        return jsonify({'message': f'Invalid sort. Use one of: {", ".join(PRODUCT_SORTS)}'}), 400
+
+    # Opt-in keyset pagination: ?cursor= (empty for the first page)
+    if 'cursor' in request.args:
+        if sort:
+            return jsonify({'message': 'sort is not supported with cursor pagination'}), 400
+        try:
+            products, next_cursor = keyset_page(query, Product, request.args.get('cursor'), per_page)
+        except InvalidCursor:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        total, total_is_estimate = cursor_total(query, include_total)
+        return jsonify({
+            'products': serialize_product_cards(products),
+            'next_cursor': next_cursor,
+            'per_page': min(max(per_page, 1), MAX_CURSOR_PAGE_SIZE),
+            'total': total,
+            'total_is_estimate': total_is_estimate,
+            'total_is_capped': total_is_capped
+        }), 200
+
     # Get total count before pagination
     total = query.count()
 
+    if sort:
+        # Replaces the relevance order of a search
+        query = query.order_by(None).order_by(*PRODUCT_SORTS[sort])
+
     # Apply pagination
     products = query.offset((page - 1) * per_page).limit(per_page).all()
 
-    # Get review stats for all products in one query
-    product_ids = [p.id for p in products]
-    stats_map = get_review_stats_for_products(product_ids)
-
-    product_list = []
-    for product in products:
-        category_obj = Category.query.filter_by(name=product.category).first() if product.category else None
-        
-        avg_rating, review_count = stats_map.get(product.id, (0, 0))
-        
-        product_list.append({
-            'id': product.id,
-            'name': product.name,
-            'description': product.description,
-            'price': product.price,
-            'stock_quantity': product.stock_quantity,
-            'image_url': product.image_url,
-            'category': product.category,
-            'district': product.district,
-            'category_id': category_obj.id if category_obj else None,
-            'store_name': product.store.name if product.store else 'Unknown Store',
-            'store_id': product.store_id if product.store else None,
-            'created_at': product.created_at.isoformat(),
-            'updated_at': product.updated_at.isoformat(),
-            'sale_type': product.sale_type,
-            'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
-            'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-            'sale_discount_percentage': product.sale_discount_percentage,
-            'average_rating': avg_rating,
-            'review_count': review_count
-        })
-    return jsonify({'products': product_list, 'total': total, 'page': page, 'per_page': per_page}), 200
+    product_list = serialize_product_cards(products)
+    return jsonify({'products': product_list, 'total': total, 'total_is_capped': total_is_capped,
+                    'page': page, 'per_page': per_page}), 200
 
 @products_bp.route('/products', methods=['POST'])
 @jwt_required()
@@ -177,7 +177,6 @@ def create_product():
             return jsonify({'message': 'Invalid category_id'}), 400
 
     # Validate sale fields
-    from datetime import datetime
     sale_start = None
     sale_end = None
     sale_discount = None
@@ -190,13 +189,13 @@ def create_product():
 
     if sale_start_date:
         try:
-            sale_start = datetime.fromisoformat(sale_start_date.replace('Z', '+00:00'))
+            sale_start = parse_utc_datetime(sale_start_date)
         except ValueError:
             return jsonify({'message': 'Invalid sale_start_date format. Use ISO format.'}), 400
 
     if sale_end_date:
         try:
-            sale_end = datetime.fromisoformat(sale_end_date.replace('Z', '+00:00'))
+            sale_end = parse_utc_datetime(sale_end_date)
         except ValueError:
             return jsonify({'message': 'Invalid sale_end_date format. Use ISO format.'}), 400
 
@@ -231,15 +230,15 @@ def create_product():
         sale_end_date=sale_end,
         sale_discount_percentage=sale_discount
     )
+    apply_pricing(new_product)
     db.session.add(new_product)
+    invalidate_catalog()
     db.session.commit()
+    index_product(new_product)
+    image_pipeline.submit('product', new_product.id, new_product.image_url)
 
     # Automatically assign commission based on product price and commission rates
-    applicable_rate = CommissionRate.query.filter(
-        CommissionRate.is_active == True,
-        CommissionRate.min_price <= price,
-        db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= price)
-    ).first()
+    applicable_rate = CommissionTiers.current().rate_for(price)
     
     if applicable_rate:
         commission = Commission(
@@ -259,6 +258,7 @@ def create_product():
         'price': new_product.price,
         'stock_quantity': new_product.stock_quantity,
         'image_url': new_product.image_url,
+        'image_variants': new_product.image_variants,
         'category': new_product.category,
         'district': new_product.district,
         'category_id': category_id,
@@ -266,7 +266,8 @@ def create_product():
         'sale_type': new_product.sale_type,
         'sale_start_date': new_product.sale_start_date.isoformat() if new_product.sale_start_date else None,
         'sale_end_date': new_product.sale_end_date.isoformat() if new_product.sale_end_date else None,
-        'sale_discount_percentage': new_product.sale_discount_percentage
+        'sale_discount_percentage': new_product.sale_discount_percentage,
+        'effective_price': new_product.effective_price
     }}), 201
 
 @products_bp.route('/products/<int:product_id>', methods=['PUT'])
@@ -345,7 +346,6 @@ def update_product(product_id):
     is_featured = request.form.get('is_featured', 'false').lower() == 'true'
 
     # Validate sale fields
-    from datetime import datetime
     sale_start = None
     sale_end = None
     sale_discount = None
@@ -358,13 +358,13 @@ def update_product(product_id):
 
     if sale_start_date:
         try:
-            sale_start = datetime.fromisoformat(sale_start_date.replace('Z', '+00:00'))
+            sale_start = parse_utc_datetime(sale_start_date)
         except ValueError:
             return jsonify({'message': 'Invalid sale_start_date format. Use ISO format.'}), 400
 
     if sale_end_date:
         try:
-            sale_end = datetime.fromisoformat(sale_end_date.replace('Z', '+00:00'))
+            sale_end = parse_utc_datetime(sale_end_date)
         except ValueError:
             return jsonify({'message': 'Invalid sale_end_date format. Use ISO format.'}), 400
 
@@ -389,6 +389,10 @@ def update_product(product_id):
     product.description = description
     product.price = price
     product.stock_quantity = stock_quantity
+    image_changed = image_url != product.image_url
+    if image_changed:
+        # The old variants are for the old image; new ones are built after commit
+        product.image_variants = None
     product.image_url = image_url
     product.category = category_name
     product.district = district
@@ -397,15 +401,16 @@ def update_product(product_id):
     product.sale_start_date = sale_start
     product.sale_end_date = sale_end
     product.sale_discount_percentage = sale_discount
+    apply_pricing(product)
 
+    invalidate_catalog()
     db.session.commit()
+    index_product(product)
+    if image_changed:
+        image_pipeline.submit('product', product.id, product.image_url)
 
     # Update commission if price changed (find new applicable rate)
-    applicable_rate = CommissionRate.query.filter(
-        CommissionRate.is_active == True,
-        CommissionRate.min_price <= price,
-        db.or_(CommissionRate.max_price.is_(None), CommissionRate.max_price >= price)
-    ).first()
+    applicable_rate = CommissionTiers.current().rate_for(price)
     
     existing_commission = Commission.query.filter_by(product_id=product.id).first()
 
@@ -434,6 +439,7 @@ def update_product(product_id):
         'price': product.price,
         'stock_quantity': product.stock_quantity,
         'image_url': product.image_url,
+        'image_variants': product.image_variants,
         'category': product.category,
         'district': product.district,
         'category_id': category_id,
@@ -441,10 +447,12 @@ def update_product(product_id):
         'sale_type': product.sale_type,
         'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
         'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-        'sale_discount_percentage': product.sale_discount_percentage
+        'sale_discount_percentage': product.sale_discount_percentage,
+        'effective_price': product.effective_price
     }}), 200
 
 @products_bp.route('/products/<int:product_id>', methods=['GET'])
+@cached_response
 def get_product(product_id):
     product = Product.query.get(product_id)
     if not product:
@@ -454,7 +462,6 @@ def get_product(product_id):
     # Include reviews in the product payload
     reviews_q = Review.query.filter_by(product_id=product.id).order_by(Review.created_at.desc()).all()
     reviews_list = []
-    total_rating = 0
     for r in reviews_q:
         reviewer_name = r.user_name
         if not reviewer_name and r.user_id:
@@ -468,16 +475,8 @@ def get_product(product_id):
             'comment': r.comment,
             'created_at': r.created_at.isoformat()
         })
-        try:
-            total_rating += int(r.rating or 0)
-        except Exception:
-            pass
 
-    avg_rating = 0
-    if len(reviews_list) > 0:
-        avg_rating = round(total_rating / len(reviews_list), 1)
-
-    review_count = len(reviews_list)
+    avg_rating, review_count = review_stats(product)
 
     # Calculate store stats
     store = product.store
@@ -485,21 +484,12 @@ def get_product(product_id):
     store_total_reviews = 0
     store_products_sold = 0
     if store:
-        # Get all products for the store
-        store_products = Product.query.filter_by(store_id=store.id).all()
-        store_product_ids = [p.id for p in store_products]
-
-        # Calculate average rating across all store products
-        store_reviews = Review.query.filter(Review.product_id.in_(store_product_ids)).all()
-        store_total_reviews = len(store_reviews)
-        if store_reviews:
-            total_store_rating = sum(r.rating for r in store_reviews if r.rating)
-            store_rating = round(total_store_rating / len([r for r in store_reviews if r.rating]), 1) if total_store_rating else None
-
-        # Calculate total products sold (sum of order item quantities)
-        from sqlalchemy import func
-        sold_result = db.session.query(func.sum(OrderItem.quantity)).filter(OrderItem.product_id.in_(store_product_ids)).scalar()
-        store_products_sold = sold_result or 0
+        # Rating across all store products, from the store's review totals
+        if store.rating_count:
+            store_rating, store_total_reviews = review_stats(store)
+
+        # Units sold across the store, from its sales counter
+        store_products_sold = store.units_sold
 
     product_data = {
         'id': product.id,
@@ -508,12 +498,14 @@ def get_product(product_id):
         'price': product.price,
         'stock_quantity': product.stock_quantity,
         'image_url': product.image_url,
+        'image_variants': product.image_variants,
         'category': product.category,
         'district': product.district,
         'category_id': category_obj.id if category_obj else None,
         'store_name': product.store.name if product.store else 'Unknown Store',
         'store_id': product.store_id if product.store else None,
         'store_logo_url': product.store.logo_url if product.store else None,
+        'store_logo_variants': product.store.logo_variants if product.store else None,
         'store_rating': store_rating,
         'store_total_reviews': store_total_reviews,
         'store_products_sold': store_products_sold,
@@ -525,78 +517,49 @@ def get_product(product_id):
         'sale_type': product.sale_type,
         'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
         'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-        'sale_discount_percentage': product.sale_discount_percentage
+        'sale_discount_percentage': product.sale_discount_percentage,
+        'effective_price': product.effective_price
     }
     return jsonify({'product': product_data}), 200
 
 
 @products_bp.route('/products/<int:product_id>/recommendations', methods=['GET'])
+@cached_response
 def get_recommendations(product_id):
-    """Return recommended products based on the same category as the given product.
+    """Return up to 8 recommended products for the given product.
 
-    This is a simple heuristic: find other products with the same category and
-    return up to 8 items, excluding the current product.
+    Served from the precomputed product_recommendations table (co-purchases,
+    co-views and wishlist overlap); products without precomputed neighbours
+    fall back to the same-category heuristic. See recommendations.py.
     """
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'message': 'Product not found'}), 404
 
-    if not product.category:
-        # If product has no category, return an empty list
-        return jsonify({'recommendations': []}), 200
-
-    # Query candidate products in same category (exclude current product)
-    candidates = Product.query.filter(Product.category == product.category, Product.id != product.id).all()
-
-    # Score candidates by: same-store boost + popularity (order items) + recency
-    scored = []
-    for p in candidates:
-        # popularity: total ordered quantity
-        popularity = 0
-        try:
-            for oi in getattr(p, 'order_items', []) or []:
-                popularity += (oi.quantity or 0)
-        except Exception:
-            popularity = 0
-
-        # same store boost
-        same_store = 1 if (p.store_id and product.store_id and p.store_id == product.store_id) else 0
-
-        # recency factor (days since creation) -> newer is better
-        recency = 0
-        try:
-            age_seconds = (product.created_at - p.created_at).total_seconds()
-            recency = max(0, -age_seconds / (60 * 60 * 24))  # negative age -> positive recency
-        except Exception:
-            recency = 0
+    top = recommendations_for(product)
 
-        score = (same_store * 100) + (popularity * 2) + recency
-        scored.append((score, p))
-
-    # sort by score desc and return top 8
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = [p for (_s, p) in scored[:8]]
-
-    # Get review stats for all products in one query
-    product_ids = [p.id for p in top]
-    stats_map = get_review_stats_for_products(product_ids)
+    # Resolve stores for the whole page in one query
+    stores = get_stores_by_id(p.store_id for p in top)
 
     rec_list = []
     for p in top:
-        avg_rating, review_count = stats_map.get(p.id, (0, 0))
-        
+        avg_rating, review_count = review_stats(p)
+        store = stores.get(p.store_id)
+
         rec_list.append({
             'id': p.id,
             'name': p.name,
             'price': p.price,
             'image_url': p.image_url,
-            'store_name': p.store.name if p.store else 'Unknown Store',
+            'image_variants': p.image_variants,
+            'store_name': store.name if store else 'Unknown Store',
             'created_at': p.created_at.isoformat(),
             'district': p.district,
             'sale_type': p.sale_type,
             'sale_start_date': p.sale_start_date.isoformat() if p.sale_start_date else None,
             'sale_end_date': p.sale_end_date.isoformat() if p.sale_end_date else None,
             'sale_discount_percentage': p.sale_discount_percentage,
+            'effective_price': p.effective_price,
             'average_rating': avg_rating,
             'review_count': review_count
         })
@@ -605,6 +568,7 @@ def get_recommendations(product_id):
 
 
 @products_bp.route('/products/<int:product_id>/reviews', methods=['GET'])
+@cached_response
 def get_reviews(product_id):
     product = Product.query.get(product_id)
     if not product:
@@ -678,6 +642,8 @@ def post_review(product_id):
         comment=comment
     )
     db.session.add(new_review)
+    record_review(product, rating)
+    invalidate_catalog()
     db.session.commit()
 
     # Build response
@@ -693,6 +659,7 @@ def post_review(product_id):
 
 
 @products_bp.route('/products/<int:product_id>/comments', methods=['GET'])
+@cached_response
 def get_comments(product_id):
     product = Product.query.get(product_id)
     if not product:
@@ -757,6 +724,7 @@ def post_comment(product_id):
         comment=comment
     )
     db.session.add(new_comment)
+    invalidate_catalog()
     db.session.commit()
 
     # Build response
@@ -790,7 +758,9 @@ def delete_product(product_id):
         return jsonify({'message': 'Unauthorized to delete this product'}), 403
 
     db.session.delete(product)
+    invalidate_catalog()
     db.session.commit()
+    remove_product(product_id)
 
     return jsonify({'message': 'Product deleted successfully'}), 200
 
@@ -892,12 +862,14 @@ def delete_comment(comment_id):
         return jsonify({'message': 'Unauthorized to delete this comment'}), 403
 
     db.session.delete(comment)
+    invalidate_catalog()
     db.session.commit()
 
     return jsonify({'message': 'Comment deleted successfully'}), 200
 
 
 @products_bp.route('/stores/<int:store_id>', methods=['GET'])
+@cached_response
 def get_store(store_id):
     store = Store.query.get(store_id)
     if not store:
@@ -906,55 +878,17 @@ def get_store(store_id):
     # Get all products for this store
     products = Product.query.filter_by(store_id=store_id).all()
 
-    # Get review stats for all products in one query
-    product_ids = [p.id for p in products]
-    stats_map = get_review_stats_for_products(product_ids)
-
-    product_list = []
-    for product in products:
-        category_obj = Category.query.filter_by(name=product.category).first() if product.category else None
-        
-        avg_rating, review_count = stats_map.get(product.id, (0, 0))
-        
-        product_list.append({
-            'id': product.id,
-            'name': product.name,
-            'description': product.description,
-            'price': product.price,
-            'stock_quantity': product.stock_quantity,
-            'image_url': product.image_url,
-            'category': product.category,
-            'district': product.district,
-            'category_id': category_obj.id if category_obj else None,
-            'store_name': store.name,
-            'store_id': store.id,
-            'created_at': product.created_at.isoformat(),
-            'updated_at': product.updated_at.isoformat(),
-            'sale_type': product.sale_type,
-            'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
-            'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-            'sale_discount_percentage': product.sale_discount_percentage,
-            'average_rating': avg_rating,
-            'review_count': review_count
-        })
+    product_list = serialize_product_cards(products, stores={store.id: store})
 
-    # Calculate store-level rating statistics
-    # Get all reviews for store products
-    store_reviews = Review.query.filter(Review.product_id.in_(product_ids)).all() if product_ids else []
-    store_total_reviews = len(store_reviews)
-    
-    # Calculate average rating
-    if store_reviews:
-        total_store_rating = sum(r.rating for r in store_reviews if r.rating)
-        store_avg_rating = round(total_store_rating / len([r for r in store_reviews if r.rating]), 1) if total_store_rating else 0
-    else:
-        store_avg_rating = 0
+    # Store-level rating statistics across all its products
+    store_avg_rating, store_total_reviews = review_stats(store)
 
     store_data = {
         'id': store.id,
         'name': store.name,
         'address': store.address,
         'logo_url': store.logo_url,
+        'logo_variants': store.logo_variants,
         'contact_number': store.contact_number,
         'description': store.description,
         'manager_id': store.manager_id,
@@ -968,48 +902,33 @@ def get_store(store_id):
     return jsonify({'store': store_data}), 200
 
 
+@products_bp.route('/home', methods=['GET'])
+def get_home():
+    """Featured, new-arrival and top-sale sections for the homepage in one call."""
+    try:
+        home_snapshot.ensure_started()
+        return render_cached(home_snapshot.get())
+    except Exception as e:
+        logger.error(f"Error fetching homepage: {str(e)}")
+        return jsonify({'message': 'Error fetching homepage'}), 500
+
+
+@products_bp.route('/products/best-sellers', methods=['GET'])
+@cached_response
+def get_best_sellers():
+    """Products with the most units sold, optionally within ?category=."""
+    category = request.args.get('category', '')
+    limit = min(max(request.args.get('limit', type=int, default=8), 1), MAX_CURSOR_PAGE_SIZE)
+    products = best_sellers(category=category or None, limit=limit)
+    return jsonify({'products': serialize_product_cards(products)}), 200
+
+
 @products_bp.route('/products/featured', methods=['GET'])
+@cached_response
 def get_featured_products():
     """Get featured products for homepage display."""
     try:
-        featured_products = Product.query.filter_by(is_featured=True).order_by(
-            Product.featured_order, Product.created_at.desc()
-        ).limit(6).all()
-
-        # Get review stats for all products in one query
-        product_ids = [p.id for p in featured_products]
-        stats_map = get_review_stats_for_products(product_ids)
-
-        featured_list = []
-        for product in featured_products:
-            category_obj = Category.query.filter_by(name=product.category).first() if product.category else None
-            
-            avg_rating, review_count = stats_map.get(product.id, (0, 0))
-            
-            featured_list.append({
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'image_url': product.image_url,
-                'category': product.category,
-                'category_id': category_obj.id if category_obj else None,
-                'store_name': product.store.name if product.store else 'Unknown Store',
-                'store_id': product.store_id if product.store else None,
-                'created_at': product.created_at.isoformat(),
-                'updated_at': product.updated_at.isoformat(),
-                'sale_type': product.sale_type,
-                'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
-                'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-                'sale_discount_percentage': product.sale_discount_percentage,
-                'is_featured': product.is_featured,
-                'is_new_arrival': product.is_new_arrival,
-                'featured_order': product.featured_order,
-                'new_arrival_order': product.new_arrival_order,
-                'average_rating': avg_rating,
-                'review_count': review_count
-            })
+        featured_list = serialize_product_cards(featured_products(), include_display_fields=True)
 
         return jsonify({'products': featured_list}), 200
     except Exception as e:
@@ -1018,55 +937,12 @@ def get_featured_products():
 
 
 @products_bp.route('/products/new-arrivals', methods=['GET'])
+@cached_response
 def get_new_arrivals():
     """Get new arrival products for homepage display."""
     try:
-        from datetime import datetime, timedelta
-
         # Products created in last 30 days OR explicitly marked as new arrival
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
-        new_arrival_products = Product.query.filter(
-            db.or_(
-                Product.created_at >= thirty_days_ago,
-                Product.is_new_arrival == True
-            )
-        ).order_by(Product.created_at.desc()).limit(8).all()
-
-        # Get review stats for all products in one query
-        product_ids = [p.id for p in new_arrival_products]
-        stats_map = get_review_stats_for_products(product_ids)
-
-        new_arrival_list = []
-        for product in new_arrival_products:
-            category_obj = Category.query.filter_by(name=product.category).first() if product.category else None
-            
-            avg_rating, review_count = stats_map.get(product.id, (0, 0))
-            
-            new_arrival_list.append({
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'image_url': product.image_url,
-                'category': product.category,
-                'category_id': category_obj.id if category_obj else None,
-                'store_name': product.store.name if product.store else 'Unknown Store',
-                'store_id': product.store_id if product.store else None,
-                'created_at': product.created_at.isoformat(),
-                'updated_at': product.updated_at.isoformat(),
-                'sale_type': product.sale_type,
-                'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
-                'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-                'sale_discount_percentage': product.sale_discount_percentage,
-                'is_featured': product.is_featured,
-                'is_new_arrival': product.is_new_arrival,
-                'featured_order': product.featured_order,
-                'new_arrival_order': product.new_arrival_order,
-                'average_rating': avg_rating,
-                'review_count': review_count
-            })
+        new_arrival_list = serialize_product_cards(new_arrival_products(), include_display_fields=True)
 
         return jsonify({'products': new_arrival_list}), 200
     except Exception as e:
@@ -1075,61 +951,69 @@ def get_new_arrivals():
 
 
 @products_bp.route('/products/top-sales', methods=['GET'])
+@cached_response
 def get_top_sale_products():
     """Get top sale products (products currently on sale with highest discount)."""
     try:
-        from datetime import datetime
-
-        # Get current time for sale validation
-        now = datetime.utcnow()
-
-        # Products that are currently on sale (active sales)
-        top_sale_products = Product.query.filter(
-            Product.sale_type.isnot(None),
-            Product.sale_start_date <= now,
-            Product.sale_end_date >= now,
-            Product.sale_discount_percentage > 0
-        ).order_by(
-            Product.sale_discount_percentage.desc(),  # Highest discount first
-            Product.created_at.desc()  # Then by newest
-        ).limit(6).all()
-
-        # Get review stats for all products in one query
-        product_ids = [p.id for p in top_sale_products]
-        stats_map = get_review_stats_for_products(product_ids)
-
-        top_sale_list = []
-        for product in top_sale_products:
-            category_obj = Category.query.filter_by(name=product.category).first() if product.category else None
-            
-            avg_rating, review_count = stats_map.get(product.id, (0, 0))
-            
-            top_sale_list.append({
-                'id': product.id,
-                'name': product.name,
-                'description': product.description,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'image_url': product.image_url,
-                'category': product.category,
-                'category_id': category_obj.id if category_obj else None,
-                'store_name': product.store.name if product.store else 'Unknown Store',
-                'store_id': product.store_id if product.store else None,
-                'created_at': product.created_at.isoformat(),
-                'updated_at': product.updated_at.isoformat(),
-                'sale_type': product.sale_type,
-                'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
-                'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
-                'sale_discount_percentage': product.sale_discount_percentage,
-                'is_featured': product.is_featured,
-                'is_new_arrival': product.is_new_arrival,
-                'featured_order': product.featured_order,
-                'new_arrival_order': product.new_arrival_order,
-                'average_rating': avg_rating,
-                'review_count': review_count
-            })
+        # Products currently on sale, highest discount first
+        top_sale_list = serialize_product_cards(top_sale_products(), include_display_fields=True)
 
         return jsonify({'products': top_sale_list}), 200
     except Exception as e:
         print(f"Error fetching top sale products: {e}")
         return jsonify({'message': 'Error fetching top sale products', 'products': []}), 500
+
+
+@products_bp.route('/products/import', methods=['POST'])
+@require_role('manager')
+def import_products_bulk():
+    """Create products in the manager's store from a CSV or JSONL upload.
+
+    Send the file as multipart field ``file``, or as the raw request body with
+    ?format=csv|jsonl. Valid rows are imported; invalid ones are reported by
+    row number and skipped. See product_bulk.py for the columns.
+    """
+    store_id = claimed_store_id()
+    if not store_id:
+        return jsonify({'message': 'Manager has no associated store'}), 403
+
+    upload = request.files.get('file')
+    if upload is not None:
+        raw = upload.stream
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+    else:
+        raw = request.stream
+        fmt = request.args.get('format') or detect_format(mimetype=request.mimetype)
+    if fmt not in FORMATS:
+        return jsonify({'message': 'Unsupported format. Use csv or jsonl.'}), 400
+
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    try:
+        result = import_products(stream, fmt, store_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'message': f'Could not read file: {e}'}), 400
+    return jsonify(result), 200
+
+
+@products_bp.route('/products/export', methods=['GET'])
+@require_role('manager', 'super_admin')
+def export_products_bulk():
+    """Stream the manager's products (or all, or ?store_id= for super admins) as CSV or JSONL."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'message': 'Unsupported format. Use csv or jsonl.'}), 400
+
+    if claimed_role() == 'super_admin':
+        store_id = request.args.get('store_id', type=int)
+    else:
+        store_id = claimed_store_id()
+        if not store_id:
+            return jsonify({'message': 'Manager has no associated store'}), 403
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_products(fmt, store_id)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=products.{fmt}'}
+    )
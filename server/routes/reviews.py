@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from models import db, Review, Order, OrderItem, Product, User
+from response_cache import invalidate_catalog
+from review_stats import record_review, remove_review
+from image_variants import image_pipeline
 from werkzeug.utils import secure_filename
 import os
 import logging
@@ -42,6 +45,10 @@ def create_review():
         if not comment or not comment.strip():
             return jsonify({'message': 'Comment is required'}), 400
 
+        product = Product.query.get(product_id)
+        if not product:
+            return jsonify({'message': 'Product not found'}), 404
+
         # Verify order exists and belongs to user
         if order_id:
             order = Order.query.filter_by(id=order_id, user_id=user_id).first()
@@ -86,6 +93,7 @@ def create_review():
         
         db.session.add(review)
         db.session.flush()  # Get the review ID
+        record_review(product, rating)
 
         # Store images (we'll add a simple storage mechanism)
         # For now, storing paths as JSON string in a new field if needed
@@ -93,7 +101,11 @@ def create_review():
             # You may want to add an images field to Review model in future
             logger.info(f"Review {review.id} has {len(image_paths)} images: {image_paths}")
 
+        invalidate_catalog()
         db.session.commit()
+        # Reviews have no image column yet, so only the variant files are built
+        for path in image_paths:
+            image_pipeline.submit(None, None, path)
 
         logger.info(f"Review {review.id} created by user {user_id} for product {product_id}")
 
@@ -189,7 +201,9 @@ def delete_review(review_id):
         if review.user_id != user_id:
             return jsonify({'message': 'Unauthorized'}), 403
 
+        remove_review(Product.query.get(review.product_id), review.rating)
         db.session.delete(review)
+        invalidate_catalog()
         db.session.commit()
 
         logger.info(f"Review {review_id} deleted by user {user_id}")
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Wishlist, WishlistItem, Product, User
 from sqlalchemy.exc import IntegrityError
+from recommendations import refresh_user_recommendations
 
 wishlist_bp = Blueprint('wishlist', __name__)
 
@@ -31,6 +32,7 @@ def get_wishlist():
                 'name': product.name,
                 'price': product.price,
                 'image_url': product.image_url,
+                'image_variants': product.image_variants,
                 'store': {
                     'id': product.store.id,
                     'name': product.store.name
@@ -84,6 +86,7 @@ def add_to_wishlist():
             product_id=product_id
         )
         db.session.add(wishlist_item)
+        refresh_user_recommendations(user_id)
         db.session.commit()
 
         return jsonify({'message': 'Product added to wishlist'}), 201
@@ -117,6 +120,7 @@ def remove_from_wishlist(product_id):
             return jsonify({'error': 'Product not in wishlist'}), 404
 
         db.session.delete(wishlist_item)
+        refresh_user_recommendations(user_id)
         db.session.commit()
 
         return jsonify({'message': 'Product removed from wishlist'}), 200
@@ -0,0 +1,75 @@
+"""Denormalized units-sold counters and the best-sellers index.
+
+Product and Store carry ``units_sold``: units in orders that are not
+cancelled. ``create_order`` counts each new order with ``record_sale``. An
+order that becomes cancelled is uncounted with ``release_sale``, and counted
+again if it is un-cancelled. Both issue relative UPDATEs (col = col + n) in the
+order's transaction, so concurrent checkouts cannot lose counts.
+
+``best_sellers`` reads the top products globally or within a category. The
+(units_sold, id) and (category, units_sold, id) indexes let the database
+stop after ``limit`` rows instead of sorting the catalog.
+"""
+
+from collections import defaultdict
+
+from models import db, Product, Store, OrderItem
+
+# Orders in this status no longer count towards units sold
+CANCELLED = 'cancelled'
+
+
+def _add_units(model, units_by_id):
+    # Rows are updated in id order so concurrent checkouts lock them in the same order
+    for row_id, units in sorted(units_by_id.items()):
+        if not units:
+            continue
+        db.session.query(model).filter(model.id == row_id).update({
+            model.units_sold: model.units_sold + units,
+            # A sale is not an edit of the product or store
+            model.updated_at: model.updated_at,
+        }, synchronize_session=False)
+
+
+def _apply(lines, sign):
+    """``lines`` is an iterable of (product_id, store_id, quantity)."""
+    by_product = defaultdict(int)
+    by_store = defaultdict(int)
+    for product_id, store_id, quantity in lines:
+        by_product[product_id] += sign * quantity
+        by_store[store_id] += sign * quantity
+    _add_units(Product, by_product)
+    _add_units(Store, by_store)
+
+
+def _order_lines(order):
+    items = OrderItem.query.filter_by(order_id=order.id).all()
+    return [(item.product_id, order.store_id, item.quantity) for item in items]
+
+
+def record_sale(lines):
+    """Count (product_id, store_id, quantity) lines of a new order. Does not commit."""
+    _apply(lines, 1)
+
+
+def release_sale(order):
+    """Uncount an order that was cancelled. Does not commit."""
+    _apply(_order_lines(order), -1)
+
+
+def order_status_changed(order, previous_status):
+    """Keep the counters right when an order moves into or out of cancelled. Does not commit."""
+    if order.status == CANCELLED and previous_status != CANCELLED:
+        release_sale(order)
+    elif previous_status == CANCELLED and order.status != CANCELLED:
+        _apply(_order_lines(order), 1)
+
+
+def best_sellers(category=None, limit=8, exclude_ids=()):
+    """The ``limit`` products with the most units sold, optionally within ``category``."""
+    query = Product.query.filter(Product.units_sold > 0)
+    if category:
+        query = query.filter(Product.category == category)
+    if exclude_ids:
+        query = query.filter(~Product.id.in_(list(exclude_ids)))
+    return query.order_by(Product.units_sold.desc(), Product.id.desc()).limit(limit).all()
@@ -0,0 +1,218 @@
+"""Full-text product search.
+
+On PostgreSQL, products are matched against a weighted ``tsvector`` built from
+name (weight A) and description (weight B). The expression is backed by a GIN
+index (see the ``product_search_gin_index`` migration), so the database keeps
+the index up to date on every write and a search is an index lookup instead of
+the sequential scan ``ILIKE '%q%'`` needs.
+
+Other databases (SQLite in development) use an in-process inverted index with
+the same semantics: every query term is matched as a prefix (for type-ahead),
+all terms must match, and name hits rank above description hits. The
+in-process index is built lazily on the first search and kept current by the
+product write routes via ``index_product`` / ``remove_product``. Only the
+``FALLBACK_MAX_MATCHES`` best matches are passed to the database, since each
+one costs bound parameters in the query; ``apply_product_search`` reports when
+that cap cut matches off, so listings can flag their total as capped.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+
+from models import db, Product
+from sqlalchemy import case, func, literal_column
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Relative weight of a term hit in each field for the in-process index
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+# Matches the in-process index hands to the query, best first. Each costs three
+# bound parameters (IN list and relevance CASE); older SQLite builds allow 999.
+FALLBACK_MAX_MATCHES = 300
+
+
+def tokenize(text):
+    """Split text into lowercase search tokens."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+# Must stay identical to the expression in the product_search_gin_index
+# migration, otherwise PostgreSQL will not use the index. Rendered verbatim so
+# the weights and text search config are not sent as typed bind parameters.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(product.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(product.description, '')), 'B')"
+)
+
+
+def product_search_vector():
+    """The tsvector expression indexed by the GIN index on ``product``."""
+    return literal_column(f'({SEARCH_VECTOR_SQL})')
+
+
+def build_prefix_tsquery(terms):
+    """Build a to_tsquery string that AND-s every term as a prefix match."""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+class ProductSearchIndex:
+    """In-process inverted index over product name and description.
+
+    Postings map token -> {product_id: weight}. The vocabulary is kept sorted so
+    prefix lookups are a bisect plus a short scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._vocabulary = []
+        self._doc_tokens = {}
+        self._built = False
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            rows = db.session.query(Product.id, Product.name, Product.description).all()
+            for row in rows:
+                self._add(row.id, row.name, row.description)
+            self._built = True
+
+    def _add(self, product_id, name, description):
+        weights = {}
+        for token in tokenize(name):
+            weights[token] = max(weights.get(token, 0), NAME_WEIGHT)
+        for token in tokenize(description):
+            weights[token] = max(weights.get(token, 0), DESCRIPTION_WEIGHT)
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            postings[product_id] = weight
+        self._doc_tokens[product_id] = list(weights)
+
+    def _remove(self, product_id):
+        for token in self._doc_tokens.pop(product_id, []):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                idx = bisect.bisect_left(self._vocabulary, token)
+                if idx < len(self._vocabulary) and self._vocabulary[idx] == token:
+                    del self._vocabulary[idx]
+
+    def index_product(self, product):
+        """Add or refresh a product. No-op until the index has been built."""
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(product.id)
+            self._add(product.id, product.name, product.description)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+
+    def _prefix_matches(self, term):
+        """Return {product_id: weight} for every token starting with term."""
+        matches = {}
+        idx = bisect.bisect_left(self._vocabulary, term)
+        while idx < len(self._vocabulary) and self._vocabulary[idx].startswith(term):
+            for product_id, weight in self._postings[self._vocabulary[idx]].items():
+                if weight > matches.get(product_id, 0):
+                    matches[product_id] = weight
+            idx += 1
+        return matches
+
+    def search(self, terms):
+        """Return {product_id: score} for products matching every term."""
+        self._ensure_built()
+        with self._lock:
+            scores = None
+            for term in terms:
+                matches = self._prefix_matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: scores[pid] + w for pid, w in matches.items() if pid in scores}
+                if not scores:
+                    return {}
+            return scores or {}
+
+    def reset(self):
+        with self._lock:
+            self._postings = {}
+            self._vocabulary = []
+            self._doc_tokens = {}
+            self._built = False
+
+
+_fallback_index = ProductSearchIndex()
+
+
+def _uses_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def apply_product_search(query, search):
+    """Filter a Product query to matches for ``search`` ordered by relevance.
+
+    Returns ``(query, is_capped)``; ``is_capped`` is true when the in-process
+    index matched more than ``FALLBACK_MAX_MATCHES`` products and only the best
+    of them are in the query.
+    """
+    terms = tokenize(search)
+    if not terms:
+        # Nothing indexable (e.g. only punctuation); keep the substring match
+        return query.filter(
+            (Product.name.ilike(f'%{search}%')) |
+            (Product.description.ilike(f'%{search}%'))
+        ), False
+
+    if _uses_postgres():
+        vector = product_search_vector()
+        tsquery = func.to_tsquery(literal_column("'simple'"), build_prefix_tsquery(terms))
+        return query.filter(vector.op('@@')(tsquery)).order_by(
+            func.ts_rank(vector, tsquery).desc(), Product.id.desc()
+        ), False
+
+    scores = _fallback_index.search(terms)
+    if not scores:
+        return query.filter(db.false()), False
+    is_capped = len(scores) > FALLBACK_MAX_MATCHES
+    if is_capped:
+        # Same order as the query: score, then newest id
+        scores = dict(heapq.nlargest(FALLBACK_MAX_MATCHES, scores.items(), key=lambda item: (item[1], item[0])))
+    return query.filter(Product.id.in_(list(scores))).order_by(
+        case(scores, value=Product.id, else_=0).desc(), Product.id.desc()
+    ), is_capped
+
+
+def index_product(product):
+    """Keep the in-process index current after a product is created or updated."""
+    if not _uses_postgres():
+        _fallback_index.index_product(product)
+
+
+def remove_product(product_id):
+    """Drop a deleted product from the in-process index."""
+    if not _uses_postgres():
+        _fallback_index.remove_product(product_id)
+
+
+def reset_search_index():
+    """Drop the in-process index after a bulk write; it is rebuilt on the next search."""
+    if not _uses_postgres():
+        _fallback_index.reset()
@@ -0,0 +1,99 @@
+"""Shared serialization helpers for product listings.
+
+Listing endpoints (catalog, store page, homepage sections, recommendations)
+all render the same "product card". Building a card needs the product's
+category id and its store; resolving those one product at a time costs
+several queries per row. The helpers here resolve them for a whole page at
+once so a listing costs a fixed number of queries regardless of its size.
+Review stats come from the product's own denormalized columns
+(see review_stats.py).
+"""
+
+from models import db, Category, Store
+from review_stats import review_stats
+
+
+def get_category_ids_by_name(names):
+    """Map category names to ids in a single query. Returns {name: id}."""
+    names = {n for n in names if n}
+    if not names:
+        return {}
+    rows = db.session.query(Category.name, Category.id).filter(Category.name.in_(names)).all()
+    return {row.name: row.id for row in rows}
+
+
+def get_stores_by_id(store_ids):
+    """Load stores for the given ids in a single query. Returns {id: Store}."""
+    store_ids = {sid for sid in store_ids if sid}
+    if not store_ids:
+        return {}
+    return {s.id: s for s in Store.query.filter(Store.id.in_(store_ids)).all()}
+
+
+class ProductCardContext:
+    """Lookups needed to render a page of product cards.
+
+    Built once per page with one query each for categories and stores. Pass
+    ``stores`` when the caller already has them (e.g. the store page) to skip
+    the store query.
+    """
+
+    def __init__(self, products, stores=None):
+        products = list(products)
+        self.category_ids = get_category_ids_by_name(p.category for p in products)
+        if stores is None:
+            stores = get_stores_by_id(p.store_id for p in products)
+        self.stores = stores
+
+    def store_for(self, product):
+        return self.stores.get(product.store_id)
+
+    def review_stats_for(self, product):
+        return review_stats(product)
+
+
+def serialize_product_card(product, context, include_display_fields=False):
+    """Serialize one product using lookups from a ProductCardContext."""
+    store = context.store_for(product)
+    avg_rating, review_count = context.review_stats_for(product)
+
+    data = {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'stock_quantity': product.stock_quantity,
+        'image_url': product.image_url,
+        'image_variants': product.image_variants,
+        'category': product.category,
+        'district': product.district,
+        'category_id': context.category_ids.get(product.category) if product.category else None,
+        'store_name': store.name if store else 'Unknown Store',
+        'store_id': product.store_id if store else None,
+        'created_at': product.created_at.isoformat(),
+        'updated_at': product.updated_at.isoformat(),
+        'sale_type': product.sale_type,
+        'sale_start_date': product.sale_start_date.isoformat() if product.sale_start_date else None,
+        'sale_end_date': product.sale_end_date.isoformat() if product.sale_end_date else None,
+        'sale_discount_percentage': product.sale_discount_percentage,
+        'effective_price': product.effective_price,
+        'average_rating': avg_rating,
+        'review_count': review_count
+    }
+
+    if include_display_fields:
+        data.update({
+            'is_featured': product.is_featured,
+            'is_new_arrival': product.is_new_arrival,
+            'featured_order': product.featured_order,
+            'new_arrival_order': product.new_arrival_order
+        })
+
+    return data
+
+
+def serialize_product_cards(products, stores=None, include_display_fields=False):
+    """Serialize a page of products with a fixed number of queries."""
+    products = list(products)
+    context = ProductCardContext(products, stores=stores)
+    return [serialize_product_card(p, context, include_display_fields) for p in products]
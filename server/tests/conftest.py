@@ -0,0 +1,119 @@
+"""Fixtures for the server test suite.
+
+Run from server/:
+    python -m pytest -q
+
+The app is imported once, against a throwaway SQLite database whose tables
+are created from the models (the app queries commission_rate on import).
+Every test starts from empty tables and empty process-local caches.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix='server-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.db')
+os.environ.setdefault('ANALYTICS_SPOOL_DIR', os.path.join(_tmp, 'spool'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from config import Config
+import models
+
+_bootstrap = Flask('bootstrap')
+_bootstrap.config.from_object(Config)
+models.db.init_app(_bootstrap)
+with _bootstrap.app_context():
+    models.db.create_all()
+
+from app import app as flask_app
+from models import db
+from analytics_ingest import product_ids
+from commission_engine import _tier_cache
+from flash_sale import _windows as flash_sale_windows
+from home_snapshot import home_snapshot
+from response_cache import response_cache
+from search import reset_search_index
+from user_cache import user_cache
+
+
+class QueryCounter:
+    """Counts the SQL statements sent to the database while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _clear_caches():
+    # Version counters restart at zero with the tables, so versioned copies must go too
+    response_cache.clear()
+    user_cache.clear()
+    _tier_cache.clear()
+    flash_sale_windows.clear()
+    product_ids.invalidate()
+    home_snapshot.clear()
+    reset_search_index()
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+        _clear_caches()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """``with count_queries() as queries:`` then ``queries.count``.
+
+    The session is emptied first, so rows loaded while seeding do not save the
+    request its own queries.
+    """
+    def counter():
+        db.session.expunge_all()
+        return QueryCounter(db.engine)
+    return counter
+
+
+@pytest.fixture
+def auth_header(app):
+    def header(user_id):
+        with app.test_request_context():
+            return {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+    return header
@@ -0,0 +1,67 @@
+"""Spooled analytics ingestion."""
+
+import glob
+import os
+from datetime import datetime
+
+import pytest
+
+import analytics_ingest
+from analytics_ingest import AnalyticsIngestor
+from models import db, Product, ProductAnalytics, Store, User
+
+
+@pytest.fixture
+def ingestor(app, tmp_path):
+    ingestor = AnalyticsIngestor()
+    ingestor.init_app(app)
+    ingestor.spool_dir = str(tmp_path)
+    # Flushed by the test, not the worker
+    ingestor.flush_interval = 3600
+    ingestor.flush_events = 10 ** 6
+    return ingestor
+
+
+def create_product():
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    db.session.add(manager)
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    product = Product(name='product', price=10.0, store_id=store.id)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def events(product_id, count):
+    return [{'product_id': product_id, 'user_id': None, 'action': 'view', 'time_spent': None,
+             'referrer': None, 'user_agent': None, 'timestamp': datetime.utcnow().isoformat()}
+            for _ in range(count)]
+
+
+def test_failed_rollup_refresh_does_not_leak_pending_events(ingestor, monkeypatch):
+    product_id = create_product()
+    refreshed = []
+
+    def failing_refresh(days):
+        raise RuntimeError('rollup failed')
+
+    monkeypatch.setattr(analytics_ingest, 'refresh_days', failing_refresh)
+    ingestor.enqueue(events(product_id, 3))
+    ingestor.flush()
+
+    metrics = ingestor.metrics()
+    assert metrics['pending'] == 0
+    assert metrics['flushed'] == 3
+    assert ProductAnalytics.query.count() == 3
+    assert glob.glob(os.path.join(ingestor.spool_dir, 'ready-*.jsonl')) == []
+
+    # The days are refreshed with the next segment
+    monkeypatch.setattr(analytics_ingest, 'refresh_days', refreshed.append)
+    ingestor.enqueue(events(product_id, 1))
+    ingestor.flush()
+
+    assert refreshed == [{datetime.utcnow().date()}]
+    assert ingestor.metrics()['pending'] == 0
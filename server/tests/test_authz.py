@@ -0,0 +1,35 @@
+"""Token revocation."""
+
+from models import db, User
+
+
+def create_customer():
+    user = User(email='customer@example.com', password_hash='!', name='customer', role='customer')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_revocation_applies_while_the_user_is_cached(client, auth_header):
+    user_id = create_customer()
+    headers = auth_header(user_id)
+    assert client.get('/api/dashboard/profile', headers=headers).status_code == 200
+
+    # As committed by another worker: this process's user_cache is not invalidated
+    User.query.filter_by(id=user_id).update({User.perms_version: User.perms_version + 1})
+    db.session.commit()
+
+    response = client.get('/api/dashboard/profile', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['msg'] == 'Token has been revoked'
+
+
+def test_tokens_of_deleted_users_are_revoked(client, auth_header):
+    user_id = create_customer()
+    headers = auth_header(user_id)
+    assert client.get('/api/dashboard/profile', headers=headers).status_code == 200
+
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+
+    assert client.get('/api/dashboard/profile', headers=headers).status_code == 401
@@ -0,0 +1,27 @@
+"""Flash sale creation."""
+
+from models import db, Product, Store, User
+
+
+def test_sale_window_offsets_are_converted_to_utc(client, auth_header):
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    db.session.add(manager)
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    product = Product(name='product', price=10.0, stock_quantity=50, store_id=store.id)
+    db.session.add(product)
+    db.session.commit()
+
+    response = client.post('/api/flash-sales', headers=auth_header(manager.id), json={
+        'product_id': product.id,
+        'units': 10,
+        'starts_at': '2030-01-01T09:00:00+05:00',
+        'ends_at': '2030-01-01T10:00:00Z',
+    })
+
+    assert response.status_code == 201, response.get_json()
+    sale = response.get_json()['flash_sale']
+    assert sale['starts_at'] == '2030-01-01T04:00:00'
+    assert sale['ends_at'] == '2030-01-01T10:00:00'
@@ -0,0 +1,109 @@
+"""Idempotency-Key handling on order submission."""
+
+import hashlib
+
+import pytest
+from flask import g
+
+from idempotency import IdempotencyKeyLost, _claim, remember_response
+from models import db, Address, IdempotencyKey, Order, PaymentMethod, Product, Store, User
+
+
+def seed_checkout():
+    """A customer with an address and card, and a product in stock. Returns (user id, order payload)."""
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    customer = User(email='customer@example.com', password_hash='!', name='customer', role='customer')
+    db.session.add_all([manager, customer])
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    product = Product(name='product', price=100.0, stock_quantity=5, store_id=store.id)
+    address = Address(user_id=customer.id, name='Home', street_address='1 Test St', city='Test',
+                      state='Test', postal_code='00000', country='Test')
+    card = PaymentMethod(user_id=customer.id, cardholder_name='customer', card_number_last_four='0000',
+                         card_type='Visa', expiry_month=1, expiry_year=2099)
+    db.session.add_all([product, address, card])
+    db.session.commit()
+    return customer.id, {
+        'items': [{'id': product.id, 'quantity': 1, 'price': 100.0}],
+        'shipping_address_id': address.id,
+        'payment_method_id': card.id,
+        'subtotal': 100.0,
+    }
+
+
+def post_order(client, headers, payload, key='key-1'):
+    return client.post('/api/orders', headers={**headers, 'Idempotency-Key': key}, json=payload)
+
+
+def test_retry_with_the_same_key_replays_the_response(client, auth_header):
+    user_id, payload = seed_checkout()
+    headers = auth_header(user_id)
+
+    first = post_order(client, headers, payload)
+    retry = post_order(client, headers, payload)
+
+    assert first.status_code == 201, first.get_json()
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert retry.get_json() == first.get_json()
+    assert Order.query.count() == 1
+    assert Product.query.one().stock_quantity == 4
+
+
+def test_reusing_a_key_for_a_different_request_is_a_422(client, auth_header):
+    user_id, payload = seed_checkout()
+    headers = auth_header(user_id)
+    assert post_order(client, headers, payload).status_code == 201
+
+    payload['items'][0]['quantity'] = 2
+    response = post_order(client, headers, payload)
+
+    assert response.status_code == 422
+    assert Order.query.count() == 1
+
+
+def test_server_error_releases_the_key(client, auth_header, monkeypatch):
+    user_id, payload = seed_checkout()
+    headers = auth_header(user_id)
+
+    def failing_write_orders(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr('routes.orders.write_orders', failing_write_orders)
+    assert post_order(client, headers, payload).status_code == 500
+    assert IdempotencyKey.query.count() == 0
+    assert Product.query.one().stock_quantity == 5
+
+    monkeypatch.undo()
+    retry = post_order(client, headers, payload)
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert Order.query.count() == 1
+
+
+def test_response_cannot_be_stored_after_a_takeover(app, monkeypatch):
+    user_id, _payload = seed_checkout()
+    request_hash = hashlib.sha256(b'{}').hexdigest()
+    # Every unfinished claim counts as abandoned
+    monkeypatch.setitem(app.config, 'IDEMPOTENCY_LOCK_TIMEOUT', 0)
+
+    with app.test_request_context():
+        first_locked_at, duplicate = _claim(user_id, 'key-1', request_hash)
+        assert duplicate is None
+        second_locked_at, duplicate = _claim(user_id, 'key-1', request_hash)
+        assert duplicate is None
+        assert second_locked_at != first_locked_at
+
+        g.idempotency_claim = (user_id, 'key-1', first_locked_at)
+        with pytest.raises(IdempotencyKeyLost):
+            remember_response(app.response_class('{}'), 201)
+        db.session.rollback()
+
+        g.idempotency_claim = (user_id, 'key-1', second_locked_at)
+        remember_response(app.response_class('{}'), 201)
+        db.session.commit()
+
+    assert IdempotencyKey.query.one().status_code == 201
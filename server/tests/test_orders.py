@@ -0,0 +1,40 @@
+"""Order listing filters."""
+
+from datetime import datetime
+
+from models import db, Order, Store, User
+
+
+def seed_orders():
+    admin = User(email='admin@example.com', password_hash='!', name='admin', role='super_admin')
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    db.session.add_all([admin, manager])
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    db.session.add_all([
+        Order(user_id=admin.id, store_id=store.id, total_amount=1.0, created_at=datetime(2026, 9, 30, 18, 0)),
+        Order(user_id=admin.id, store_id=store.id, total_amount=2.0, created_at=datetime(2026, 9, 30, 20, 0)),
+    ])
+    db.session.commit()
+    return admin.id
+
+
+def test_date_filters_convert_offsets_to_utc(client, auth_header):
+    admin_id = seed_orders()
+
+    # 2026-10-01 00:00 at +05:00 is 2026-09-30 19:00 UTC
+    response = client.get('/api/orders/admin/all?start_date=2026-10-01T00:00:00%2B05:00',
+                          headers=auth_header(admin_id))
+
+    assert response.status_code == 200
+    assert [order['total_amount'] for order in response.get_json()] == [2.0]
+
+
+def test_malformed_date_filter_is_a_400(client, auth_header):
+    admin_id = seed_orders()
+
+    response = client.get('/api/orders/admin/all?end_date=9999-12-31', headers=auth_header(admin_id))
+
+    assert response.status_code == 400
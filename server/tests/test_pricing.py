@@ -0,0 +1,114 @@
+"""Stored effective prices, checkout prices and price sorting."""
+
+import json
+import random
+from datetime import datetime, timedelta
+
+from models import db, Product, Store, User
+from pricing import current_price, flip_sale_windows, sale_price
+
+
+def create_store():
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    db.session.add(manager)
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    return store
+
+
+def sale_window(now, start_format, end_format):
+    return ((now - timedelta(hours=1)).strftime(start_format), (now + timedelta(hours=1)).strftime(end_format))
+
+
+def test_create_product_with_utc_sale_window(client, auth_header):
+    store = create_store()
+    manager_id = store.manager_id
+    db.session.commit()
+    start, end = sale_window(datetime.utcnow(), '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S+00:00')
+
+    response = client.post('/api/products', headers=auth_header(manager_id), data={
+        'name': 'Scarf', 'price': '100', 'sale_type': 'EID', 'sale_start_date': start,
+        'sale_end_date': end, 'sale_discount_percentage': '20',
+    })
+
+    assert response.status_code == 201, response.get_json()
+    product = Product.query.one()
+    assert product.effective_price == 80.0
+    assert product.sale_active
+    assert product.sale_start_date.tzinfo is None
+    assert product.sale_start_date == datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ')
+
+
+def test_bulk_import_converts_sale_window_offsets(client, auth_header):
+    store = create_store()
+    manager_id = store.manager_id
+    db.session.commit()
+    now = datetime.utcnow()
+    # Same instants as a naive UTC window, written at +05:00
+    start, end = sale_window(now + timedelta(hours=5), '%Y-%m-%dT%H:%M:%S+05:00', '%Y-%m-%dT%H:%M:%S+05:00')
+    rows = [
+        {'name': 'Hat', 'price': 50, 'sale_type': 'EID', 'sale_start_date': start,
+         'sale_end_date': end, 'sale_discount_percentage': 10},
+        {'name': 'Belt', 'price': 20, 'sale_type': 'EID', 'sale_start_date': start,
+         'sale_end_date': (now + timedelta(days=1)).isoformat(), 'sale_discount_percentage': 50},
+    ]
+
+    response = client.post('/api/products/import?format=jsonl', headers=auth_header(manager_id),
+                           data='\n'.join(json.dumps(row) for row in rows), content_type='application/x-ndjson')
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['imported'] == 2
+    assert {p.name: p.effective_price for p in Product.query.all()} == {'Hat': 45.0, 'Belt': 10.0}
+
+
+def test_sale_price_rounds_half_up_to_the_cent():
+    assert sale_price(4466.69, 50) == 2233.35
+    assert sale_price(0.05, 50) == 0.03
+    assert sale_price(19.99, 33.3) == 13.33
+    assert sale_price(100, 15) == 85.0
+
+
+def test_stored_sale_prices_match_checkout_prices():
+    rng = random.Random(24)
+    store = create_store()
+    now = datetime.utcnow()
+    prices = [(4466.69, 50)] + [
+        (rng.randint(1, 1000000) / 100, rng.choice([5, 10, 12.5, 15, 25, 33, 50, 66.6, 75, rng.randint(1, 99)]))
+        for _ in range(2000)
+    ]
+    # Created before the window opens, so flip_sale_windows stores their sale price
+    db.session.add_all([
+        Product(name=f'product {i}', price=price, store_id=store.id, sale_type='EID',
+                sale_start_date=now + timedelta(hours=1), sale_end_date=now + timedelta(days=1),
+                sale_discount_percentage=discount)
+        for i, (price, discount) in enumerate(prices)
+    ])
+    db.session.commit()
+
+    opened, closed = flip_sale_windows(now + timedelta(hours=2))
+    db.session.expire_all()
+
+    assert (opened, closed) == (len(prices), 0)
+    at = now + timedelta(hours=2)
+    mismatched = [
+        (p.price, p.sale_discount_percentage, p.effective_price, current_price(p, at))
+        for p in Product.query.all() if p.effective_price != current_price(p, at)
+    ]
+    assert mismatched == []
+
+
+def test_price_sort_replaces_search_relevance(client):
+    store = create_store()
+    db.session.add_all([
+        Product(name='Widget', price=300.0, store_id=store.id),
+        Product(name='Thing', description='a widget', price=100.0, store_id=store.id),
+        Product(name='Widget deluxe', price=200.0, store_id=store.id),
+    ])
+    db.session.commit()
+
+    response = client.get('/api/products?search=widget&sort=price_asc')
+
+    assert response.status_code == 200
+    assert [p['effective_price'] for p in response.get_json()['products']] == [100.0, 200.0, 300.0]
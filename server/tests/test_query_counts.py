@@ -0,0 +1,153 @@
+"""Query counts of hot endpoints.
+
+Each endpoint is built from a fixed number of statements. The tests seed a
+small and a larger data set and check that the count is the same for both,
+so a lazy load per item shows up as a failure.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import (
+    db, Cart, CartItem, Category, Order, Product, Store, User, UserRecommendation, Wishlist, WishlistItem
+)
+
+# The token's permissions version, the user, recent orders, cart items,
+# wishlist items, order totals and the recommendation feed
+CUSTOMER_DASHBOARD_QUERIES = 7
+# With an empty feed, also the customer's bought and wishlisted products, the
+# id range and the random sample
+CUSTOMER_DASHBOARD_QUERIES_WITHOUT_FEED = 10
+# Catalog listings: the cache_version read behind the response cache, the
+# products (and their count where paginated), then categories and stores for
+# the whole page at once
+CATALOG_QUERIES = {
+    '/api/products': 5,
+    '/api/products/featured': 4,
+    '/api/products/new-arrivals': 4,
+    '/api/products/top-sales': 4,
+}
+# The cache_version read, the store, its products and their categories
+STORE_QUERIES = 4
+
+
+def create_user(role, email):
+    user = User(email=email, password_hash=generate_password_hash('pw'), name=email.split('@')[0], role=role)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def create_store(name):
+    manager = create_user('manager', f'{name}@example.com')
+    store = Store(name=name, manager_id=manager.id)
+    db.session.add(store)
+    db.session.commit()
+    return store
+
+
+def create_products(store, count, **fields):
+    products = [Product(name=f'{store.name} product {i}', price=100.0 + i, stock_quantity=10,
+                        store_id=store.id, **fields) for i in range(count)]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+def seed_catalog(items):
+    """``items`` products in each of two stores, all featured, new and on sale. Returns the stores."""
+    now = datetime.utcnow()
+    categories = [Category(name='shirts'), Category(name='hats')]
+    db.session.add_all(categories)
+    db.session.commit()
+    stores = [create_store('first'), create_store('second')]
+    for store in stores:
+        products = create_products(
+            store, items, is_featured=True, is_new_arrival=True, sale_type='EID',
+            sale_start_date=now - timedelta(days=1), sale_end_date=now + timedelta(days=1),
+            sale_discount_percentage=10
+        )
+        for i, product in enumerate(products):
+            product.category = categories[i % 2].name
+    db.session.commit()
+    return stores
+
+
+def seed_customer(items):
+    """A customer with ``items`` orders, cart items and wishlist items. Returns (customer, products)."""
+    customer = create_user('customer', 'customer@example.com')
+    stores = [create_store('first'), create_store('second')]
+    products = [p for store in stores for p in create_products(store, items + 2)]
+    cart = Cart(user_id=customer.id)
+    wishlist = Wishlist(user_id=customer.id)
+    db.session.add_all([cart, wishlist])
+    db.session.flush()
+    for product in products[:items]:
+        db.session.add(Order(user_id=customer.id, store_id=product.store_id, total_amount=product.price))
+        db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))
+        db.session.add(WishlistItem(wishlist_id=wishlist.id, product_id=product.id))
+    db.session.commit()
+    return customer, products
+
+
+def add_feed(customer, products):
+    for rank, product in enumerate(products[-4:]):
+        db.session.add(UserRecommendation(user_id=customer.id, rank=rank, product_id=product.id, score=1.0))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('items', [1, 10])
+def test_customer_dashboard_query_count(client, count_queries, auth_header, items):
+    customer, products = seed_customer(items)
+    add_feed(customer, products)
+    headers = auth_header(customer.id)
+
+    with count_queries() as queries:
+        response = client.get('/api/dashboard/customer', headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['cart_items']) == items
+    assert len(body['wishlist_items']) == items
+    assert len(body['recommended_products']) == 4
+    assert queries.count == CUSTOMER_DASHBOARD_QUERIES, queries.statements
+
+
+@pytest.mark.parametrize('items', [1, 10])
+def test_customer_dashboard_query_count_without_feed(client, count_queries, auth_header, items):
+    customer, _products = seed_customer(items)
+    headers = auth_header(customer.id)
+
+    with count_queries() as queries:
+        response = client.get('/api/dashboard/customer', headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['recommended_products']
+    assert queries.count == CUSTOMER_DASHBOARD_QUERIES_WITHOUT_FEED, queries.statements
+
+
+@pytest.mark.parametrize('items', [1, 10])
+@pytest.mark.parametrize('path', list(CATALOG_QUERIES))
+def test_catalog_listing_query_count(client, count_queries, path, items):
+    seed_catalog(items)
+
+    with count_queries() as queries:
+        response = client.get(path)
+
+    assert response.status_code == 200
+    assert response.get_json()['products']
+    assert queries.count == CATALOG_QUERIES[path], queries.statements
+
+
+@pytest.mark.parametrize('items', [1, 10])
+def test_store_page_query_count(client, count_queries, items):
+    store_id = seed_catalog(items)[0].id
+
+    with count_queries() as queries:
+        response = client.get(f'/api/stores/{store_id}')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['store']['products']) == items
+    assert queries.count == STORE_QUERIES, queries.statements
@@ -0,0 +1,44 @@
+"""Product search on the in-process index (SQLite)."""
+
+from models import db, Product, Store, User
+from search import FALLBACK_MAX_MATCHES
+
+
+def seed_products(name_matches, description_matches):
+    manager = User(email='manager@example.com', password_hash='!', name='manager', role='manager')
+    db.session.add(manager)
+    db.session.flush()
+    store = Store(name='store', manager_id=manager.id)
+    db.session.add(store)
+    db.session.flush()
+    db.session.add_all(
+        [Product(name=f'Widget {i}', price=10.0, store_id=store.id) for i in range(name_matches)] +
+        [Product(name=f'Thing {i}', description='a widget', price=10.0, store_id=store.id)
+         for i in range(description_matches)]
+    )
+    db.session.commit()
+
+
+def test_fallback_search_keeps_only_the_best_matches(client):
+    seed_products(name_matches=5, description_matches=FALLBACK_MAX_MATCHES + 20)
+
+    response = client.get('/api/products?search=widg&per_page=10')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == FALLBACK_MAX_MATCHES
+    assert body['total_is_capped']
+    names = [p['name'] for p in body['products']]
+    assert names[:5] == [f'Widget {i}' for i in reversed(range(5))]
+
+
+def test_uncapped_search_reports_the_full_total(client):
+    seed_products(name_matches=5, description_matches=FALLBACK_MAX_MATCHES - 5)
+
+    body = client.get('/api/products?search=widg&per_page=10').get_json()
+    assert body['total'] == FALLBACK_MAX_MATCHES
+    assert not body['total_is_capped']
+
+    body = client.get('/api/products?search=widg&cursor=&include_total=true').get_json()
+    assert body['total'] == FALLBACK_MAX_MATCHES
+    assert not body['total_is_capped']
@@ -0,0 +1,52 @@
+"""Trend window parsing."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from time_buckets import MAX_WINDOW, iter_buckets, parse_utc_datetime, parse_window_args
+
+
+def window(app, query):
+    with app.test_request_context(query):
+        return parse_window_args()
+
+
+def test_parse_utc_datetime_converts_offsets():
+    assert parse_utc_datetime('2026-10-01T00:00:00+05:00') == datetime(2026, 9, 30, 19, 0)
+    assert parse_utc_datetime('2026-10-01T00:00:00Z') == datetime(2026, 10, 1)
+    assert parse_utc_datetime('2026-10-01') == datetime(2026, 10, 1)
+    assert parse_utc_datetime('2026-10-01T00:00:00Z').tzinfo is None
+
+
+def test_mixed_aware_and_naive_dates(app):
+    start, end, _granularity = window(app, '/?start_date=2026-10-01T05:00:00%2B05:00&end_date=2026-10-02')
+
+    assert start == datetime(2026, 10, 1)
+    assert end == datetime(2026, 10, 3) - timedelta(microseconds=1)
+
+
+@pytest.mark.parametrize('granularity', ['day', 'week', 'month'])
+def test_window_is_clamped(app, granularity):
+    start, end, _granularity = window(app, f'/?days=1000000&granularity={granularity}')
+    assert end - start == MAX_WINDOW[granularity]
+
+    start, end, _granularity = window(app, f'/?start_date=1900-01-01&end_date=2026-10-01&granularity={granularity}')
+    assert end - start == MAX_WINDOW[granularity]
+
+
+@pytest.mark.parametrize('query', [
+    '/?days=-99999999999',
+    '/?days=5&end_date=0001-01-02',
+    '/?start_date=yesterday',
+])
+def test_out_of_range_windows_are_value_errors(app, query):
+    with pytest.raises(ValueError):
+        window(app, query)
+
+
+
+def test_window_ending_at_the_last_representable_day(app):
+    start, end, granularity = window(app, '/?end_date=9999-12-31&granularity=month&days=90')
+
+    assert list(iter_buckets(start, end, granularity))[-1].isoformat() == '9999-12-01'
@@ -0,0 +1,149 @@
+"""Time-bucketed aggregation helpers for trend endpoints.
+
+A trend series is one GROUP BY over a truncated timestamp, with the buckets
+that have no rows filled in afterwards in Python. That replaces issuing one
+COUNT per day. Buckets are identified by the date they start on: the day
+itself, the Monday of the week, or the first of the month.
+
+``time_bucket`` builds the truncation expression for the current database,
+using ``date_trunc`` on PostgreSQL and SQLite date modifiers elsewhere.
+
+Timestamps are stored as naive UTC. ``parse_utc_datetime`` is the one parser
+for dates sent by clients: it converts ``Z`` and ``+hh:mm`` offsets to UTC
+before dropping them, so aware and naive values compare and filter alike.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from flask import request
+from models import db
+from sqlalchemy import Date, cast, func, literal_column
+
+GRANULARITIES = ('day', 'week', 'month')
+# Longest window per granularity, so a series has at most a few hundred buckets
+MAX_WINDOW = {
+    'day': timedelta(days=731),
+    'week': timedelta(weeks=520),
+    'month': timedelta(days=366 * 20),
+}
+
+
+def parse_utc_datetime(value):
+    """Parse an ISO 8601 date or datetime into naive UTC.
+
+    Values with an offset (including ``Z``) are converted to UTC; values
+    without one are taken as UTC already. Raises ValueError when malformed.
+    """
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def time_bucket(column, granularity):
+    """SQL expression for the start date of the bucket ``column`` falls in."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Invalid granularity. Must be one of: {", ".join(GRANULARITIES)}')
+    # Arguments are inlined rather than bound so the expression renders
+    # identically in SELECT and GROUP BY (PostgreSQL requires that)
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.date_trunc(literal_column(f"'{granularity}'"), column), Date)
+    if granularity == 'week':
+        # Back up six days, then forward to the next Monday (ISO weeks)
+        return func.date(column, literal_column("'-6 days'"), literal_column("'weekday 1'"))
+    if granularity == 'month':
+        return func.date(column, literal_column("'start of month'"))
+    return func.date(column)
+
+
+def bucket_start(value, granularity):
+    """Start date of the bucket containing ``value`` (a date or datetime)."""
+    if isinstance(value, datetime):
+        value = value.date()
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def iter_buckets(start, end, granularity):
+    """Start dates of every bucket from the one containing ``start`` through ``end``."""
+    current = bucket_start(start, granularity)
+    last = bucket_start(end, granularity)
+    while current <= last:
+        yield current
+        if current == last:
+            # The bucket after 9999-12 does not exist
+            break
+        current = next_bucket(current, granularity)
+
+
+def as_date(value):
+    """Normalise a bucket key. SQLite returns strings, PostgreSQL dates."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def fill_buckets(rows, start, end, granularity, empty):
+    """Gap-fill ``(bucket, values)`` pairs into one entry per bucket.
+
+    ``rows`` yields ``(bucket_key, dict)``. Returns a list of dicts with a
+    ``date`` key (ISO bucket start) merged with the row values, or with
+    ``empty`` for buckets that had no rows.
+    """
+    by_bucket = {as_date(key): values for key, values in rows}
+    return [
+        dict({'date': bucket.isoformat()}, **by_bucket.get(bucket, empty))
+        for bucket in iter_buckets(start, end, granularity)
+    ]
+
+
+def parse_window_args(default_days=30, default_granularity='day'):
+    """Read ``?granularity=``, ``?days=`` or ``?start_date=``/``?end_date=`` from the request.
+
+    Returns ``(start, end, granularity)`` as naive UTC datetimes. A bare
+    ``end_date`` covers that whole day. Windows longer than
+    ``MAX_WINDOW[granularity]`` are shortened to end at ``end``. Raises
+    ValueError for malformed values.
+    """
+    granularity = request.args.get('granularity', default_granularity)
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Invalid granularity. Must be one of: {", ".join(GRANULARITIES)}')
+
+    end = datetime.utcnow()
+    end_arg = request.args.get('end_date')
+    start_arg = request.args.get('start_date')
+    max_window = MAX_WINDOW[granularity]
+    try:
+        if end_arg:
+            end = parse_utc_datetime(end_arg)
+            if len(end_arg) == 10:
+                end += timedelta(days=1) - timedelta(microseconds=1)
+        start = parse_utc_datetime(start_arg) if start_arg else None
+    except (ValueError, OverflowError):
+        raise ValueError('Invalid start_date or end_date')
+
+    if start is None:
+        days = request.args.get('days', default_days, type=int)
+        try:
+            start = end - timedelta(days=min(days, max_window.days))
+        except OverflowError:
+            raise ValueError('Invalid days')
+
+    if start > end:
+        raise ValueError('start_date must be before end_date')
+    if end - start > max_window:
+        start = end - max_window
+    return start, end, granularity
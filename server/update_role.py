@@ -1,11 +1,17 @@
 from models import db, User
 from app import app
+from authz import revoke_user_tokens
+from user_cache import invalidate_user
 
 with app.app_context():
     user = User.query.filter_by(email='mentee@naqsh.com').first()
     if user:
-        user.role = 'super_admin'
+        if user.role != 'super_admin':
+            user.role = 'super_admin'
+            # Tokens issued for the old role must stop working, as with the role endpoint
+            revoke_user_tokens(user)
         db.session.commit()
+        invalidate_user(user.id)
         print('Updated mentee@naqsh.com to super_admin')
     else:
         print('User mentee@naqsh.com not found')
@@ -0,0 +1,144 @@
+"""Current-user loading for JWT-protected routes.
+
+flask_jwt_extended calls ``load_current_user`` once per request and memoises
+the result on ``flask.g`` (it is then available as
+``flask_jwt_extended.current_user``). The loader fetches the user and their
+store in one query. It also keeps their column values in a small in-process
+LRU cache for ``USER_CACHE_TTL`` seconds, so a warm request does not touch the
+database at all.
+
+Instances rebuilt from the cache are attached to the request's session as
+ordinary persistent objects. A later ``User.query.get(user_id)`` in the same
+request is answered from the identity map, so existing handlers benefit
+without changes, and lazy relationships and writes behave as usual.
+
+Writes that change a user or their store call ``invalidate_user`` after
+committing. Other workers keep their copy until it expires, so the TTL bounds
+how long such a change takes to apply everywhere.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from models import db, User, Store
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+# Never copied into the cache; loaded on access by the few handlers that need it
+UNCACHED_COLUMNS = {'password_hash'}
+
+
+class UserCache:
+    """TTL + LRU map of user id to (user columns, store columns or None)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a load that raced with a write
+        # cannot put the pre-write row back
+        self.generation = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user_values, store_values = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user_values, store_values
+
+    def put(self, user_id, user_values, store_values, generation, ttl, max_size):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[user_id] = (time.monotonic() + ttl, user_values, store_values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def _column_values(obj, skip=()):
+    return {
+        attr.key: getattr(obj, attr.key)
+        for attr in inspect(type(obj)).column_attrs
+        if attr.key not in skip
+    }
+
+
+def _attach(model, values):
+    """A persistent instance for ``values`` in the current session, without a query."""
+    existing = db.session.identity_map.get(identity_key(model, values['id']))
+    if existing is not None:
+        return existing
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    db.session.add(obj)
+    return obj
+
+
+def _from_cache(user_values, store_values):
+    user = _attach(User, user_values)
+    store = _attach(Store, store_values) if store_values is not None else None
+    set_committed_value(user, 'store', store)
+    if store is not None:
+        set_committed_value(store, 'manager', user)
+    return user
+
+
+def load_user(user_id):
+    """The user with their store loaded, or None. Served from the cache when warm."""
+    user = db.session.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        return user
+
+    ttl = current_app.config.get('USER_CACHE_TTL', 0)
+    if ttl > 0:
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return _from_cache(*cached)
+
+    generation = user_cache.generation
+    user = User.query.options(joinedload(User.store)).get(user_id)
+    if user is not None and ttl > 0:
+        store = user.store
+        user_cache.put(
+            user_id,
+            _column_values(user, UNCACHED_COLUMNS),
+            _column_values(store) if store is not None else None,
+            generation, ttl, current_app.config.get('USER_CACHE_SIZE', 1024)
+        )
+    return user
+
+
+def load_current_user(_jwt_header, jwt_data):
+    """flask_jwt_extended user_lookup_loader. Returning None rejects the token."""
+    try:
+        user_id = int(jwt_data[current_app.config['JWT_IDENTITY_CLAIM']])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return load_user(user_id)
+
+
+def invalidate_user(user_id):
+    """Drop the cached copy of a user after a committed change to them or their store."""
+    user_cache.invalidate(user_id)